@@ -1,7 +1,6 @@
 import cv2
 import numpy as np
 from deepface import DeepFace
-from mtcnn import MTCNN
 import sys
 import time
 import logging
@@ -9,7 +8,9 @@ import threading
 
 # --- Custom Project Modules ---
 from user_data_manager import UserDataManager
-from camera_utils import initialize_camera
+from camera_utils import open_camera
+from embedding_engine import FaceNetEmbedder
+from face_detectors import create_detector
 try:
     from email_utils import send_email
 except ImportError:
@@ -20,6 +21,7 @@ FRAMES_PER_POSE = 5
 BLUR_THRESHOLD = 100.0
 BRIGHTNESS_THRESHOLD = 60.0
 MIN_CAPTURE_INTERVAL = 1.0  # Throttle speed
+DETECTOR_BACKEND = 'mtcnn'  # 'mtcnn', 'yunet', 'ssd' or 'haar' (see face_detectors.py)
 
 # Setup Logging
 logging.basicConfig(filename='face_capture_errors.log', level=logging.ERROR)
@@ -60,7 +62,8 @@ def ai_worker_loop():
     # Initialize AI here to keep Main Thread fast
     data_manager = UserDataManager()
     facenet_model = DeepFace.build_model('Facenet')
-    detector = MTCNN()
+    embedder = FaceNetEmbedder(facenet_model, max_batch=1)
+    detector = create_detector(DETECTOR_BACKEND, fallback='mtcnn')
     
     capture_stages = ["Front", "Left", "Right"]
     
@@ -147,7 +150,7 @@ def ai_worker_loop():
                             enhanced = cv2.cvtColor(cv2.merge((cl, a, b)), cv2.COLOR_LAB2BGR)
                             
                             # Embed
-                            emb = DeepFace.represent(enhanced, model_name='Facenet', enforce_detection=False)[0]["embedding"]
+                            emb = embedder.embed([enhanced], color='bgr')[0]
                             data_manager.add_face_embedding(student_id, emb)
                             
                             state.captured_count += 1
@@ -197,7 +200,7 @@ def draw_ui(frame):
 # -------------------- MAIN THREAD (Video & UI) --------------------
 def main():
     # 1. Setup Camera
-    cap, source_name, warning_msg = initialize_camera(prefer_droidcam=True)
+    cap, source_name, warning_msg = open_camera(prefer_droidcam=True)
     if not cap:
         print("[CRITICAL] Camera failed.")
         return
@@ -209,8 +212,10 @@ def main():
     print("[INFO] Main UI Loop Started.")
 
     while state.running:
-        ret, frame = cap.read()
-        if not ret: break
+        ret, frame, _ = cap.read(timeout=1.0)
+        if not ret:
+            if not cap.running: break
+            continue
         
         if source_name == "Laptop Webcam":
             frame = cv2.flip(frame, 1)
@@ -227,8 +232,8 @@ def main():
 
         cv2.imshow("Enrollment", display)
         
-        # 30 FPS Refresh Rate (Smooth!)
-        if cv2.waitKey(30) & 0xFF == ord('q'):
+        # cap.read() already waits for the next camera frame
+        if cv2.waitKey(1) & 0xFF == ord('q'):
             state.running = False
             break
 
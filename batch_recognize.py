@@ -0,0 +1,196 @@
+# batch_recognize.py
+# Headless recognition over a recorded video file or a folder of images.
+#
+# Detection + embedding are fanned out over a process pool (each process owns
+# its detector and FaceNet model); matching and track smoothing run in the main
+# process in frame order, with the same settings as a live rec_faces session.
+# Writes per-frame detections (detections.jsonl) and the session attendance
+# result with throughput numbers (attendance.json).
+#
+# Usage:
+#   python batch_recognize.py recordings/lecture_0312.mp4 --every 5 --workers 4
+#   python batch_recognize.py snapshots/ --embeddings face_embeddings.pkl --fps 1
+#   python batch_recognize.py recordings/lecture_0312.mp4 --student-ids 101 102 --session-id 57
+import os
+import sys
+import time
+import json
+import argparse
+import threading
+import multiprocessing
+
+import cv2
+
+import recognition_config as config
+from embedding_loader import EmbeddingLoader
+from face_matcher import build_matcher, UNKNOWN_LABEL
+from face_recognizer import analyze_frame, build_pipeline, match_and_track
+from track_manager import TrackManager
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+_pipeline = None  # (detector, embedder) of this worker process
+_database = None  # UserDataManager, created on first use (not needed with --embeddings)
+
+
+def _get_database():
+    global _database
+    if _database is None:
+        from user_data_manager import UserDataManager
+        _database = UserDataManager()
+    return _database
+
+
+def iter_frames(path, every=1, fps=1.0):
+    """Yields (frame_index, seconds, bgr_frame) from a video file or an image directory."""
+    if os.path.isdir(path):
+        names = sorted(n for n in os.listdir(path) if n.lower().endswith(IMAGE_EXTENSIONS))
+        for index, name in enumerate(names):
+            if index % every:
+                continue
+            frame = cv2.imread(os.path.join(path, name))
+            if frame is not None:
+                yield index, index / fps, frame
+        return
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Could not open video {path}")
+    video_fps = cap.get(cv2.CAP_PROP_FPS) or fps
+    index = 0
+    try:
+        while True:
+            # grab() skips decoding work for frames that are not sampled
+            if not cap.grab():
+                break
+            if index % every == 0:
+                ok, frame = cap.retrieve()
+                if ok:
+                    yield index, index / video_fps, frame
+            index += 1
+    finally:
+        cap.release()
+
+
+def _init_worker(model_name, detector_config):
+    global _pipeline
+    _pipeline = build_pipeline(model_name, detector_config)
+
+
+def _analyze(item):
+    index, seconds, frame = item
+    detector, embedder = _pipeline
+    try:
+        boxes, embeddings = analyze_frame(detector, embedder, frame)
+    except Exception:
+        boxes, embeddings = [], []
+    return index, seconds, boxes, embeddings
+
+
+def load_gallery(embeddings_path=None, student_ids=None):
+    if embeddings_path:
+        return EmbeddingLoader(embeddings_path=embeddings_path).load_embeddings()
+    loader = EmbeddingLoader(db_manager=_get_database().db_manager)
+    return loader.load_embeddings(from_db=True, student_ids=student_ids)
+
+
+def run(path, out_dir, workers=2, every=1, fps=1.0, embeddings_path=None, student_ids=None):
+    """Runs the batch and returns the attendance result written to out_dir."""
+    all_embeddings, all_labels = load_gallery(embeddings_path, student_ids)
+    matcher_kind = config.MATCHER
+    if not student_ids and len(all_labels) >= config.CAMPUS_MATCHER_MIN_GALLERY:
+        matcher_kind = config.CAMPUS_MATCHER
+    matcher = build_matcher(matcher_kind, all_embeddings, all_labels,
+                            **dict(config.MATCHER_OPTIONS.get(matcher_kind, {}), storage=config.GALLERY_STORAGE))
+    tracks = TrackManager(vote_size=config.STABLE_FRAMES)
+    detector_config = dict(config.DETECTOR_OPTIONS, name=config.DETECTOR_BACKEND,
+                           fallback=config.DETECTOR_FALLBACK, scale=config.DETECTION_SCALE,
+                           min_face=config.DETECTION_MIN_FACE)
+    threshold = config.SIMILARITY_THRESHOLD
+
+    os.makedirs(out_dir, exist_ok=True)
+    present = {}  # identity -> {'first_seen', 'best_similarity', 'frames'}
+    frames = faces_seen = 0
+    # Bounded read-ahead so a long video is never decoded into memory ahead of the pool
+    in_flight = threading.BoundedSemaphore(max(1, workers) * 4)
+
+    def feed():
+        for item in iter_frames(path, every, fps):
+            in_flight.acquire()
+            yield item
+
+    start = time.time()
+    with multiprocessing.Pool(max(1, workers), initializer=_init_worker,
+                              initargs=(config.MODEL_NAME, detector_config)) as pool, \
+            open(os.path.join(out_dir, "detections.jsonl"), "w") as detections_file:
+        # imap returns results in frame order, which track smoothing needs
+        for index, seconds, boxes, embeddings in pool.imap(_analyze, feed()):
+            in_flight.release()
+            frames += 1
+            faces_seen += len(boxes)
+            faces = []
+            for track in match_and_track(matcher, tracks, boxes, embeddings, threshold, seconds):
+                faces.append({"track_id": track.track_id, "box": [int(v) for v in track.box],
+                              "identity": track.identity, "similarity": round(float(track.similarity), 4)})
+                # Same rule as rec_faces.process_frame marks attendance with
+                if track.identity != UNKNOWN_LABEL and track.similarity >= threshold:
+                    seen = present.setdefault(track.identity, {"first_seen": round(seconds, 2), "best_similarity": 0.0, "frames": 0})
+                    seen["best_similarity"] = round(max(seen["best_similarity"], float(track.similarity)), 4)
+                    seen["frames"] += 1
+            detections_file.write(json.dumps({"frame": index, "time": round(seconds, 3), "faces": faces}, default=str) + "\n")
+    elapsed = time.time() - start
+
+    result = {
+        "source": os.path.abspath(path),
+        "gallery_size": len(all_labels),
+        "matcher": matcher_kind,
+        "detector": config.DETECTOR_BACKEND,
+        "performance": {
+            "workers": max(1, workers),
+            "frame_stride": every,
+            "frames_processed": frames,
+            "faces_seen": faces_seen,
+            "seconds": round(elapsed, 2),
+            "frames_per_second": round(frames / elapsed, 2) if elapsed > 0 else 0.0,
+        },
+        "attendance": {
+            "total_marked": len(present),
+            "marked_ids": sorted(present, key=str),
+            "details": {str(identity): seen for identity, seen in present.items()},
+        },
+    }
+    with open(os.path.join(out_dir, "attendance.json"), "w") as f:
+        json.dump(result, f, indent=4, default=str)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline attendance from a recording or an image folder")
+    parser.add_argument("source", help="video file or directory of images")
+    parser.add_argument("--out", help="output directory (default: reports/batch_<source name>)")
+    parser.add_argument("--workers", type=int, default=2, help="detection/embedding processes")
+    parser.add_argument("--every", type=int, default=1, help="process every Nth frame")
+    parser.add_argument("--fps", type=float, default=1.0, help="frame rate assumed for image folders")
+    parser.add_argument("--embeddings", help="pickle of {name: [embeddings]} instead of the database")
+    parser.add_argument("--student-ids", nargs="+", help="only match these students (database gallery)")
+    parser.add_argument("--session-id", help="also record the marked students in this attendance session")
+    args = parser.parse_args()
+
+    name = os.path.splitext(os.path.basename(os.path.normpath(args.source)))[0]
+    out_dir = args.out or os.path.join("reports", f"batch_{name}")
+    print(f"[INFO] Batch recognition of {args.source} with {args.workers} worker(s)...")
+    result = run(args.source, out_dir, args.workers, max(1, args.every), args.fps, args.embeddings, args.student_ids)
+    perf = result["performance"]
+    print(f"[INFO] {perf['frames_processed']} frames in {perf['seconds']}s ({perf['frames_per_second']} fps), "
+          f"{result['attendance']['total_marked']} students present. Results in {out_dir}")
+
+    if args.session_id:
+        for identity, seen in result["attendance"]["details"].items():
+            try:
+                _get_database().add_attendance_record(args.session_id, identity, seen["best_similarity"])
+            except Exception as e:
+                print(f"[WARN] Failed to record attendance for {identity}: {e}")
+        print(f"[INFO] Attendance recorded for session {args.session_id}.")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
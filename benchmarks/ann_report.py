@@ -0,0 +1,96 @@
+# benchmarks/ann_report.py
+# Recall-vs-latency report for IVFIndex, used to pick nprobe for a gallery size.
+#
+# Usage:
+#   python benchmarks/ann_report.py --students 20000
+#   python benchmarks/ann_report.py --from-db          (every active student's embeddings)
+#   python benchmarks/ann_report.py --students 20000 --pq-m 16
+import os
+import sys
+import time
+import argparse
+import json
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+
+from face_matcher import GalleryMatcher, IVFIndex
+from synthetic import make_gallery, make_queries
+
+
+def time_search(matcher, queries, k, batch, **kwargs):
+    """Mean milliseconds per query, searching `batch` faces at a time like one frame would."""
+    start = time.perf_counter()
+    results = []
+    for i in range(0, len(queries), batch):
+        results.append(matcher.search(queries[i:i + batch], k=k, **kwargs)[1])
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000 / len(queries), np.concatenate(results)
+
+
+def recall_report(embeddings, labels, queries, nprobes=(1, 2, 4, 8, 16, 32, 64), k=1, batch=8, **ivf_options):
+    """
+    Compares IVFIndex against exact brute force for each nprobe.
+    recall_at_k: share of exact top-k rows the index also returned.
+    label_agreement: share of queries whose top-1 student matches brute force.
+    """
+    exact = GalleryMatcher(embeddings, labels)
+    exact_ms, exact_idx = time_search(exact, queries, k, batch)
+
+    start = time.perf_counter()
+    index = IVFIndex(embeddings, labels, **ivf_options)
+    build_s = time.perf_counter() - start
+
+    rows = [{"nprobe": "exact", "ms_per_query": round(exact_ms, 4), "recall_at_k": 1.0, "label_agreement": 1.0}]
+    for nprobe in nprobes:
+        if nprobe > len(index.lists):
+            break
+        ms, idx = time_search(index, queries, k, batch, nprobe=nprobe)
+        hits = sum(len(set(a) & set(b)) for a, b in zip(idx, exact_idx))
+        same_label = np.mean([labels[a[0]] == labels[b[0]] for a, b in zip(idx, exact_idx)])
+        rows.append({
+            "nprobe": nprobe,
+            "ms_per_query": round(ms, 4),
+            "recall_at_k": round(hits / exact_idx.size, 4),
+            "label_agreement": round(float(same_label), 4),
+        })
+    return {"gallery_size": len(labels), "nlist": len(index.lists), "build_seconds": round(build_s, 2), "rows": rows}
+
+
+def load_db_gallery():
+    from embedding_loader import EmbeddingLoader
+    from user_data_manager import UserDataManager
+    loader = EmbeddingLoader(db_manager=UserDataManager().db_manager)
+    embeddings, labels = loader.load_embeddings(from_db=True)
+    return np.asarray(embeddings, dtype=np.float32), labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVFIndex recall vs latency report")
+    parser.add_argument("--students", type=int, default=5000, help="synthetic students (15 vectors each)")
+    parser.add_argument("--from-db", action="store_true", help="use every active student's embeddings instead")
+    parser.add_argument("--queries", type=int, default=400)
+    parser.add_argument("--noise", type=float, default=0.3, help="query perturbation (length of added noise)")
+    parser.add_argument("--k", type=int, default=1)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--pq-m", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this path")
+    args = parser.parse_args()
+
+    if args.from_db:
+        embeddings, labels = load_db_gallery()
+    else:
+        embeddings, labels = make_gallery(args.students)
+    queries, _ = make_queries(embeddings, args.queries, noise=args.noise)
+
+    report = recall_report(embeddings, labels, queries, k=args.k, nlist=args.nlist, pq_m=args.pq_m)
+    print(f"Gallery: {report['gallery_size']} vectors, nlist={report['nlist']}, built in {report['build_seconds']}s")
+    print(f"{'nprobe':>8} {'ms/query':>10} {'recall@' + str(args.k):>10} {'top-1 label':>12}")
+    for row in report["rows"]:
+        print(f"{row['nprobe']:>8} {row['ms_per_query']:>10.3f} {row['recall_at_k']:>10.3f} {row['label_agreement']:>12.3f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# benchmarks/bench_detectors.py
+# Latency and recall of each face detector backend at lecture-hall resolution.
+#
+# Without --frames, builds synthetic frames by pasting tests/obama.jpg and
+# tests/bill.jpg at random sizes onto a canvas. Ground truth is the reference
+# backend's box on each source image, mapped into the frame.
+# With --frames DIR, uses recorded frames and treats the reference backend's
+# detections on each frame as ground truth.
+#
+# Usage:
+#   python benchmarks/bench_detectors.py --width 1920 --height 1080
+#   python benchmarks/bench_detectors.py --frames recordings/hall_b --reference mtcnn
+#   python benchmarks/bench_detectors.py --width 1920 --height 1080 --min-face 48   # multi-resolution
+import os
+import sys
+import time
+import argparse
+import json
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+import cv2
+import numpy as np
+
+from face_detectors import DETECTORS, create_detector
+from track_manager import iou_matrix
+
+
+def synthetic_frames(reference, width, height, n_frames, faces_per_frame, seed=0):
+    """Yields (rgb_frame, ground_truth_boxes)."""
+    rng = np.random.default_rng(seed)
+    sources = []
+    for name in ("obama.jpg", "bill.jpg"):
+        img = cv2.imread(os.path.join(ROOT, "tests", name))
+        if img is None:
+            continue
+        rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        faces = reference.detect_faces(rgb)
+        if faces:
+            sources.append((rgb, max(faces, key=lambda f: f['box'][2] * f['box'][3])['box']))
+    if not sources:
+        raise RuntimeError("Reference detector found no face in tests/*.jpg")
+    cols = int(np.ceil(np.sqrt(faces_per_frame * width / height)))
+    rows = int(np.ceil(faces_per_frame / cols))
+    cell_w, cell_h = width // cols, height // rows
+    for _ in range(n_frames):
+        frame = np.full((height, width, 3), 90, dtype=np.uint8)
+        truth = []
+        for cell in range(faces_per_frame):
+            img, (fx, fy, fw, fh) = sources[rng.integers(len(sources))]
+            # Face width between 40 px and most of the cell, as near and far rows of a hall
+            target_face = rng.uniform(40, 0.6 * min(cell_w, cell_h))
+            scale = min(target_face / fw, cell_w / img.shape[1], cell_h / img.shape[0])
+            small = cv2.resize(img, (max(1, int(img.shape[1] * scale)), max(1, int(img.shape[0] * scale))))
+            ox = (cell % cols) * cell_w + rng.integers(0, cell_w - small.shape[1] + 1)
+            oy = (cell // cols) * cell_h + rng.integers(0, cell_h - small.shape[0] + 1)
+            frame[oy:oy + small.shape[0], ox:ox + small.shape[1]] = small
+            truth.append((ox + fx * scale, oy + fy * scale, fw * scale, fh * scale))
+        yield frame, truth
+
+
+def recorded_frames(reference, directory, width, height):
+    for name in sorted(os.listdir(directory)):
+        img = cv2.imread(os.path.join(directory, name))
+        if img is None:
+            continue
+        rgb = cv2.cvtColor(cv2.resize(img, (width, height)), cv2.COLOR_BGR2RGB)
+        yield rgb, [f['box'] for f in reference.detect_faces(rgb)]
+
+
+def recall(found, truth, iou_threshold):
+    if not truth:
+        return 1.0
+    if not found:
+        return 0.0
+    ious = iou_matrix(truth, [f['box'] for f in found])
+    return float(np.mean(ious.max(axis=1) >= iou_threshold))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Face detector backend benchmark")
+    parser.add_argument("--backends", nargs="+", default=list(DETECTORS))
+    parser.add_argument("--reference", default="mtcnn", help="backend used for ground truth boxes")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--frames", help="directory of recorded frames instead of synthetic ones")
+    parser.add_argument("--n-frames", type=int, default=20)
+    parser.add_argument("--faces", type=int, default=12, help="faces per synthetic frame")
+    parser.add_argument("--iou", type=float, default=0.4, help="IoU for a box to count as found")
+    parser.add_argument("--scale", type=float, help="detect on frames downscaled by this factor")
+    parser.add_argument("--min-face", type=int, help="smallest face to find (px); picks the scale per backend")
+    parser.add_argument("--json", help="also write results to this path")
+    args = parser.parse_args()
+
+    reference = create_detector(args.reference)
+    if args.frames:
+        frames = list(recorded_frames(reference, args.frames, args.width, args.height))
+    else:
+        frames = list(synthetic_frames(reference, args.width, args.height, args.n_frames, args.faces))
+
+    results = []
+    print(f"{len(frames)} frames at {args.width}x{args.height}, ground truth from '{args.reference}'")
+    print(f"{'backend':>8} {'scale':>6} {'ms/frame':>10} {'recall':>8} {'landmarks':>10}")
+    for name in args.backends:
+        try:
+            detector = create_detector(name, scale=args.scale, min_face=args.min_face)
+        except (FileNotFoundError, ImportError) as e:
+            print(f"{name:>8}  skipped: {e}")
+            continue
+        detector.detect_faces(frames[0][0])  # warm-up
+        times, recalls, landmarks = [], [], False
+        for frame, truth in frames:
+            start = time.perf_counter()
+            found = detector.detect_faces(frame)
+            times.append(time.perf_counter() - start)
+            recalls.append(recall(found, truth, args.iou))
+            landmarks = landmarks or any(f['keypoints'] for f in found)
+        row = {"backend": name, "scale": round(getattr(detector, 'scale', 1.0), 3), "ms_per_frame": round(1000 * float(np.mean(times)), 2),
+               "recall": round(float(np.mean(recalls)), 3), "landmarks": landmarks}
+        results.append(row)
+        print(f"{name:>8} {row['scale']:>6.2f} {row['ms_per_frame']:>10.2f} {row['recall']:>8.3f} {str(landmarks):>10}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"width": args.width, "height": args.height, "reference": args.reference, "results": results}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+# benchmarks/bench_pipeline.py
+# Per-stage timings of the recognition pipeline, comparable between commits.
+#
+# Stages: detection, embedding, matching (per matcher and gallery size),
+# smoothing (TrackManager) and the rec_faces.process_frame overlay. Galleries
+# are synthetic (benchmarks/synthetic.py); frames are synthetic or recorded.
+# Stages whose dependencies are missing are reported as skipped.
+#
+# Usage:
+#   python benchmarks/bench_pipeline.py --json results/bench_$(git rev-parse --short HEAD).json
+#   python benchmarks/bench_pipeline.py --sizes 1000 200000 --matchers brute ivf
+#   python benchmarks/bench_pipeline.py --frames recordings/hall_b --compare results/bench_main.json
+import os
+import sys
+import time
+import json
+import argparse
+import platform
+import subprocess
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+import cv2
+import numpy as np
+
+from face_matcher import build_matcher
+from face_detectors import run_detector
+from track_manager import TrackManager
+from synthetic import make_gallery, make_queries, make_frames
+
+SIMILARITY_THRESHOLD = 0.75
+
+
+def stats(seconds):
+    """Summary of per-call times in milliseconds."""
+    ms = np.asarray(seconds) * 1000.0
+    return {"n": int(ms.size), "mean_ms": round(float(ms.mean()), 3),
+            "p50_ms": round(float(np.percentile(ms, 50)), 3), "p95_ms": round(float(np.percentile(ms, 95)), 3)}
+
+
+def time_calls(fn, items, warmup=2):
+    """Calls fn(item) for every item (after `warmup` untimed calls) and returns the stats."""
+    for item in items[:warmup]:
+        fn(item)
+    times = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        times.append(time.perf_counter() - start)
+    return stats(times)
+
+
+def load_frames(directory, width, height):
+    frames = []
+    for name in sorted(os.listdir(directory)):
+        img = cv2.imread(os.path.join(directory, name))
+        if img is not None:
+            frames.append(cv2.resize(img, (width, height)))
+    return frames
+
+
+def bench_detection(frames, backend, fallback):
+    from face_detectors import create_detector
+    detector = create_detector(backend, fallback=fallback)
+    # BGR in, as the recognition workers call it (analyze_frame)
+    result = time_calls(lambda frame: run_detector(detector, frame, 'bgr'), frames)
+    result["backend"] = type(detector).__name__
+    return result, detector
+
+
+def face_crops(frames, detector, faces_per_frame):
+    """Detected face crops per frame; fixed centre crops when nothing is detected."""
+    crops = []
+    for frame in frames:
+        faces = run_detector(detector, frame, 'bgr') if detector else []
+        boxes = [f['box'] for f in faces] or [(frame.shape[1] // 2 - 60, frame.shape[0] // 2 - 60, 120, 120)] * faces_per_frame
+        crops.append([frame[max(0, y):y + h, max(0, x):x + w] for x, y, w, h in boxes])
+    return crops
+
+
+def bench_embedding(crops):
+    from embedding_engine import FaceNetEmbedder
+    embedder = FaceNetEmbedder()
+    result = time_calls(lambda frame_crops: embedder.embed(frame_crops, color='bgr'), crops)
+    result["faces_per_frame"] = round(float(np.mean([len(c) for c in crops])), 2)
+    return result
+
+
+def bench_matching(sizes, matchers, frames, faces_per_frame):
+    results = {}
+    for size in sizes:
+        embeddings, labels = make_gallery(max(1, size // 15))
+        queries, _ = make_queries(embeddings, frames * faces_per_frame)
+        batches = [queries[i:i + faces_per_frame] for i in range(0, len(queries), faces_per_frame)]
+        for kind in matchers:
+            start = time.perf_counter()
+            matcher = build_matcher(kind, embeddings, labels)
+            build_s = time.perf_counter() - start
+            result = time_calls(lambda batch: matcher.match(batch, SIMILARITY_THRESHOLD), batches)
+            result["gallery_vectors"] = len(labels)
+            result["build_seconds"] = round(build_s, 3)
+            results[f"matching/{kind}/{size}"] = result
+    return results
+
+
+def moving_boxes(frames, faces_per_frame, seed=0):
+    rng = np.random.default_rng(seed)
+    start = rng.uniform(0, 500, size=(faces_per_frame, 2))
+    velocity = rng.uniform(-4, 4, size=(faces_per_frame, 2))
+    return [[(float(x), float(y), 80.0, 80.0) for x, y in start + t * velocity] for t in range(frames)]
+
+
+def bench_smoothing(frames, faces_per_frame):
+    tracks = TrackManager(vote_size=8)
+    per_frame = moving_boxes(frames, faces_per_frame)
+    observations = [(f"S{i}", 0.8) for i in range(faces_per_frame)]
+    clock = iter(range(10 ** 9))
+    return time_calls(lambda boxes: tracks.update(boxes, observations, now=next(clock) / 30.0), per_frame)
+
+
+class _TracksOnlyEngine:
+    """Stands in for FaceRecognizer in process_frame: live tracks to draw, no workers."""
+
+    def __init__(self, faces_per_frame):
+        self.tracks = TrackManager()
+        self.boxes = [(x % 300, y % 300, w, h) for x, y, w, h in moving_boxes(1, faces_per_frame)[0]]
+        self.tracks.update(self.boxes, [(f"S{i}", 0.8) for i in range(faces_per_frame)])
+
+    def refresh(self):
+        """Keeps the tracks recent enough for process_frame to draw them."""
+        self.tracks.update(self.boxes, [None] * len(self.boxes))
+
+    def submit_frame(self, frame, captured_at=None):
+        return 0
+
+    def get_latest_result(self):
+        return None
+
+    def latency_stats(self):
+        return {'last_ms': None}
+
+
+def bench_overlay(frames, faces_per_frame):
+    import rec_faces
+    rec_faces.session_active = False  # draw only, never touch attendance records
+    rec_faces.recognizer = _TracksOnlyEngine(faces_per_frame)
+
+    def overlay(frame):
+        rec_faces.recognizer.refresh()
+        rec_faces.process_frame(frame.copy())
+    try:
+        return time_calls(overlay, frames)
+    finally:
+        rec_faces.recognizer = None
+
+
+def skipped(error):
+    return {"skipped": f"{type(error).__name__}: {error}"}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} (commit {baseline.get('commit')}), p50 ms")
+    print(f"{'stage':<28} {'base':>10} {'now':>10} {'ratio':>7}")
+    for stage, now in results["stages"].items():
+        base = baseline.get("stages", {}).get(stage, {})
+        if "p50_ms" not in now or "p50_ms" not in base:
+            continue
+        ratio = now["p50_ms"] / base["p50_ms"] if base["p50_ms"] else float('inf')
+        print(f"{stage:<28} {base['p50_ms']:>10.3f} {now['p50_ms']:>10.3f} {ratio:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage recognition pipeline benchmark")
+    parser.add_argument("--frames", help="directory of recorded frames instead of synthetic ones")
+    parser.add_argument("--n-frames", type=int, default=50)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--faces", type=int, default=4, help="faces per frame")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000, 200000], help="gallery vectors")
+    parser.add_argument("--matchers", nargs="+", default=["brute", "prototype", "ivf"])
+    parser.add_argument("--detector", default="yunet")
+    parser.add_argument("--fallback", default="haar", help="detector used when --detector's model file is missing")
+    parser.add_argument("--skip", nargs="*", default=[], choices=["detection", "embedding", "matching", "smoothing", "overlay"])
+    parser.add_argument("--json", help="write results to this path")
+    parser.add_argument("--compare", help="previous --json output to compare against")
+    args = parser.parse_args()
+
+    frames = (load_frames(args.frames, args.width, args.height) if args.frames
+              else make_frames(args.n_frames, args.width, args.height, args.faces))
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "machine": {"cpu_count": os.cpu_count(), "platform": platform.platform(),
+                    "python": platform.python_version(), "numpy": np.__version__, "opencv": cv2.__version__},
+        "config": {"frames": len(frames), "width": args.width, "height": args.height, "faces_per_frame": args.faces,
+                   "source": args.frames or "synthetic"},
+        "stages": {},
+    }
+    stages = results["stages"]
+
+    detector = None
+    if "detection" not in args.skip:
+        try:
+            stages["detection"], detector = bench_detection(frames, args.detector, args.fallback)
+        except Exception as e:
+            stages["detection"] = skipped(e)
+    if "embedding" not in args.skip:
+        try:
+            stages["embedding"] = bench_embedding(face_crops(frames, detector, args.faces))
+        except Exception as e:
+            stages["embedding"] = skipped(e)
+    if "matching" not in args.skip:
+        stages.update(bench_matching(args.sizes, args.matchers, len(frames), args.faces))
+    if "smoothing" not in args.skip:
+        stages["smoothing"] = bench_smoothing(len(frames), args.faces)
+    if "overlay" not in args.skip:
+        try:
+            stages["overlay"] = bench_overlay(frames, args.faces)
+        except Exception as e:
+            stages["overlay"] = skipped(e)
+
+    print(f"commit {results['commit']}, {len(frames)} frames {args.width}x{args.height}, {args.faces} faces/frame")
+    print(f"{'stage':<28} {'mean ms':>10} {'p50 ms':>10} {'p95 ms':>10}")
+    for stage, r in stages.items():
+        if "skipped" in r:
+            print(f"{stage:<28} skipped ({r['skipped']})")
+        else:
+            print(f"{stage:<28} {r['mean_ms']:>10.3f} {r['p50_ms']:>10.3f} {r['p95_ms']:>10.3f}")
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# benchmarks/bench_worker_pool.py
+# Recognised-FPS scaling curve of the FaceRecognizer worker pool.
+#
+# Feeds the same ROI-sized frame (built from tests/obama.jpg and tests/bill.jpg)
+# as fast as the pool accepts it and counts results per second, with the
+# capture-to-result latency.
+#
+# Usage:
+#   python benchmarks/bench_worker_pool.py --workers 1 2 4 8 --mode thread process
+import os
+import sys
+import time
+import argparse
+import json
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+import cv2
+import numpy as np
+
+from face_recognizer import FaceRecognizer
+
+ROI_SIZE = 400
+
+
+def make_frame():
+    """Two known faces side by side on a ROI-sized canvas, BGR like rec_faces submits."""
+    canvas = np.zeros((ROI_SIZE, ROI_SIZE, 3), dtype=np.uint8)
+    for i, name in enumerate(("obama.jpg", "bill.jpg")):
+        img = cv2.imread(os.path.join(ROOT, "tests", name))
+        if img is None:
+            continue
+        face = cv2.resize(img, (ROI_SIZE // 2, ROI_SIZE // 2))
+        canvas[ROI_SIZE // 4:ROI_SIZE // 4 + ROI_SIZE // 2, i * ROI_SIZE // 2:(i + 1) * ROI_SIZE // 2] = face
+    return canvas
+
+
+def measure(mode, workers, frame, seconds, warmup):
+    recognizer = FaceRecognizer('Facenet', num_workers=workers, worker_mode=mode)
+    try:
+        deadline = time.time() + warmup
+        while time.time() < deadline:
+            recognizer.submit_frame(frame)
+            recognizer.get_latest_result()
+            time.sleep(0.001)
+        # Results overwrite each other in the mailbox, so count deliveries rather than reads
+        delivered = recognizer.results_delivered
+        start = time.time()
+        while time.time() - start < seconds:
+            recognizer.submit_frame(frame)
+            recognizer.get_latest_result()
+            time.sleep(0.001)
+        return (recognizer.results_delivered - delivered) / (time.time() - start), recognizer.latency_stats()
+    finally:
+        recognizer.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FaceRecognizer worker pool scaling benchmark")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--mode", nargs="+", default=["thread", "process"], choices=["thread", "process"])
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--warmup", type=float, default=10.0, help="model load / graph compile time to skip")
+    parser.add_argument("--json", help="also write the curve to this path")
+    args = parser.parse_args()
+
+    frame = make_frame()
+    curve = []
+    print(f"CPU cores: {os.cpu_count()}")
+    print(f"{'mode':>8} {'workers':>8} {'results/s':>10} {'speedup':>8} {'p95 ms':>8}")
+    for mode in args.mode:
+        base = None
+        for workers in args.workers:
+            fps, latency = measure(mode, workers, frame, args.seconds, args.warmup)
+            base = base or fps
+            curve.append({"mode": mode, "workers": workers, "results_per_second": round(fps, 2),
+                          "latency_p95_ms": latency['p95_ms']})
+            print(f"{mode:>8} {workers:>8} {fps:>10.2f} {fps / base if base else 0:>8.2f} {latency['p95_ms'] or 0:>8.1f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"cpu_count": os.cpu_count(), "curve": curve}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
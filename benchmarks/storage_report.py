@@ -0,0 +1,46 @@
+# benchmarks/storage_report.py
+# Accuracy and memory of compact gallery storage (float16/int8) against float32.
+#
+# Usage:
+#   python benchmarks/storage_report.py --students 20000
+#   python benchmarks/storage_report.py --from-db
+import os
+import sys
+import time
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_matcher import GalleryMatcher, storage_accuracy, STORAGE_TYPES
+from synthetic import make_gallery, make_queries
+from ann_report import load_db_gallery
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact gallery storage report")
+    parser.add_argument("--students", type=int, default=5000, help="synthetic students (15 vectors each)")
+    parser.add_argument("--from-db", action="store_true", help="use every active student's embeddings instead")
+    parser.add_argument("--queries", type=int, default=400)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.from_db:
+        embeddings, labels = load_db_gallery()
+    else:
+        embeddings, labels = make_gallery(args.students)
+    queries, _ = make_queries(embeddings, args.queries)
+
+    print(f"Gallery: {len(labels)} vectors")
+    print(f"{'storage':>8} {'MB':>8} {'x smaller':>10} {'top-' + str(args.k) + ' agree':>12} {'max err':>9} {'ms/frame':>9}")
+    for storage in STORAGE_TYPES:
+        report = storage_accuracy(embeddings, queries, storage, k=args.k)
+        matcher = GalleryMatcher(embeddings, labels, storage=storage)
+        start = time.perf_counter()
+        for i in range(0, len(queries), 8):
+            matcher.search(queries[i:i + 8], k=args.k)
+        ms = (time.perf_counter() - start) * 1000 / max(1, len(queries) // 8)
+        print(f"{storage:>8} {report['bytes'] / 1e6:>8.1f} {report['compression_vs_float32']:>10.2f} "
+              f"{report['topk_agreement']:>12.4f} {report['max_score_error']:>9.5f} {ms:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
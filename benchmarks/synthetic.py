@@ -0,0 +1,57 @@
+# benchmarks/synthetic.py
+# Synthetic enrollment galleries shaped like add_faces.py output.
+import numpy as np
+
+
+def make_gallery(n_students, poses=3, frames_per_pose=5, dim=128, pose_spread=0.6, noise=0.25, seed=0):
+    """
+    Returns (embeddings, labels) with `poses * frames_per_pose` unit vectors per
+    student: one identity centre, a centre per pose around it, and frame noise
+    around each pose centre.
+    """
+    rng = np.random.default_rng(seed)
+    identity = rng.normal(size=(n_students, 1, 1, dim))
+    pose = identity + pose_spread * rng.normal(size=(n_students, poses, 1, dim))
+    frames = pose + noise * rng.normal(size=(n_students, poses, frames_per_pose, dim))
+    embeddings = frames.reshape(-1, dim).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    labels = [str(10000 + s) for s in range(n_students) for _ in range(poses * frames_per_pose)]
+    return embeddings, labels
+
+
+def make_queries(embeddings, n_queries, noise=0.3, seed=1):
+    """
+    Returns (queries, source_rows): copies of random gallery rows perturbed by
+    noise of total length `noise`, standing in for live faces.
+    """
+    rng = np.random.default_rng(seed)
+    dim = embeddings.shape[1]
+    rows = rng.integers(0, embeddings.shape[0], n_queries)
+    queries = embeddings[rows] + noise / np.sqrt(dim) * rng.normal(size=(n_queries, dim))
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return queries.astype(np.float32), rows
+
+
+def make_frames(n_frames, width=640, height=480, faces_per_frame=4, seed=0):
+    """
+    BGR frames with the tests/ portraits pasted at random sizes and positions
+    on a grey canvas, standing in for camera frames.
+    """
+    import os
+    import cv2
+    tests_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests")
+    sources = [img for img in (cv2.imread(os.path.join(tests_dir, name)) for name in ("obama.jpg", "bill.jpg"))
+               if img is not None]
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(n_frames):
+        frame = np.full((height, width, 3), 90, dtype=np.uint8)
+        for _ in range(faces_per_frame if sources else 0):
+            img = sources[rng.integers(len(sources))]
+            scale = rng.uniform(0.15, 0.45) * min(height / img.shape[0], width / img.shape[1])
+            small = cv2.resize(img, (max(1, int(img.shape[1] * scale)), max(1, int(img.shape[0] * scale))))
+            y = rng.integers(0, height - small.shape[0] + 1)
+            x = rng.integers(0, width - small.shape[1] + 1)
+            frame[y:y + small.shape[0], x:x + small.shape[1]] = small
+        frames.append(frame)
+    return frames
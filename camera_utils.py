@@ -1,39 +1,388 @@
 # camera_utils.py
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 
+# Candidates per camera source, in order of preference. All candidates of all
+# sources are opened concurrently; the first working one of a source is used.
+# DroidCam usually mounts as index 1. For IP Webcam / DroidCam over Wi-Fi add
+# its URL, e.g. "http://192.168.x.x:4747/video".
+CAMERA_SOURCES = {
+    "DroidCam (Phone)": [1],
+    "Laptop Webcam": [0],
+}
+
+
+def _open_candidate(candidate, reads=3):
+    """Opens one index/URL and reads a frame. Returns (cap, capabilities) or None."""
+    start = time.time()
+    cap = cv2.VideoCapture(candidate)
+    if cap.isOpened():
+        for _ in range(reads):
+            ret, frame = cap.read()
+            if ret and frame is not None:
+                return cap, {
+                    "candidate": candidate,
+                    "width": frame.shape[1],
+                    "height": frame.shape[0],
+                    "fps": cap.get(cv2.CAP_PROP_FPS) or None,
+                    "backend": cap.getBackendName(),
+                    "open_seconds": round(time.time() - start, 2),
+                }
+    cap.release()
+    return None
+
+
+def probe_source(candidates):
+    """
+    Opens every candidate concurrently and keeps the first working one in list
+    order (the others are released). Returns (cap, capabilities) or None.
+    """
+    if not candidates:
+        return None
+    with ThreadPoolExecutor(max_workers=len(candidates)) as pool:
+        results = list(pool.map(_open_candidate, candidates))
+    found = next((r for r in results if r is not None), None)
+    for result in results:
+        if result is not None and result is not found:
+            result[0].release()
+    return found
+
+
+def probe_sources(sources):
+    """probe_source for every {source_name: candidates} at once. Returns {source_name: result or None}."""
+    with ThreadPoolExecutor(max_workers=max(1, len(sources))) as pool:
+        futures = {name: pool.submit(probe_source, candidates) for name, candidates in sources.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+
 def initialize_camera(prefer_droidcam=True):
     """
     Attempts to open DroidCam (Index 1). 
     If fails, falls back to Laptop Webcam (Index 0).
+    Both are probed at the same time, so a missing phone costs no extra wait.
     
     Returns:
         cap: The OpenCV video capture object
-        source_name: String ('DroidCam' or 'Webcam')
+        source_name: String ('DroidCam (Phone)' or 'Laptop Webcam')
         warning_message: Message if fallback occurred, else None
     """
-    # 1. Try Phone First (Index 1)
-    if prefer_droidcam:
-        print("[CAMERA] Attempting to connect to DroidCam (Index 1)...")
-        # DroidCam usually mounts as Index 1. 
-        # If using IP Webcam (URL), change 1 to "http://192.168.x.x:8080/video"
-        cap = cv2.VideoCapture(1) 
-        
-        if cap.isOpened():
-            ret, frame = cap.read()
-            if ret and frame is not None:
-                print("[CAMERA] Success: Connected to DroidCam.")
-                return cap, "DroidCam (Phone)", None
-            else:
-                cap.release()
-    
-    # 2. Fallback to Webcam (Index 0)
-    print("[CAMERA] Falling back to Laptop Webcam (Index 0)...")
-    cap = cv2.VideoCapture(0)
-    
-    if not cap.isOpened():
+    names = ["DroidCam (Phone)", "Laptop Webcam"] if prefer_droidcam else ["Laptop Webcam"]
+    print(f"[CAMERA] Probing {', '.join(names)}...")
+    found = probe_sources({name: CAMERA_SOURCES[name] for name in names})
+
+    # 1. Phone first
+    if prefer_droidcam and found["DroidCam (Phone)"]:
+        if found["Laptop Webcam"]:
+            found["Laptop Webcam"][0].release()
+        print("[CAMERA] Success: Connected to DroidCam.")
+        return found["DroidCam (Phone)"][0], "DroidCam (Phone)", None
+
+    # 2. Fallback to Webcam
+    if not found["Laptop Webcam"]:
         return None, "None", "CRITICAL: No Camera Found!"
+    print("[CAMERA] Using Laptop Webcam.")
     
     # If we wanted DroidCam but got Webcam, return a warning
     warning = "Phone Not Detected - Using Webcam" if prefer_droidcam else None
     
-    return cap, "Laptop Webcam", warning
\ No newline at end of file
+    return found["Laptop Webcam"][0], "Laptop Webcam", warning
+
+
+class FrameGrabber:
+    """
+    Decodes frames from an opened VideoCapture on a dedicated thread, so a
+    slow camera (DroidCam, USB hubs) never stalls the UI loop and frames do
+    not pile up stale inside OpenCV.
+
+    Three reused buffers rotate between the capture thread (writing), the
+    latest complete frame, and the one consumer (the frame it got from the
+    last read()). A frame returned by read() stays valid until the next
+    read(); copy it to keep it longer. Frames the consumer did not read in
+    time are skipped, never queued.
+
+    After `max_failures` consecutive failed reads the thread ends with `lost`
+    set; CameraManager then reopens the device and calls replace_capture(),
+    which resumes decoding only if the grabber was started and not stop()ped
+    since (start() on a lost grabber just asks for that).
+    """
+
+    def __init__(self, cap, source_name=None, max_failures=30):
+        self.cap = cap
+        self.source_name = source_name
+        self.max_failures = max_failures  # consecutive failed reads before the camera counts as lost
+        self.frames_read = 0
+        self.frames_skipped = 0  # decoded frames replaced before any read()
+        self._back = None  # capture thread's buffer
+        self._latest = None  # (frame, captured_at, seq) of the newest complete frame
+        self._held = None  # buffer returned by the last read()
+        self._spare = None  # buffer the consumer gave back on its last read()
+        self._last_seq = 0
+        self._lock = threading.Lock()
+        self._fresh = threading.Condition(self._lock)
+        self._running = False
+        self._wanted = False  # start()ed and not stop()ped: replace_capture() resumes decoding
+        self._thread = None
+        self.lost = False
+
+    def start(self):
+        """Starts (or resumes after stop()) decoding; frames from before a pause are never returned."""
+        with self._lock:
+            self._wanted = True
+            self._resume()
+        return self
+
+    def _resume(self):
+        """Starts the capture thread unless it is running or the device is lost. Under the lock."""
+        if self._running or self.lost:
+            return
+        self._latest = None
+        self._running = True
+        # A thread stop() gave up waiting for (still inside cap.read()) has not
+        # exited yet and simply carries on; never start a second reader next to it
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _exit(self, lost=False):
+        """Ends the capture thread. Called under the lock, so start() sees it either looping or gone."""
+        self.lost = lost
+        self._running = False
+        self._thread = None
+        self._fresh.notify_all()
+
+    def _run(self):
+        failures = 0
+        while True:
+            with self._lock:
+                if not self._running:
+                    self._exit()
+                    return
+            ok, frame = self.cap.read(self._back) if self._back is not None else self.cap.read()
+            if not ok or frame is None:
+                failures += 1
+                if failures >= self.max_failures:
+                    with self._lock:
+                        self._exit(lost=True)
+                    return
+                time.sleep(0.01)
+                continue
+            failures = 0
+            captured_at = time.time()
+            with self._lock:
+                self.frames_read += 1
+                old = self._latest
+                if old is not None and old[2] > self._last_seq:
+                    self.frames_skipped += 1
+                self._latest = (frame, captured_at, self.frames_read)
+                # Next buffer to write: the replaced latest frame unless the consumer
+                # holds it, else the one the consumer gave back (None allocates)
+                if old is not None and old[0] is not self._held:
+                    self._back = old[0]
+                else:
+                    self._back, self._spare = self._spare, None
+                self._fresh.notify_all()
+
+    def read(self, timeout=1.0):
+        """
+        Returns (ok, frame, captured_at) for the newest frame not returned
+        before. Waits up to `timeout` seconds for one (0 = never wait);
+        (False, None, None) when there is none or the camera stopped.
+        """
+        with self._lock:
+            if (self._latest is None or self._latest[2] <= self._last_seq) and timeout and self._running:
+                self._fresh.wait_for(lambda: not self._running or (self._latest is not None and self._latest[2] > self._last_seq),
+                                     timeout)
+            if self._latest is None or self._latest[2] <= self._last_seq:
+                return False, None, None
+            frame, captured_at, seq = self._latest
+            self._last_seq = seq
+            if self._held is not None and self._held is not frame:
+                self._spare = self._held
+            self._held = frame
+            return True, frame, captured_at
+
+    @property
+    def running(self):
+        return self._running
+
+    def isOpened(self):
+        return self._running and self.cap is not None and self.cap.isOpened()
+
+    def stop(self, timeout=2.0):
+        """
+        Stops decoding but keeps the device open, so start() resumes instantly.
+        Waits up to `timeout` for a read in progress to finish.
+        """
+        with self._lock:
+            self._wanted = False
+        self._halt(timeout)
+
+    def _halt(self, timeout=2.0):
+        with self._lock:
+            self._running = False
+            thread = self._thread
+            self._fresh.notify_all()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=timeout)
+
+    def release(self):
+        """Stops the capture thread and releases the camera."""
+        self.stop()
+        self.cap.release()
+
+    def replace_capture(self, cap):
+        """
+        Swaps in a reopened device (after `lost`); consumers keep this grabber.
+        Decoding resumes only if the grabber is still wanted (started, not stopped).
+        """
+        self._halt()
+        self.cap.release()
+        self.cap = cap
+        with self._lock:
+            self._back = self._spare = None
+            self.lost = False
+            if self._wanted:
+                self._resume()
+
+
+def open_camera(prefer_droidcam=True):
+    """
+    initialize_camera() with the result wrapped in a started FrameGrabber.
+    Returns (grabber or None, source_name, warning_message).
+    """
+    cap, source_name, warning = initialize_camera(prefer_droidcam=prefer_droidcam)
+    if cap is None:
+        return None, source_name, warning
+    return FrameGrabber(cap, source_name).start(), source_name, warning
+
+
+class CameraManager:
+    """
+    Owns the lecturer's cameras for the whole application run.
+
+    start_probing() opens every candidate of every source in CAMERA_SOURCES
+    concurrently (at app start) and caches the working handles with their
+    capabilities (resolution, fps, backend, open time). acquire() turns the
+    chosen source's handle into a FrameGrabber that is kept across sessions:
+    between sessions call its stop(), the next acquire() resumes it without
+    reopening the device. A watchdog thread reopens lost devices in the
+    background and swaps them into the same grabber.
+    """
+
+    def __init__(self, sources=None, reconnect_interval=2.0):
+        self.sources = dict(sources or CAMERA_SOURCES)
+        self.reconnect_interval = reconnect_interval
+        self.capabilities = {}  # source -> capabilities of its working handle
+        self._probes = {}  # source -> Future of probe_source(...)
+        self._grabbers = {}  # source -> FrameGrabber
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.sources)), thread_name_prefix="camera-probe")
+        self._closed = threading.Event()
+        self._watchdog = None
+
+    def start_probing(self, sources=None):
+        """Probes the given sources (default: all) in the background; returns immediately."""
+        with self._lock:
+            for source in sources or self.sources:
+                probe = self._probes.get(source)
+                if source in self._grabbers or (probe is not None and not probe.done()):
+                    continue
+                if probe is not None and probe.result() is not None:
+                    continue  # handle already cached
+                self._probes[source] = self._executor.submit(self._probe, source)
+
+    def _probe(self, source):
+        try:
+            found = probe_source(self.sources.get(source, []))
+        except Exception as e:
+            print(f"[CAMERA] Probing {source} failed: {e}")
+            return None
+        if found is not None:
+            self.capabilities[source] = found[1]
+            print(f"[CAMERA] {source} available: {found[1]['width']}x{found[1]['height']} "
+                  f"({found[1]['backend']}, opened in {found[1]['open_seconds']}s)")
+        return found
+
+    def wait(self, source, timeout=10.0):
+        """
+        Capabilities of `source`, waiting up to `timeout` for its probe, or None
+        if it is not available. A source that failed before is probed again.
+        """
+        with self._lock:
+            if source in self._grabbers:
+                return self.capabilities.get(source)
+            probe = self._probes.get(source)
+            if probe is not None and probe.done() and probe.result() is None:
+                self._probes.pop(source, None)  # e.g. the phone app was started after launch
+        self.start_probing([source])
+        with self._lock:
+            probe = self._probes.get(source)
+            if probe is None:
+                # Taken by a concurrent acquire() (now a grabber) or dropped by close()
+                return self.capabilities.get(source) if source in self._grabbers else None
+        try:
+            found = probe.result(timeout=timeout)
+        except Exception:
+            return None
+        return found[1] if found else None
+
+    def acquire(self, source, timeout=10.0):
+        """
+        FrameGrabber for `source` (started), or None when the device cannot be
+        opened. Idle handles of other sources are released, so only the camera
+        in use stays open.
+        """
+        with self._lock:
+            grabber = self._grabbers.get(source)
+        if grabber is None:
+            if self.wait(source, timeout) is None:
+                return None
+            with self._lock:
+                grabber = self._grabbers.get(source)
+                if grabber is None:
+                    probe = self._probes.pop(source, None)
+                    if probe is None or not probe.done() or probe.result() is None:
+                        return None  # closed meanwhile
+                    grabber = self._grabbers[source] = FrameGrabber(probe.result()[0], source)
+                for other, probe in list(self._probes.items()):
+                    if other != source and probe.done() and probe.result() is not None:
+                        self._probes.pop(other).result()[0].release()
+                for other in [o for o, g in self._grabbers.items() if o != source and not g.running]:
+                    self._grabbers.pop(other).release()
+        grabber.start()  # a lost device resumes once the watchdog has reopened it
+        self._start_watchdog()
+        return grabber
+
+    def _start_watchdog(self):
+        if self._watchdog is None:
+            self._watchdog = threading.Thread(target=self._watch, daemon=True)
+            self._watchdog.start()
+
+    def _watch(self):
+        while not self._closed.wait(self.reconnect_interval):
+            with self._lock:
+                lost = [(source, g) for source, g in self._grabbers.items() if g.lost]
+            for source, grabber in lost:
+                found = self._probe(source)
+                if found is None or self._closed.is_set():
+                    if found is not None:
+                        found[0].release()
+                    continue
+                grabber.replace_capture(found[0])
+                print(f"[CAMERA] Reconnected {source}.")
+
+    def close(self):
+        """Releases every device. Call once when the application exits."""
+        self._closed.set()
+        self._executor.shutdown(wait=False)
+        with self._lock:
+            for grabber in self._grabbers.values():
+                grabber.release()
+            self._grabbers.clear()
+            for probe in self._probes.values():
+                if probe.done() and probe.result() is not None:
+                    probe.result()[0].release()
+            self._probes.clear()
@@ -0,0 +1,65 @@
+# embedding_engine.py
+# Batched FaceNet inference on already-detected face crops.
+import cv2
+import numpy as np
+
+
+class FaceNetEmbedder:
+    """
+    Runs the Keras model behind DeepFace.build_model('Facenet') directly.
+    DeepFace.represent re-runs its own detector and preprocessing on every
+    crop and returns Python lists. This class instead letterboxes all crops
+    into one preallocated uint8 batch, normalises the batch in a single
+    vectorised step and runs one forward pass.
+
+    Preprocessing matches DeepFace: crops are resized with aspect ratio kept,
+    zero-padded to the model input, put in BGR order and scaled to [0, 1].
+    Crops passed in are assumed to be detector boxes already.
+    """
+
+    def __init__(self, model=None, model_name='Facenet', max_batch=16):
+        if model is None:
+            from deepface import DeepFace
+            model = DeepFace.build_model(model_name)
+        # DeepFace >= 0.0.80 wraps the Keras model; older versions return it directly
+        self.model = getattr(model, 'model', model)
+        shape = tuple(self.model.input_shape)
+        self.channels_first = shape[1] == 3
+        self.input_h, self.input_w = (shape[2], shape[3]) if self.channels_first else (shape[1], shape[2])
+        self.max_batch = max(1, int(max_batch))
+        self._pixels = np.zeros((self.max_batch, self.input_h, self.input_w, 3), dtype=np.uint8)
+        self._batch = np.zeros((self.max_batch, self.input_h, self.input_w, 3), dtype=np.float32)
+        if self.channels_first:
+            self._batch_nchw = np.zeros((self.max_batch, 3, self.input_h, self.input_w), dtype=np.float32)
+
+    def _letterbox(self, crop, slot):
+        """Resize keeping aspect ratio and centre into slot, which is zero elsewhere."""
+        h, w = crop.shape[:2]
+        factor = min(self.input_h / h, self.input_w / w)
+        nh, nw = max(1, int(h * factor)), max(1, int(w * factor))
+        top, left = (self.input_h - nh) // 2, (self.input_w - nw) // 2
+        slot[:] = 0
+        slot[top:top + nh, left:left + nw] = cv2.resize(crop, (nw, nh))
+
+    def preprocess(self, crops, color='rgb'):
+        """Fills the batch tensor for up to max_batch crops and returns a view of it."""
+        n = len(crops)
+        for i, crop in enumerate(crops):
+            self._letterbox(crop, self._pixels[i])
+        # DeepFace feeds Facenet BGR in [0, 1]
+        pixels = self._pixels[:n, :, :, ::-1] if color == 'rgb' else self._pixels[:n]
+        np.multiply(pixels, np.float32(1.0 / 255.0), out=self._batch[:n])
+        if self.channels_first:
+            self._batch_nchw[:n] = self._batch[:n].transpose(0, 3, 1, 2)
+            return self._batch_nchw[:n]
+        return self._batch[:n]
+
+    def embed(self, crops, color='rgb'):
+        """Returns an (n, d) float32 array of raw embeddings, one row per crop."""
+        if len(crops) == 0:
+            return np.zeros((0, self.model.output_shape[-1]), dtype=np.float32)
+        out = []
+        for start in range(0, len(crops), self.max_batch):
+            batch = self.preprocess(crops[start:start + self.max_batch], color)
+            out.append(np.asarray(self.model(batch, training=False), dtype=np.float32))
+        return np.concatenate(out) if len(out) > 1 else out[0]
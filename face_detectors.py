@@ -0,0 +1,211 @@
+# face_detectors.py
+# Interchangeable face detector backends with the MTCNN output format.
+#
+# Every backend takes an RGB frame (or BGR with color='bgr') and returns a list of
+#   {'box': [x, y, w, h], 'confidence': float, 'keypoints': {...}}
+# The OpenCV backends work on BGR natively, so the recognition workers pass
+# camera frames as BGR (run_detector) and only MTCNN converts.
+# Keypoint names follow MTCNN (left_eye, right_eye, nose, mouth_left, mouth_right,
+# left/right as seen in the image). Backends without landmarks return {}.
+# `min_face_size` is roughly the smallest face (in input pixels) each backend
+# finds reliably; ScaledDetector uses it to pick a detection scale.
+import os
+import logging
+
+import cv2
+import numpy as np
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+KEYPOINT_NAMES = ('left_eye', 'right_eye', 'nose', 'mouth_left', 'mouth_right')
+
+
+def _require(path, backend):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{backend} model not found at {path}. Download it into {MODELS_DIR} or pass its path.")
+    return path
+
+
+class MTCNNDetector:
+    """MTCNN (TensorFlow). Most accurate, slowest on CPU."""
+    name = 'mtcnn'
+    accepts_color = True
+    min_face_size = 20
+
+    def __init__(self, min_confidence=0.0, **mtcnn_options):
+        from mtcnn import MTCNN
+        self.detector = MTCNN(**mtcnn_options)
+        self.min_face_size = mtcnn_options.get('min_face_size', self.min_face_size)
+        self.min_confidence = min_confidence
+
+    def detect_faces(self, frame, color='rgb'):
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) if color == 'bgr' else frame
+        return [f for f in self.detector.detect_faces(rgb_frame) if f.get('confidence', 1.0) >= self.min_confidence]
+
+
+class YuNetDetector:
+    """OpenCV DNN YuNet (cv2.FaceDetectorYN). Fast on CPU, gives 5 landmarks."""
+    name = 'yunet'
+    accepts_color = True
+    min_face_size = 16
+
+    def __init__(self, model_path=None, min_confidence=0.7, nms_threshold=0.3, top_k=500):
+        model_path = _require(model_path or os.path.join(MODELS_DIR, "face_detection_yunet_2023mar.onnx"), "YuNet")
+        self.detector = cv2.FaceDetectorYN.create(model_path, "", (320, 320), min_confidence, nms_threshold, top_k)
+        self._input_size = None
+
+    def detect_faces(self, frame, color='rgb'):
+        h, w = frame.shape[:2]
+        if self._input_size != (w, h):
+            self.detector.setInputSize((w, h))
+            self._input_size = (w, h)
+        _, rows = self.detector.detect(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR) if color == 'rgb' else frame)
+        faces = []
+        for row in rows if rows is not None else []:
+            x, y, bw, bh = (int(round(v)) for v in row[:4])
+            # YuNet landmarks: subject's right eye, left eye, nose, right mouth, left mouth
+            # (the subject's right is the image left, which is MTCNN's 'left_eye')
+            points = row[4:14].reshape(5, 2)
+            keypoints = {name: (int(round(px)), int(round(py))) for name, (px, py) in zip(KEYPOINT_NAMES, points)}
+            faces.append({'box': [x, y, bw, bh], 'confidence': float(row[14]), 'keypoints': keypoints})
+        return faces
+
+
+class SSDDetector:
+    """OpenCV DNN ResNet-10 SSD (res10_300x300). Fast, no landmarks."""
+    name = 'ssd'
+    accepts_color = True
+    min_face_size = 30  # at 300x300 input; the frame is resized to that anyway
+
+    def __init__(self, prototxt_path=None, model_path=None, min_confidence=0.6, input_size=300):
+        prototxt_path = _require(prototxt_path or os.path.join(MODELS_DIR, "deploy.prototxt"), "SSD prototxt")
+        model_path = _require(model_path or os.path.join(MODELS_DIR, "res10_300x300_ssd_iter_140000.caffemodel"), "SSD")
+        self.net = cv2.dnn.readNetFromCaffe(prototxt_path, model_path)
+        self.min_confidence = min_confidence
+        self.input_size = input_size
+
+    def detect_faces(self, frame, color='rgb'):
+        h, w = frame.shape[:2]
+        # The network wants BGR; blobFromImage swaps RGB input first, then subtracts the (BGR) mean
+        blob = cv2.dnn.blobFromImage(frame, 1.0, (self.input_size, self.input_size), (104.0, 117.0, 123.0),
+                                     swapRB=(color == 'rgb'))
+        self.net.setInput(blob)
+        detections = self.net.forward()[0, 0]
+        faces = []
+        for det in detections[detections[:, 2] >= self.min_confidence]:
+            x1, y1, x2, y2 = (det[3:7] * np.array([w, h, w, h])).astype(int)
+            x1, y1 = max(0, x1), max(0, y1)
+            if x2 <= x1 or y2 <= y1:
+                continue
+            faces.append({'box': [int(x1), int(y1), int(x2 - x1), int(y2 - y1)], 'confidence': float(det[2]), 'keypoints': {}})
+        return faces
+
+
+class HaarDetector:
+    """OpenCV Haar cascade. Ships with opencv-python; for low-end laptops. No landmarks."""
+    name = 'haar'
+    accepts_color = True
+
+    def __init__(self, cascade_path=None, scale_factor=1.1, min_neighbors=5, min_size=(40, 40)):
+        cascade_path = cascade_path or os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+        self.detector = cv2.CascadeClassifier(_require(cascade_path, "Haar cascade"))
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = tuple(min_size)
+        self.min_face_size = min(self.min_size)
+
+    def detect_faces(self, frame, color='rgb'):
+        gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY if color == 'rgb' else cv2.COLOR_BGR2GRAY)
+        boxes, _, weights = self.detector.detectMultiScale3(
+            gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+            minSize=self.min_size, outputRejectLevels=True)
+        faces = []
+        for (x, y, w, h), weight in zip(boxes, np.ravel(weights) if len(boxes) else []):
+            # Cascade level weight mapped to (0, 1) so thresholds are comparable across backends
+            confidence = float(1.0 / (1.0 + np.exp(-weight)))
+            faces.append({'box': [int(x), int(y), int(w), int(h)], 'confidence': confidence, 'keypoints': {}})
+        return faces
+
+
+class ScaledDetector:
+    """
+    Runs a backend on a downscaled copy of the frame and maps boxes and
+    keypoints back to full-resolution coordinates, so embedding crops are
+    still cut from full-resolution pixels. Detection time drops roughly with
+    the square of the scale, which lets the ROI grow to a whole lecture hall.
+
+    Either pass a fixed `scale` (e.g. 0.5), or `min_face`: the smallest face,
+    in full-resolution pixels, that must still be found. The scale is then
+    chosen so that face comes out at the backend's min_face_size.
+    `scale` may be changed between calls (see FaceRecognizer.set_detection_scale).
+    """
+
+    accepts_color = True
+
+    def __init__(self, detector, scale=None, min_face=None):
+        self.detector = detector
+        if min_face:
+            scale = getattr(detector, 'min_face_size', 20) / float(min_face)
+        self.scale = min(1.0, float(scale)) if scale else 1.0
+        self.name = getattr(detector, 'name', 'scaled')
+
+    @property
+    def min_face_size(self):
+        return getattr(self.detector, 'min_face_size', 20) / self.scale
+
+    def detect_faces(self, frame, color='rgb'):
+        if self.scale >= 1.0:
+            return run_detector(self.detector, frame, color)
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (max(1, int(w * self.scale)), max(1, int(h * self.scale))),
+                           interpolation=cv2.INTER_AREA)
+        # Map back with the actual resize ratio per axis (sizes are rounded down)
+        fx, fy = w / small.shape[1], h / small.shape[0]
+        faces = []
+        for face in run_detector(self.detector, small, color):
+            x, y, bw, bh = face['box']
+            face = dict(face)
+            face['box'] = [int(round(x * fx)), int(round(y * fy)), int(round(bw * fx)), int(round(bh * fy))]
+            face['keypoints'] = {k: (int(round(px * fx)), int(round(py * fy)))
+                                 for k, (px, py) in face.get('keypoints', {}).items()}
+            faces.append(face)
+        return faces
+
+
+def run_detector(detector, frame, color='rgb'):
+    """
+    detector.detect_faces on a frame in `color` order ('rgb' or 'bgr'). Detectors
+    without a color parameter (accepts_color unset) get the frame converted to RGB.
+    """
+    if color == 'rgb':
+        return detector.detect_faces(frame)
+    if getattr(detector, 'accepts_color', False):
+        return detector.detect_faces(frame, color=color)
+    return detector.detect_faces(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+
+DETECTORS = {
+    'mtcnn': MTCNNDetector,
+    'yunet': YuNetDetector,
+    'ssd': SSDDetector,
+    'haar': HaarDetector,
+}
+
+
+def create_detector(name='mtcnn', fallback=None, scale=None, min_face=None, **options):
+    """
+    Create a detector backend by name (see DETECTORS). If its model file is
+    missing and `fallback` is given, the fallback backend is used instead.
+    `scale` or `min_face` wrap the backend in a ScaledDetector.
+    """
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown detector '{name}'. Choose from: {', '.join(DETECTORS)}")
+    try:
+        detector = DETECTORS[name](**options)
+    except FileNotFoundError as e:
+        if not fallback or fallback == name:
+            raise
+        logging.warning(f"{e} Falling back to '{fallback}' detector.")
+        detector = DETECTORS[fallback]()
+    if scale or min_face:
+        detector = ScaledDetector(detector, scale=scale, min_face=min_face)
+    return detector
@@ -0,0 +1,554 @@
+# face_matcher.py
+# Gallery search for the FaceRecognizer worker.
+import numpy as np
+
+UNKNOWN_LABEL = "Unknown"
+STORAGE_TYPES = ('float32', 'float16', 'int8')
+SCORE_BLOCK_ROWS = 4096  # compact galleries are decoded this many rows at a time while scoring
+REMOVED_SCORE = -2.0  # below any cosine similarity; given to rows of removed identities
+HEADROOM_ROWS = 64  # spare rows reserved when a gallery is stored (at least; n // 16 for large ones)
+
+
+def normalize_rows(embeddings):
+    """
+    Returns embeddings as a C-contiguous float32 (n, d) matrix with unit-length rows.
+    Zero vectors are left as zeros instead of producing NaNs.
+    """
+    if embeddings is None or len(embeddings) == 0:
+        return np.zeros((0, 0), dtype=np.float32)
+    arr = np.asarray(embeddings, dtype=np.float32)
+    if arr.ndim == 1:
+        arr = arr.reshape(1, -1)
+    norms = np.linalg.norm(arr, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(arr / norms, dtype=np.float32)
+
+
+def quantize_rows(gallery, storage):
+    """
+    Encodes a float32 unit-vector gallery for compact storage.
+    Returns (stored, scales). scales is None except for 'int8', where each row
+    is stored as round(row / scale) with scale = max(|row|) / 127.
+    """
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown storage '{storage}'. Choose from: {', '.join(STORAGE_TYPES)}")
+    if storage == 'float32':
+        return gallery, None
+    if storage == 'float16':
+        return gallery.astype(np.float16), None
+    scales = np.abs(gallery).max(axis=1) / 127.0 if gallery.size else np.zeros(gallery.shape[0])
+    scales = scales.astype(np.float32)
+    safe = np.where(scales == 0, 1.0, scales)[:, None]
+    codes = np.clip(np.rint(gallery / safe), -127, 127).astype(np.int8)
+    return np.ascontiguousarray(codes), scales
+
+
+def top_k(scores, k):
+    """
+    Returns (top_scores, top_indices) for each row of a (n, m) score matrix,
+    best first. Uses argpartition so only the k winners get sorted.
+    """
+    n, m = scores.shape
+    k = max(1, min(int(k), m))
+    if k == m:
+        idx = np.argsort(-scores, axis=1)
+    else:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        part_scores = np.take_along_axis(scores, part, axis=1)
+        order = np.argsort(-part_scores, axis=1)
+        idx = np.take_along_axis(part, order, axis=1)
+    return np.take_along_axis(scores, idx, axis=1), idx
+
+
+class _RowBuffer:
+    """
+    Array that grows along its first axis with spare capacity, so appending
+    rows writes into the tail instead of copying the existing ones. It starts
+    with max(HEADROOM_ROWS, n // 16) spare rows, so a few late enrolments on a
+    freshly stored gallery never copy it; capacity doubles when full
+    (amortised). view is a slice of the live rows; rows already in a view are
+    never modified by later appends.
+    """
+
+    def __init__(self, rows):
+        rows = np.asarray(rows)
+        n = rows.shape[0]
+        self._buf = np.empty((n + max(HEADROOM_ROWS, n // 16),) + rows.shape[1:], dtype=rows.dtype)
+        self._buf[:n] = rows
+        self.size = n
+
+    @property
+    def view(self):
+        return self._buf[:self.size]
+
+    def append(self, rows):
+        rows = np.asarray(rows, dtype=self._buf.dtype)
+        end = self.size + rows.shape[0]
+        if self._buf.size == 0 and self._buf.ndim > 1 and self._buf.shape[1:] != rows.shape[1:]:
+            self._buf = np.empty((0,) + rows.shape[1:], dtype=self._buf.dtype)  # first rows fix the width
+        if end > self._buf.shape[0]:
+            grown = np.empty((max(end, 2 * self._buf.shape[0], 16),) + self._buf.shape[1:], dtype=self._buf.dtype)
+            grown[:self.size] = self._buf[:self.size]
+            self._buf = grown
+        self._buf[self.size:end] = rows
+        self.size = end
+
+
+class GalleryMatcher:
+    """
+    Brute-force cosine matcher.
+    The gallery is kept as one contiguous float32 matrix of unit vectors, so all
+    faces in a frame are scored with a single matrix multiply.
+    storage='float16' or 'int8' keeps the gallery in compact form instead and
+    scores it block by block (see quantize_rows).
+
+    add_identity/remove_identity change the gallery in place: new rows are
+    appended into spare capacity and removed rows are masked out, so neither
+    copies the gallery. compact() drops masked rows once they pile up.
+    The matcher does no locking; FaceRecognizer serialises mutations with matching.
+    """
+
+    def __init__(self, embeddings=None, labels=None, storage='float32'):
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Unknown storage '{storage}'. Choose from: {', '.join(STORAGE_TYPES)}")
+        self.storage = storage
+        self.set_gallery(embeddings, labels)
+
+    def set_gallery(self, embeddings, labels):
+        """Replace the gallery. Embeddings are normalized here."""
+        gallery = normalize_rows(embeddings)
+        self.labels = list(labels) if labels is not None else []
+        self._store(gallery)
+
+    def _store(self, gallery):
+        stored, scales = quantize_rows(gallery, self.storage)
+        self._set_rows(stored, scales)
+
+    def _set_rows(self, stored, scales):
+        self._rows = _RowBuffer(stored)
+        self._scales = _RowBuffer(scales) if scales is not None else None
+        self._removed = set()
+        self._removed_idx = np.zeros(0, dtype=np.int64)
+
+    @property
+    def gallery(self):
+        """Stored gallery rows (float32 unit vectors, or the compact encoding), removed rows included."""
+        return self._rows.view
+
+    @property
+    def scales(self):
+        return self._scales.view if self._scales is not None else None
+
+    @property
+    def n_active(self):
+        """Rows not removed."""
+        return len(self) - len(self._removed)
+
+    def add_identity(self, label, embeddings):
+        """
+        Appends one identity's embeddings (normalized here) without rebuilding.
+        Returns the new row indices.
+        """
+        rows = normalize_rows(embeddings)
+        if rows.shape[0] == 0:
+            return np.zeros(0, dtype=np.int64)
+        if len(self) and rows.shape[1] != self.gallery.shape[1]:
+            raise ValueError(f"Embedding size {rows.shape[1]} does not match the gallery ({self.gallery.shape[1]})")
+        stored, scales = quantize_rows(rows, self.storage)
+        start = len(self)
+        self._rows.append(stored)
+        if self._scales is not None:
+            self._scales.append(scales)
+        self.labels.extend([label] * rows.shape[0])
+        new_rows = np.arange(start, start + rows.shape[0], dtype=np.int64)
+        self._index_added(label, new_rows, rows)
+        return new_rows
+
+    def remove_identity(self, label):
+        """
+        Masks out every row of `label`; they no longer match. Returns the number
+        of rows removed. Compacts once more than half the rows are removed.
+        """
+        rows = np.array([i for i, l in enumerate(self.labels) if l == label and i not in self._removed], dtype=np.int64)
+        if rows.size == 0:
+            return 0
+        self._removed.update(rows.tolist())
+        self._removed_idx = np.array(sorted(self._removed), dtype=np.int64)
+        self._index_removed(label, rows)
+        if len(self._removed) * 2 > len(self):
+            self.compact()
+        return int(rows.size)
+
+    def compact(self):
+        """Physically drops removed rows (one copy); row indices change."""
+        if not self._removed:
+            return
+        keep = np.ones(len(self), dtype=bool)
+        keep[self._removed_idx] = False
+        self._compact(keep)
+
+    def _compact(self, keep):
+        scales = self.scales[keep] if self.scales is not None else None
+        self.set_gallery(self._decode(self.gallery[keep], scales), [l for l, k in zip(self.labels, keep) if k])
+
+    def _index_added(self, label, rows, normalized):
+        """Hook for indexes built on the gallery: rows were appended."""
+
+    def _index_removed(self, label, rows):
+        """Hook for indexes built on the gallery: rows were masked out."""
+
+    @property
+    def nbytes(self):
+        """Resident size of the stored gallery in bytes."""
+        return self.gallery.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __len__(self):
+        return self.gallery.shape[0]
+
+    def _decode(self, stored, scales):
+        block = stored.astype(np.float32)
+        if scales is not None:
+            block *= scales[:, None]
+        return block
+
+    def scores(self, queries):
+        """Cosine similarity of every query (already unit length) against every gallery row."""
+        if self.storage == 'float32':
+            return queries @ self.gallery.T
+        out = np.empty((queries.shape[0], len(self)), dtype=np.float32)
+        for start in range(0, len(self), SCORE_BLOCK_ROWS):
+            end = start + SCORE_BLOCK_ROWS
+            scales = self.scales[start:end] if self.scales is not None else None
+            out[:, start:end] = queries @ self._decode(self.gallery[start:end], scales).T
+        return out
+
+    def row_scores(self, rows, query):
+        """Similarity of one query against selected gallery rows."""
+        if self.storage == 'float32':
+            return self.gallery[rows] @ query
+        scales = self.scales[rows] if self.scales is not None else None
+        return self._decode(self.gallery[rows], scales) @ query
+
+    def search(self, queries, k=1):
+        """
+        Returns (scores, indices), both (n_queries, k), best match first.
+        Indices point into self.labels.
+        """
+        queries = normalize_rows(queries)
+        if self.n_active == 0 or queries.shape[0] == 0:
+            empty = np.zeros((queries.shape[0], 0))
+            return empty.astype(np.float32), empty.astype(np.int64)
+        scores = self.scores(queries)
+        if self._removed:
+            scores[:, self._removed_idx] = REMOVED_SCORE
+        return top_k(scores, min(int(k), self.n_active))
+
+    def match(self, queries, threshold):
+        """
+        Best (label, similarity) per query. Matches below threshold are
+        reported as UNKNOWN_LABEL with their best similarity.
+        """
+        n = len(queries) if queries is not None else 0
+        if n == 0:
+            return []
+        top_scores, top_idx = self.search(queries, k=1)
+        if top_idx.shape[1] == 0:
+            return [(UNKNOWN_LABEL, 0.0)] * n
+        results = []
+        for sim, idx in zip(top_scores[:, 0], top_idx[:, 0]):
+            sim = float(sim)
+            if sim <= REMOVED_SCORE:
+                results.append((UNKNOWN_LABEL, 0.0))
+                continue
+            label = self.labels[idx] if sim >= threshold else UNKNOWN_LABEL
+            results.append((label, sim))
+        return results
+
+
+class PrototypeIndex(GalleryMatcher):
+    """
+    Two-stage matcher for large classes.
+    Each student's embeddings are grouped in enrollment order into chunks of
+    `per_pose` (add_faces.py stores FRAMES_PER_POSE frames per pose), and each
+    chunk is reduced to a unit-length centroid. Queries are first scored against
+    these prototypes to shortlist `shortlist` students, then re-ranked against
+    only those students' raw embeddings.
+    """
+
+    def __init__(self, embeddings=None, labels=None, per_pose=5, shortlist=8, storage='float32'):
+        self.per_pose = max(1, int(per_pose))
+        self.shortlist = max(1, int(shortlist))
+        super().__init__(embeddings, labels, storage)
+
+    def set_gallery(self, embeddings, labels):
+        gallery = normalize_rows(embeddings)
+        labels = list(labels) if labels is not None else []
+        student_rows = {}
+        for row, label in enumerate(labels):
+            student_rows.setdefault(label, []).append(row)
+
+        prototypes = []
+        proto_starts = []
+        rows_per_student = []
+        for rows in student_rows.values():
+            proto_starts.append(len(prototypes))
+            rows_per_student.append(np.array(rows, dtype=np.int64))
+            for i in range(0, len(rows), self.per_pose):
+                prototypes.append(gallery[rows[i:i + self.per_pose]].mean(axis=0))
+
+        self._prototypes = _RowBuffer(normalize_rows(prototypes))
+        self._proto_starts = _RowBuffer(np.array(proto_starts, dtype=np.int64))
+        self.student_rows = rows_per_student
+        self._removed_students = set()
+        self.labels = labels
+        self._store(gallery)
+
+    @property
+    def prototypes(self):
+        return self._prototypes.view
+
+    @property
+    def proto_starts(self):
+        return self._proto_starts.view
+
+    def _index_added(self, label, rows, normalized):
+        # Appended as a new student group, also when the label already has one
+        self._proto_starts.append([len(self.prototypes)])
+        self._prototypes.append(normalize_rows([normalized[i:i + self.per_pose].mean(axis=0)
+                                                for i in range(0, len(rows), self.per_pose)]))
+        self.student_rows.append(rows)
+
+    def _index_removed(self, label, rows):
+        self._removed_students.update(s for s, student in enumerate(self.student_rows)
+                                      if self.labels[student[0]] == label)
+
+    def search(self, queries, k=1):
+        queries = normalize_rows(queries)
+        n_students = len(self.student_rows) - len(self._removed_students)
+        if n_students <= self.shortlist or queries.shape[0] == 0:
+            return super().search(queries, k)
+
+        # Stage 1: best prototype per student, keep the top `shortlist` students
+        proto_scores = queries @ self.prototypes.T
+        student_scores = np.maximum.reduceat(proto_scores, self.proto_starts, axis=1)
+        if self._removed_students:
+            student_scores[:, list(self._removed_students)] = REMOVED_SCORE
+        _, shortlisted = top_k(student_scores, self.shortlist)
+
+        # Stage 2: exact re-rank over the shortlisted students' raw embeddings
+        candidates = [np.concatenate([self.student_rows[s] for s in students]) for students in shortlisted]
+        k = max(1, min(int(k), min(len(rows) for rows in candidates)))
+        out_scores = np.empty((queries.shape[0], k), dtype=np.float32)
+        out_idx = np.empty((queries.shape[0], k), dtype=np.int64)
+        for i, rows in enumerate(candidates):
+            scores = self.row_scores(rows, queries[i])
+            best_scores, best = top_k(scores.reshape(1, -1), k)
+            out_scores[i] = best_scores[0]
+            out_idx[i] = rows[best[0]]
+        return out_scores, out_idx
+
+
+def _kmeans(data, k, iters=10, seed=0, spherical=True, chunk=16384):
+    """
+    Plain Lloyd's k-means. With spherical=True centroids are kept unit length and
+    points are assigned by inner product (cosine), otherwise by squared L2.
+    Returns (centroids, assignments).
+    """
+    rng = np.random.default_rng(seed)
+    k = max(1, min(int(k), data.shape[0]))
+    centroids = data[rng.choice(data.shape[0], k, replace=False)].copy()
+    assign = np.zeros(data.shape[0], dtype=np.int64)
+    for _ in range(max(1, iters)):
+        assign = _assign(data, centroids, spherical, chunk)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        # Re-seed empty clusters from random points
+        if empty.any():
+            sums[empty] = data[rng.choice(data.shape[0], int(empty.sum()))]
+            counts[empty] = 1
+        centroids = sums / counts[:, None]
+        if spherical:
+            centroids = normalize_rows(centroids)
+    return centroids.astype(np.float32), _assign(data, centroids, spherical, chunk)
+
+
+def _assign(data, centroids, spherical, chunk=16384):
+    """Nearest centroid per row, processed in chunks to bound the (chunk, k) score matrix."""
+    out = np.empty(data.shape[0], dtype=np.int64)
+    c_sq = None if spherical else (centroids ** 2).sum(axis=1)
+    for start in range(0, data.shape[0], chunk):
+        block = data[start:start + chunk]
+        if spherical:
+            out[start:start + chunk] = np.argmax(block @ centroids.T, axis=1)
+        else:
+            # argmin ||x - c||^2 == argmin ||c||^2 - 2 x.c
+            out[start:start + chunk] = np.argmin(c_sq - 2 * (block @ centroids.T), axis=1)
+    return out
+
+
+class IVFIndex(GalleryMatcher):
+    """
+    Approximate matcher for campus-scale galleries (pure NumPy).
+    An inverted-file (IVF) coarse quantiser splits the gallery into `nlist`
+    cosine clusters; a query only scans the `nprobe` closest clusters.
+    With pq_m > 0 the scanned vectors are scored from product-quantised codes
+    (pq_m sub-spaces, 256 centroids each) and the best `rerank` candidates are
+    re-scored exactly.
+    Use benchmarks/ann_report.py to choose nprobe for a given gallery size.
+    """
+
+    def __init__(self, embeddings=None, labels=None, nlist=None, nprobe=8, pq_m=0,
+                 rerank=32, train_size=50000, iters=10, seed=0, storage='float32'):
+        self.nlist = nlist
+        self.nprobe = max(1, int(nprobe))
+        self.pq_m = int(pq_m)
+        self.rerank = max(1, int(rerank))
+        self.train_size = train_size
+        self.iters = iters
+        self.seed = seed
+        super().__init__(embeddings, labels, storage)
+
+    def set_gallery(self, embeddings, labels):
+        gallery = normalize_rows(embeddings)
+        n = gallery.shape[0]
+        centroids = np.zeros((0, gallery.shape[1]), dtype=np.float32)
+        lists = []
+        codebooks = codes = None
+        if n > 0:
+            rng = np.random.default_rng(self.seed)
+            train = gallery if n <= self.train_size else gallery[rng.choice(n, self.train_size, replace=False)]
+            nlist = self.nlist or int(round(4 * np.sqrt(n)))
+            centroids, _ = _kmeans(train, nlist, self.iters, self.seed, spherical=True)
+            assign = _assign(gallery, centroids, spherical=True)
+            order = np.argsort(assign, kind='stable')
+            bounds = np.searchsorted(assign[order], np.arange(centroids.shape[0] + 1))
+            lists = [order[bounds[i]:bounds[i + 1]] for i in range(centroids.shape[0])]
+            if self.pq_m > 0:
+                codebooks, codes = self._train_pq(gallery, train)
+
+        self.centroids = centroids
+        self.lists = lists
+        self.codebooks = codebooks
+        self._codes = _RowBuffer(codes) if codes is not None else None
+        self.labels = list(labels) if labels is not None else []
+        self._store(gallery)
+
+    @property
+    def codes(self):
+        return self._codes.view if self._codes is not None else None
+
+    def _index_added(self, label, rows, normalized):
+        if self.centroids.shape[0] == 0:
+            # Nothing trained yet (empty gallery): build the index from what is there now
+            keep = np.ones(len(self), dtype=bool)
+            keep[self._removed_idx] = False
+            GalleryMatcher._compact(self, keep)
+            return
+        # New rows join their nearest existing list; centroids are not retrained
+        assign = _assign(normalized, self.centroids, spherical=True)
+        for c in np.unique(assign):
+            self.lists[c] = np.concatenate([self.lists[c], rows[assign == c]])
+        if self._codes is not None:
+            sub = self.codebooks.shape[2]
+            codes = np.empty((len(rows), self.pq_m), dtype=np.uint8)
+            for j in range(self.pq_m):
+                codes[:, j] = _assign(normalized[:, j * sub:(j + 1) * sub], self.codebooks[j], spherical=False)
+            self._codes.append(codes)
+
+    def _index_removed(self, label, rows):
+        for c, members in enumerate(self.lists):
+            hit = np.isin(members, rows)
+            if hit.any():
+                self.lists[c] = members[~hit]
+
+    def _compact(self, keep):
+        """Drops removed rows and renumbers the lists; the trained quantisers are kept."""
+        new_index = np.cumsum(keep) - 1
+        self.lists = [new_index[members[keep[members]]] for members in self.lists]
+        if self._codes is not None:
+            self._codes = _RowBuffer(self.codes[keep])
+        self.labels = [l for l, k in zip(self.labels, keep) if k]
+        self._set_rows(self.gallery[keep], self.scales[keep] if self.scales is not None else None)
+
+    def _train_pq(self, gallery, train):
+        d = gallery.shape[1]
+        if d % self.pq_m != 0:
+            raise ValueError(f"pq_m={self.pq_m} must divide the embedding size {d}")
+        sub = d // self.pq_m
+        codebooks = np.empty((self.pq_m, min(256, train.shape[0]), sub), dtype=np.float32)
+        codes = np.empty((gallery.shape[0], self.pq_m), dtype=np.uint8)
+        for j in range(self.pq_m):
+            part = slice(j * sub, (j + 1) * sub)
+            codebooks[j], _ = _kmeans(train[:, part], codebooks.shape[1], self.iters, self.seed + j, spherical=False)
+            codes[:, j] = _assign(gallery[:, part], codebooks[j], spherical=False)
+        return codebooks, codes
+
+    def _pq_scores(self, rows, query):
+        """Asymmetric distance: inner product from per-subspace lookup tables."""
+        sub = self.codebooks.shape[2]
+        tables = np.einsum('mcs,ms->mc', self.codebooks, query.reshape(self.pq_m, sub))
+        return tables[np.arange(self.pq_m), self.codes[rows]].sum(axis=1)
+
+    def search(self, queries, k=1, nprobe=None):
+        queries = normalize_rows(queries)
+        if self.n_active == 0 or queries.shape[0] == 0:
+            return super().search(queries, k)
+        nprobe = min(nprobe or self.nprobe, len(self.lists))
+        _, probes = top_k(queries @ self.centroids.T, nprobe)
+
+        candidates = [np.concatenate([self.lists[p] for p in probe]) for probe in probes]
+        k = max(1, min(int(k), min(len(rows) for rows in candidates)))
+        out_scores = np.empty((queries.shape[0], k), dtype=np.float32)
+        out_idx = np.empty((queries.shape[0], k), dtype=np.int64)
+        for i, rows in enumerate(candidates):
+            if len(rows) == 0:
+                # Every probed list is empty (its identities were removed)
+                out_scores[i], out_idx[i] = REMOVED_SCORE, 0
+                continue
+            if self.codes is not None:
+                approx = self._pq_scores(rows, queries[i])
+                _, keep = top_k(approx.reshape(1, -1), max(k, self.rerank))
+                rows = rows[keep[0]]
+            scores = self.row_scores(rows, queries[i])
+            best_scores, best = top_k(scores.reshape(1, -1), k)
+            out_scores[i] = best_scores[0]
+            out_idx[i] = rows[best[0]]
+        return out_scores, out_idx
+
+
+MATCHERS = {
+    'brute': GalleryMatcher,
+    'prototype': PrototypeIndex,
+    'ivf': IVFIndex,
+}
+
+
+def storage_accuracy(embeddings, queries, storage, k=1):
+    """
+    Accuracy check of a compact storage type against the float32 baseline.
+    Returns top-k agreement, the largest absolute score error and the memory
+    saving for the given queries.
+    """
+    baseline = GalleryMatcher(embeddings, None)
+    compact = GalleryMatcher(embeddings, None, storage=storage)
+    queries = normalize_rows(queries)
+    exact_scores = baseline.scores(queries)
+    compact_scores = compact.scores(queries)
+    _, exact_idx = top_k(exact_scores, k)
+    _, compact_idx = top_k(compact_scores, k)
+    return {
+        'storage': storage,
+        'topk_agreement': float(np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(exact_idx, compact_idx)])),
+        'max_score_error': float(np.abs(exact_scores - compact_scores).max()),
+        'bytes': compact.nbytes,
+        'compression_vs_float32': baseline.nbytes / compact.nbytes if compact.nbytes else 1.0,
+    }
+
+
+def build_matcher(kind='brute', embeddings=None, labels=None, **options):
+    """Create a matcher by name (see MATCHERS)."""
+    if kind not in MATCHERS:
+        raise ValueError(f"Unknown matcher '{kind}'. Choose from: {', '.join(MATCHERS)}")
+    return MATCHERS[kind](embeddings, labels, **options)
@@ -1,131 +1,459 @@
-import cv2
 import numpy as np
 from deepface import DeepFace
-from mtcnn import MTCNN
-from sklearn.metrics.pairwise import cosine_similarity
+
+from face_matcher import build_matcher
+from embedding_engine import FaceNetEmbedder
+from face_detectors import create_detector, run_detector, ScaledDetector
+from face_tracking import TrackingDetector
+from track_manager import TrackManager
+from perf_stats import StageTimings
 
 import time
 import threading
 import queue
+import multiprocessing
+from collections import deque
+
+
+def _no_record(stage, seconds):
+    pass
+
+
+def analyze_frame(detector, embedder, frame, needs_embedding=None, record=None):
+    """
+    Detection + embedding for one BGR frame (camera order). Stateless, so it can
+    run in any worker thread or process. Returns (boxes, embeddings), one
+    embedding per box. The frame is never converted as a whole: OpenCV detectors
+    and FaceNet take BGR, and only an RGB-only detector (MTCNN) converts.
+    needs_embedding(boxes) -> list of bool can skip faces whose identity is
+    already cached; those come back with a None embedding.
+    record(stage, seconds) receives the 'detect', 'crop' and 'embed' times.
+    """
+    record = record or _no_record
+    start = time.perf_counter()
+    faces = run_detector(detector, frame, 'bgr')
+    mark = time.perf_counter()
+    record('detect', mark - start)
+    face_imgs = []
+    face_boxes = []
+    for face in faces:
+        x, y, w, h = face['box']
+        if w <= 0 or h <= 0:
+            continue
+        x, y = max(0, x), max(0, y)
+        face_img = frame[y:y+h, x:x+w]
+        if face_img is None or face_img.size == 0:
+            continue
+        if len(face_img.shape) != 3 or face_img.shape[2] != 3:
+            continue
+        face_imgs.append(face_img)
+        face_boxes.append((x, y, w, h))
+    keep = needs_embedding(face_boxes) if needs_embedding and face_boxes else [True] * len(face_boxes)
+    start = time.perf_counter()
+    record('crop', start - mark)
+    # One batched forward pass for every face that needs an embedding
+    reps = iter(embedder.embed([img for img, k in zip(face_imgs, keep) if k], color='bgr'))
+    embeddings = [next(reps) if k else None for k in keep]
+    record('embed', time.perf_counter() - start)
+    return face_boxes, embeddings
+
+
+class Mailbox:
+    """
+    Single-slot "latest wins" handoff between threads. put() overwrites
+    whatever has not been taken yet, so readers never see stale items and
+    writers never block. The slot is a deque(maxlen=1), whose append/pop are
+    atomic in CPython, so no lock is taken; the Event only wakes waiters.
+    """
+
+    def __init__(self):
+        self._slot = deque(maxlen=1)
+        self._ready = threading.Event()
+        self.overwritten = 0  # items replaced before anyone took them
+
+    def __len__(self):
+        return len(self._slot)
+
+    def put(self, item):
+        if self._slot:
+            self.overwritten += 1
+        self._slot.append(item)
+        self._ready.set()
+
+    def take(self):
+        """Returns the latest item and empties the slot, or None."""
+        self._ready.clear()
+        try:
+            return self._slot.pop()
+        except IndexError:
+            return None
+
+    def wait(self, timeout=None):
+        return self._ready.wait(timeout)
+
+
+def match_and_track(matcher, tracks, boxes, embeddings, threshold, now, record=None):
+    """
+    Matching + smoothing for one frame's analyze_frame output. Scores every
+    embedded face with one matrix multiply; faces skipped by the identity
+    cache (None embedding) keep their track's identity. Returns the Tracks.
+    record(stage, seconds) receives the 'match' and 'smooth' times.
+    """
+    record = record or _no_record
+    start = time.perf_counter()
+    embedded = [i for i, e in enumerate(embeddings) if e is not None]
+    matches = [None] * len(boxes)
+    for i, match in zip(embedded, matcher.match([embeddings[i] for i in embedded], threshold)):
+        matches[i] = match
+    mark = time.perf_counter()
+    record('match', mark - start)
+    result = tracks.update(boxes, matches, now)
+    record('smooth', time.perf_counter() - mark)
+    return result
+
+
+def build_pipeline(model_name, detector_config, detect_every=1, track_min_confidence=0.5):
+    """Detector (tracking-wrapped when detect_every > 1) and embedder for a worker process."""
+    detector = create_detector(**detector_config)
+    if detect_every > 1:
+        detector = TrackingDetector(detector, detect_every, track_min_confidence)
+    return detector, FaceNetEmbedder(model_name=model_name)
+
+
+def _process_worker(model_name, frame_queue, output_queue, stop_event, detector_config, detect_every=1, track_min_confidence=0.5):
+    """Entry point for worker processes: owns its own detector and model."""
+    detector, embedder = build_pipeline(model_name, detector_config, detect_every, track_min_confidence)
+    generation = 0
+    while not stop_event.is_set():
+        try:
+            seq, captured_at, frame_generation, frame = frame_queue.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if frame_generation != generation and detect_every > 1:
+            detector.reset()  # new session: forget boxes tracked from the last one
+        generation = frame_generation
+        # Stage times travel back with the result; the collector records them
+        times = [('queue_wait', max(0.0, time.time() - captured_at))]
+        try:
+            boxes, embeddings = analyze_frame(detector, embedder, frame, record=lambda stage, t: times.append((stage, t)))
+        except Exception:
+            boxes, embeddings = [], []
+        output_queue.put((seq, captured_at, boxes, np.asarray(embeddings, dtype=np.float32), times))
 
 
 class FaceRecognizer:
-    def __init__(self, model_name='Facenet', all_embeddings=None, all_labels=None, similarity_threshold=0.7, stable_frames=15, max_queue_size=5):
+    def __init__(self, model_name='Facenet', all_embeddings=None, all_labels=None, similarity_threshold=0.7, stable_frames=15, max_queue_size=5, matcher='brute', matcher_options=None, num_workers=1, worker_mode='thread', detect_every=1, track_min_confidence=0.5, track_max_age=2.0, identity_cache_frames=0, reembed_every=15, detector='mtcnn', detector_options=None, detector_fallback=None):
         self.model_name = model_name
-        # Normalize all stored embeddings
-        if all_embeddings is not None and len(all_embeddings) > 0:
-            self.all_embeddings = np.array([e / np.linalg.norm(e) for e in all_embeddings])
-        else:
-            self.all_embeddings = all_embeddings
+        # Gallery is normalized once into a contiguous float32 matrix
+        # matcher: 'brute' (exact GEMM), 'prototype' (two-stage shortlist + re-rank) or 'ivf' (approximate)
+        self.matcher = build_matcher(matcher, all_embeddings, all_labels, **(matcher_options or {}))
+        self.all_embeddings = self.matcher.gallery
         self.all_labels = all_labels
         self.similarity_threshold = similarity_threshold
         self.stable_frames = stable_frames  # Number of frames to confirm identity
-        self.detector = MTCNN()
+        # detector: 'mtcnn', 'yunet', 'ssd' or 'haar' (see face_detectors.py)
+        self.detector_config = dict(detector_options or {}, name=detector, fallback=detector_fallback)
+        self.detector = create_detector(**self.detector_config)
         self.model = DeepFace.build_model(self.model_name)
-        self.frame_queue = queue.Queue(maxsize=max_queue_size)
-        self.result_queue = queue.Queue(maxsize=max_queue_size)
+        self.embedder = FaceNetEmbedder(self.model)
         self.stop_threads = False
-        # Smoothing: track last N predictions for each face box (by position hash)
-        self.smoothing_buffers = {}  # key: box hash, value: list of (identity, similarity)
-        self.smoothing_buffer_size = stable_frames
+        # Smoothing: faces are followed as tracks (IoU/centroid association), each voting
+        # over its last `stable_frames` predictions; tracks unseen for track_max_age are evicted
         self.unknown_debounce = 5  # require 5 consecutive 'Unknown' to switch
-        self.worker_thread = threading.Thread(target=self._worker, daemon=True)
-        self.worker_thread.start()
+        # Identity cache (thread mode): a track confirmed above similarity_threshold for
+        # identity_cache_frames frames is only re-embedded every reembed_every frames
+        self.tracks = TrackManager(vote_size=stable_frames, unknown_debounce=self.unknown_debounce, max_age=track_max_age,
+                                   confirm_frames=identity_cache_frames, confirm_threshold=similarity_threshold,
+                                   reembed_every=reembed_every)
+        # detect_every > 1: run the detector every N frames and move boxes with optical flow in between
+        self.detect_every = max(1, int(detect_every))
+        self.track_min_confidence = track_min_confidence
+
+        # Worker pool: detection + embedding run in `num_workers` threads or processes.
+        # Frames and results go through "latest wins" mailboxes: a frame the workers
+        # have not picked up yet is replaced by the newer one, and so is a result the
+        # UI has not read. Frames are stamped with a sequence number and capture time;
+        # matching and smoothing run in sequence order over the frames actually taken.
+        if worker_mode not in ('thread', 'process'):
+            raise ValueError(f"Unknown worker_mode '{worker_mode}'. Choose 'thread' or 'process'.")
+        self.num_workers = max(1, int(num_workers))
+        self.worker_mode = worker_mode
+        self._submit_seq = 0
+        self._next_seq = 0
+        self._generation = 0  # bumped by reset(); workers reset their trackers when it changes
+        self._in_flight = set()  # seqs taken by a worker and not yet delivered
+        self._pending = {}  # seq -> (captured_at, boxes, embeddings) waiting for earlier frames
+        # A frame lost by a crashed worker process is skipped once this many later frames are waiting
+        self._max_pending = self.num_workers + max_queue_size
+        self._order_lock = threading.Lock()
+        self.results = Mailbox()
+        self.results_delivered = 0
+        self.frames_dropped = 0
+        self._latencies = deque(maxlen=300)  # capture-to-result seconds, recent results
+        # Per-stage latency histograms: queue_wait, detect, crop, embed, match, smooth
+        self.timings = StageTimings()
+        self.last_result_info = None  # (seq, captured_at, latency) of the last result read
+        self.worker_threads = []
+        self.worker_processes = []
+        self._worker_parts = []  # thread mode: (detector, embedder) per worker
+        if worker_mode == 'process':
+            # Processes cannot share the Mailbox; a one-slot queue whose old frame is
+            # evicted on submit gives the same latest-wins behaviour
+            self.frame_queue = multiprocessing.Queue(maxsize=1)
+            self._output_queue = multiprocessing.Queue()
+            self._stop_event = multiprocessing.Event()
+            for _ in range(self.num_workers):
+                proc = multiprocessing.Process(
+                    target=_process_worker,
+                    args=(self.model_name, self.frame_queue, self._output_queue, self._stop_event,
+                          self.detector_config, self.detect_every, self.track_min_confidence),
+                    daemon=True,
+                )
+                proc.start()
+                self.worker_processes.append(proc)
+            self.worker_threads.append(threading.Thread(target=self._collector, daemon=True))
+        else:
+            self.frames = Mailbox()
+            for i in range(self.num_workers):
+                # Each thread gets its own detector and batch buffers; the Keras model is shared
+                detector = self.detector if i == 0 else create_detector(**self.detector_config)
+                if not isinstance(detector, ScaledDetector):
+                    detector = ScaledDetector(detector)  # scale 1.0 passes through; lets set_detection_scale adjust it
+                if self.detect_every > 1:
+                    detector = TrackingDetector(detector, self.detect_every, self.track_min_confidence)
+                embedder = self.embedder if i == 0 else FaceNetEmbedder(self.model)
+                self._worker_parts.append((detector, embedder))
+                self.worker_threads.append(threading.Thread(target=self._worker, args=(detector, embedder), daemon=True))
+        # Configured detection scale per thread worker, for set_detection_scale()
+        self._base_scales = [self._scaled_detector(d).scale for d, _ in self._worker_parts]
+        self.worker_thread = self.worker_threads[0]
+        for thread in self.worker_threads:
+            thread.start()
+
 
+    def _worker(self, detector, embedder):
+        generation = 0
+        while not self.stop_threads:
+            if not self.frames.wait(timeout=0.1):
+                continue
+            with self._order_lock:
+                item = self.frames.take()
+                if item is None:
+                    continue
+                self._in_flight.add(item[0])
+            seq, captured_at, frame_generation, frame = item
+            self.timings.record('queue_wait', max(0.0, time.time() - captured_at))
+            if frame_generation != generation and isinstance(detector, TrackingDetector):
+                detector.reset()
+            generation = frame_generation
+            try:
+                boxes, embeddings = analyze_frame(detector, embedder, frame, self.tracks.plan_embeddings, self.timings.record)
+            except Exception:
+                boxes, embeddings = [], []
+            self._deliver(seq, captured_at, boxes, embeddings)
 
-    def _worker(self):
+    def _collector(self):
+        """Process mode: gathers worker-process output back into the ordered stage."""
         while not self.stop_threads:
             try:
-                frame = self.frame_queue.get(timeout=0.1)
+                seq, captured_at, boxes, embeddings, times = self._output_queue.get(timeout=0.1)
             except queue.Empty:
                 continue
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            faces = self.detector.detect_faces(rgb_frame)
-            new_draw_faces = []
-            face_imgs = []
-            face_boxes = []
-            for face in faces:
-                x, y, w, h = face['box']
-                if w <= 0 or h <= 0:
-                    continue
-                x, y = max(0, x), max(0, y)
-                face_img = rgb_frame[y:y+h, x:x+w]
-                if face_img is None or face_img.size == 0:
-                    continue
-                if len(face_img.shape) != 3 or face_img.shape[2] != 3:
-                    continue
-                face_imgs.append(cv2.cvtColor(face_img, cv2.COLOR_RGB2BGR))
-                face_boxes.append((x, y, w, h))
-            if face_imgs:
+            for stage, seconds in times:
+                self.timings.record(stage, seconds)
+            self._deliver(seq, captured_at, boxes, embeddings)
+        self._stop_event.set()
+
+    def _deliver(self, seq, captured_at, boxes, embeddings):
+        """
+        Buffers out-of-order worker output and runs matching + smoothing, in
+        sequence order, for every frame older than all frames still in flight.
+        """
+        with self._order_lock:
+            self._in_flight.discard(seq)
+            if seq < self._next_seq:
+                return  # overtaken by a newer frame that was already delivered
+            self._pending[seq] = (captured_at, boxes, embeddings)
+            if len(self._pending) > self._max_pending:
+                oldest = min(self._pending)
+                self._in_flight = {s for s in self._in_flight if s > oldest}
+            ready_below = min(self._in_flight) if self._in_flight else float('inf')
+            for ready in sorted(s for s in self._pending if s < ready_below):
+                captured_at, boxes, embeddings = self._pending.pop(ready)
+                self._next_seq = ready + 1
                 try:
-                    reps = DeepFace.represent(face_imgs, model_name=self.model_name, enforce_detection=False)
-                    for i, rep in enumerate(reps):
-                        embedding = None
-                        if isinstance(rep, dict) and "embedding" in rep:
-                            embedding = np.array(rep["embedding"])
-                        elif isinstance(rep, list) and len(rep) > 0 and isinstance(rep[0], dict) and "embedding" in rep[0]:
-                            embedding = np.array(rep[0]["embedding"])
-                        if embedding is not None:
-                            embedding = embedding / np.linalg.norm(embedding)
-                            identity = "Unknown"
-                            max_similarity = 0
-                            if self.all_embeddings is not None and len(self.all_embeddings) > 0:
-                                sims = cosine_similarity([embedding], self.all_embeddings)[0]
-                                best_idx = np.argmax(sims)
-                                max_similarity = sims[best_idx]
-                                if max_similarity >= self.similarity_threshold:
-                                    identity = self.all_labels[best_idx]
-                            # --- Smoothing logic ---
-                            box = face_boxes[i]
-                            box_hash = (box[0]//10, box[1]//10, box[2]//10, box[3]//10)  # quantize for stability
-                            buf = self.smoothing_buffers.get(box_hash, [])
-                            buf.append((identity, max_similarity))
-                            if len(buf) > self.smoothing_buffer_size:
-                                buf = buf[-self.smoothing_buffer_size:]
-                            self.smoothing_buffers[box_hash] = buf
-                            # Count most common identity in buffer
-                            id_counts = {}
-                            for ident, sim in buf:
-                                id_counts[ident] = id_counts.get(ident, 0) + 1
-                            # Debounce 'Unknown': only switch if last N are 'Unknown'
-                            if buf[-self.unknown_debounce:]==[('Unknown',0)]*self.unknown_debounce:
-                                smoothed_identity = 'Unknown'
-                                smoothed_similarity = 0
-                            else:
-                                smoothed_identity = max(id_counts, key=id_counts.get)
-                                # Use max similarity for that identity
-                                smoothed_similarity = max([sim for ident, sim in buf if ident==smoothed_identity], default=0)
-                            new_draw_faces.append((box, smoothed_identity, smoothed_similarity, time.time()))
-                except Exception as e:
-                    pass
-            self.result_queue.put(new_draw_faces)
-
-    def submit_frame(self, frame):
-        """
-        Submit a frame for recognition. Non-blocking if queue is full.
+                    new_draw_faces = self._match_and_smooth(boxes, embeddings)
+                except Exception:
+                    new_draw_faces = []
+                latency = time.time() - captured_at
+                self._latencies.append(latency)
+                self.results_delivered += 1
+                self.results.put((ready, captured_at, latency, new_draw_faces))
+
+    def _match_and_smooth(self, boxes, embeddings):
+        now = time.time()
+        tracks = match_and_track(self.matcher, self.tracks, boxes, embeddings, self.similarity_threshold, now,
+                                 self.timings.record)
+        return [(track.box, track.identity, track.similarity, now) for track in tracks]
+
+    def submit_frame(self, frame, captured_at=None):
         """
-        try:
-            self.frame_queue.put_nowait(frame)
-        except queue.Full:
-            pass  # Drop frame if queue is full
+        Submit a frame for recognition. Never blocks: a frame no worker has
+        picked up yet is replaced. captured_at defaults to now.
+        Returns the frame's sequence number.
+        """
+        captured_at = time.time() if captured_at is None else captured_at
+        with self._order_lock:
+            seq = self._submit_seq
+            self._submit_seq += 1
+            if self.worker_mode == 'process':
+                # In flight from submit on, since taking happens in another process
+                self._in_flight.add(seq)
+                try:
+                    self.frame_queue.put_nowait((seq, captured_at, self._generation, frame))
+                except queue.Full:
+                    try:
+                        self._in_flight.discard(self.frame_queue.get_nowait()[0])
+                        self.frames_dropped += 1
+                    except queue.Empty:
+                        pass
+                    try:
+                        self.frame_queue.put_nowait((seq, captured_at, self._generation, frame))
+                    except queue.Full:
+                        self._in_flight.discard(seq)
+                        self.frames_dropped += 1
+            else:
+                self.frames.put((seq, captured_at, self._generation, frame))
+                self.frames_dropped = self.frames.overwritten
+        return seq
 
     def get_latest_result(self):
         """
-        Get the latest recognition result. Returns None if no result is available.
+        Get the latest recognition result. Returns None if there is no result
+        newer than the last one read. Older unread results are discarded.
         """
-        try:
-            return self.result_queue.get_nowait()
-        except queue.Empty:
+        item = self.results.take()
+        if item is None:
             return None
+        seq, captured_at, latency, faces = item
+        self.last_result_info = (seq, captured_at, latency)
+        return faces
+
+    def latency_stats(self):
+        """Capture-to-result latency over recent results, in milliseconds."""
+        if not self._latencies:
+            return {'last_ms': None, 'mean_ms': None, 'p95_ms': None, 'frames_dropped': self.frames_dropped}
+        latencies = np.asarray(self._latencies) * 1000.0
+        return {
+            'last_ms': round(float(latencies[-1]), 1),
+            'mean_ms': round(float(latencies.mean()), 1),
+            'p95_ms': round(float(np.percentile(latencies, 95)), 1),
+            'frames_dropped': self.frames_dropped,
+        }
+
+    def backlog(self):
+        """Frames submitted and not yet delivered or dropped (waiting, in a worker, or reordering)."""
+        with self._order_lock:
+            waiting = len(self.frames) if self.worker_mode == 'thread' else 0
+            return waiting + len(self._in_flight) + len(self._pending)
 
-    def set_embeddings(self, all_embeddings, all_labels):
+    @staticmethod
+    def _scaled_detector(detector):
+        return detector.detector if isinstance(detector, TrackingDetector) else detector
+
+    def set_detection_scale(self, factor):
         """
-        Update the embeddings and labels used for recognition.
+        Runs detection at `factor` times the configured scale (1.0 = as configured),
+        e.g. to shed load on a slow machine. Boxes stay in full-resolution
+        coordinates. Thread workers only; worker processes keep their scale.
         """
-        # Normalize all stored embeddings
-        if all_embeddings is not None and len(all_embeddings) > 0:
-            self.all_embeddings = np.array([e / np.linalg.norm(e) for e in all_embeddings])
-        else:
-            self.all_embeddings = all_embeddings
-        self.all_labels = all_labels
-        self.smoothing_buffers = {}  # Reset smoothing buffers on new embeddings
+        for (detector, _), base in zip(self._worker_parts, self._base_scales):
+            self._scaled_detector(detector).scale = min(1.0, base * factor)
+
+    def set_embeddings(self, all_embeddings, all_labels, matcher=None, matcher_options=None):
+        """
+        Update the embeddings and labels used for recognition, e.g. for the next
+        session on a long-lived recognizer. Passing `matcher` rebuilds the index
+        with that kind instead of reusing the current one. Models and workers
+        stay warm; frames and tracks from before the swap are dropped.
+        """
+        if matcher is not None:
+            new_matcher = build_matcher(matcher, all_embeddings, all_labels, **(matcher_options or {}))
+        with self._order_lock:
+            if matcher is not None:
+                self.matcher = new_matcher
+            else:
+                self.matcher.set_gallery(all_embeddings, all_labels)
+            self.all_embeddings = self.matcher.gallery
+            self.all_labels = all_labels
+        self.reset()  # Reset smoothing state on new embeddings
+
+    def add_identity(self, label, embeddings):
+        """
+        Adds one identity (e.g. a student enrolled mid-session) to the gallery
+        and its index without a rebuild. Tracks and smoothing state are kept.
+        Returns the number of embeddings added.
+        """
+        with self._order_lock:
+            rows = self.matcher.add_identity(label, embeddings)
+            self.all_embeddings = self.matcher.gallery
+            self.all_labels = self.matcher.labels
+        return len(rows)
+
+    def remove_identity(self, label):
+        """
+        Removes an identity from the gallery and its index. Only tracks
+        currently showing that identity are dropped. Returns the number of
+        embeddings removed.
+        """
+        with self._order_lock:
+            removed = self.matcher.remove_identity(label)
+            self.all_embeddings = self.matcher.gallery
+            self.all_labels = self.matcher.labels
+            self.tracks.forget_identity(label)
+        return removed
+
+    def reset(self):
+        """
+        Forget in-flight frames, unread results, tracks and latency history.
+        Results of frames submitted before the reset are discarded.
+        """
+        with self._order_lock:
+            self._generation += 1
+            self._next_seq = self._submit_seq
+            self._in_flight.clear()
+            self._pending.clear()
+            if self.worker_mode == 'thread':
+                self.frames.take()
+            self.results.take()
+            self._latencies.clear()
+            self.timings.reset()
+            self.last_result_info = None
+            self.tracks.reset()
+
+    def warm_up(self, size=(400, 400)):
+        """
+        Runs every worker's detector and the embedder once on a dummy frame so
+        graph compilation and first-call allocations happen now, not on the
+        first real frame. Process workers load their own models on start.
+        """
+        rng = np.random.default_rng(0)
+        frame = rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+        detectors = [self._scaled_detector(d) for d, _ in self._worker_parts] or [self.detector]
+        for detector in detectors:
+            detector.detect_faces(frame)
+        self.embedder.embed([frame[:160, :160]] * min(2, self.embedder.max_batch))
+
+    @property
+    def running(self):
+        return not self.stop_threads
+
+    def stop(self):
+        """Stop all worker threads and processes."""
+        self.stop_threads = True
+        if self.worker_processes:
+            self._stop_event.set()
+            for proc in self.worker_processes:
+                proc.join(timeout=1.0)
+                if proc.is_alive():
+                    proc.terminate()
@@ -0,0 +1,118 @@
+# face_tracking.py
+# Cheap inter-frame propagation of face boxes so the detector does not run on every frame.
+import cv2
+import numpy as np
+
+from face_detectors import run_detector
+
+
+class TrackingDetector:
+    """
+    Wraps a detector with the MTCNN interface (detect_faces(rgb) -> list of
+    {'box', 'confidence', 'keypoints'}) and only runs it every `detect_every`
+    frames. In between, each box is moved with pyramidal Lucas-Kanade optical
+    flow on corner points inside it. A forward-backward check gives every
+    track a confidence (share of points that survived). When any track drops
+    below `min_confidence`, full detection runs again on that same frame.
+    With no faces in view the detector runs on every frame, so newcomers are
+    picked up straight away.
+
+    Frames must arrive in order, so use one TrackingDetector per worker.
+    """
+
+    def __init__(self, detector, detect_every=3, min_confidence=0.5, max_points=40, fb_threshold=1.0):
+        self.detector = detector
+        self.detect_every = max(1, int(detect_every))
+        self.min_confidence = min_confidence
+        self.max_points = max_points
+        self.fb_threshold = fb_threshold
+        self.reset()
+
+    def reset(self):
+        """Forget all tracks; the next frame runs full detection."""
+        self._prev_gray = None
+        self._tracks = []  # list of (face dict, points array (n, 1, 2) float32)
+        self._since_detect = 0
+        self.detections_run = 0
+        self.frames_seen = 0
+
+    accepts_color = True
+
+    def detect_faces(self, frame, color='rgb'):
+        self.frames_seen += 1
+        gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY if color == 'rgb' else cv2.COLOR_BGR2GRAY)
+        faces = None
+        if (self._prev_gray is not None and self._prev_gray.shape == gray.shape
+                and self._since_detect < self.detect_every - 1):
+            faces = self._propagate(gray)
+        if faces is None:
+            faces = self._detect(frame, gray, color)
+        self._prev_gray = gray
+        return [dict(face) for face in faces]
+
+    def _detect(self, frame, gray, color):
+        faces = run_detector(self.detector, frame, color)
+        self.detections_run += 1
+        self._since_detect = 0
+        self._tracks = [(face, self._points_in_box(gray, face['box'])) for face in faces]
+        return faces
+
+    def _points_in_box(self, gray, box):
+        x, y, w, h = box
+        x, y = max(0, x), max(0, y)
+        mask = np.zeros_like(gray)
+        mask[y:y+h, x:x+w] = 255
+        points = cv2.goodFeaturesToTrack(gray, maxCorners=self.max_points, qualityLevel=0.01, minDistance=3, mask=mask)
+        return points if points is not None else np.zeros((0, 1, 2), dtype=np.float32)
+
+    def _propagate(self, gray):
+        """Returns moved faces, or None when tracking is too unreliable and detection should run."""
+        if not self._tracks:
+            return None
+        all_points = np.concatenate([points for _, points in self._tracks]).astype(np.float32)
+        if len(all_points) == 0:
+            return None
+        lk = dict(winSize=(15, 15), maxLevel=2, criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+        forward, status_f, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, gray, all_points, None, **lk)
+        backward, status_b, _ = cv2.calcOpticalFlowPyrLK(gray, self._prev_gray, forward, None, **lk)
+        fb_error = np.linalg.norm((all_points - backward).reshape(-1, 2), axis=1)
+        good = (status_f.ravel() == 1) & (status_b.ravel() == 1) & (fb_error < self.fb_threshold)
+
+        faces = []
+        tracks = []
+        start = 0
+        h_img, w_img = gray.shape
+        for face, points in self._tracks:
+            end = start + len(points)
+            ok = good[start:end]
+            new = forward[start:end][ok].reshape(-1, 2)
+            start = end
+            confidence = ok.mean() if len(ok) else 0.0
+            if confidence < self.min_confidence or ok.sum() < 3:
+                return None
+            old = points[ok].reshape(-1, 2)
+            dx, dy = np.median(new - old, axis=0)
+            # Scale from the spread of points around their centre
+            old_spread = np.median(np.linalg.norm(old - old.mean(axis=0), axis=1))
+            new_spread = np.median(np.linalg.norm(new - new.mean(axis=0), axis=1))
+            scale = new_spread / old_spread if old_spread > 1e-3 else 1.0
+            x, y, w, h = face['box']
+            cx, cy = x + w / 2 + dx, y + h / 2 + dy
+            w, h = w * scale, h * scale
+            box = [int(round(cx - w / 2)), int(round(cy - h / 2)), int(round(w)), int(round(h))]
+            if box[2] <= 0 or box[3] <= 0 or box[0] >= w_img or box[1] >= h_img:
+                return None
+            moved = dict(face)
+            moved['box'] = box
+            moved['confidence'] = float(face.get('confidence', 1.0)) * float(confidence)
+            moved['keypoints'] = {k: (int(round(px + dx)), int(round(py + dy))) for k, (px, py) in face.get('keypoints', {}).items()}
+            moved['tracked'] = True
+            faces.append(moved)
+            # Keep the detector confidence on the track; re-seed points once too many are lost
+            tracked = dict(moved)
+            tracked['confidence'] = face.get('confidence', 1.0)
+            tracks.append((tracked, new.reshape(-1, 1, 2).astype(np.float32)
+                           if ok.sum() >= self.max_points // 2 else self._points_in_box(gray, box)))
+        self._tracks = tracks
+        self._since_detect += 1
+        return faces
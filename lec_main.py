@@ -10,8 +10,7 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from tkinter.scrolledtext import ScrolledText
 import ttkbootstrap as tb
-from PIL import Image, ImageTk
-import cv2
+from PIL import ImageTk
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from reportlab.lib import colors
@@ -21,12 +20,15 @@ from reportlab.lib.styles import getSampleStyleSheet
 # --- Custom Project Modules ---
 try:
     from user_data_manager import UserDataManager
-    from camera_utils import initialize_camera
+    from camera_utils import CameraManager
+    from preview_renderer import PreviewRenderer
     import rec_faces
 except ImportError as e:
     messagebox.showerror("Critical Error", f"Missing required modules: {e}")
     sys.exit(1)
 
+PREVIEW_FPS = 30  # preview refresh rate; recognition still sees every camera frame
+
 # ---------------- Helpers ----------------
 def datetime_now():
     return datetime.datetime.now().strftime('%H:%M:%S')
@@ -53,8 +55,12 @@ class LecturerApp(tb.Window):
         self.session_id = None
         self.current_class_total_students = 0 
 
-        # Camera & preview
-        self.cap = None
+        # Camera & preview: devices are probed in parallel at launch and stay open across sessions
+        self.cameras = CameraManager()
+        self.cameras.start_probing()
+        self.cap = None  # FrameGrabber of the running session
+        self.preview = None  # PreviewRenderer: recognition overlay, scaling, RGB conversion off the Tk thread
+        self.preview_photo = None  # one PhotoImage, pasted into on every refresh
         self.preview_running = False
         self.preview_label = None
 
@@ -71,10 +77,42 @@ class LecturerApp(tb.Window):
         self.attendance_meter = None
         self.session_btn = None
         self.class_dropdown = None
+        self.engine_status_label = None
 
         # Build UI
         self.show_login()
 
+        # Warm up the recognition engine while the lecturer logs in
+        self.engine_status = "Loading recognition models..."
+        self.engine_ready = threading.Event()
+        self.warm_up_thread = threading.Thread(target=self.warm_up_engine, daemon=True)
+        self.warm_up_thread.start()
+        self.after(200, self.poll_engine_status)
+
+    # ---------------- Engine Warm-up ----------------
+    def warm_up_engine(self):
+        # Off the Tk thread: only store the text (no Tk calls, which can block on the
+        # main loop); poll_engine_status shows it
+        def report(text):
+            self.engine_status = text
+        if rec_faces.warm_up(status_callback=report):
+            self.engine_ready.set()
+
+    def poll_engine_status(self):
+        """Shows the warm-up thread's latest status until it finishes (Tk thread)."""
+        running = self.warm_up_thread.is_alive()
+        self.set_engine_status(self.engine_status)
+        if running:
+            self.after(200, self.poll_engine_status)
+
+    def set_engine_status(self, text):
+        self.engine_status = text
+        try:
+            if self.engine_status_label and self.engine_status_label.winfo_exists():
+                self.engine_status_label.config(text=text)
+        except Exception:
+            pass
+
     # ---------------- Login with "Remember Me" ----------------
     def show_login(self):
         self.clear_window()
@@ -130,6 +168,10 @@ class LecturerApp(tb.Window):
         # Login Button
         tb.Button(card, text="Login", bootstyle="success", width=20, command=self.login).pack()
 
+        # Recognition engine status (warm-up runs in the background)
+        self.engine_status_label = tb.Label(card, text=getattr(self, "engine_status", ""), font=("Segoe UI", 9), bootstyle="secondary")
+        self.engine_status_label.pack(pady=(15, 0))
+
     def login(self):
         email = self.email_entry.get().strip()
         password = self.password_entry.get().strip()
@@ -220,7 +262,10 @@ class LecturerApp(tb.Window):
         self.session_state_label.pack(pady=(0, 5))
         
         self.session_btn = tb.Button(left_panel, text="Start Attendance Session", bootstyle="success", width=100, command=self.start_session)
-        self.session_btn.pack(pady=(0, 20))
+        self.session_btn.pack(pady=(0, 5))
+
+        self.engine_status_label = tb.Label(left_panel, text=self.engine_status, font=("Segoe UI", 9), bootstyle="secondary")
+        self.engine_status_label.pack(pady=(0, 15))
 
         # Attendance Meter
         self.attendance_meter = tb.Meter(
@@ -283,21 +328,14 @@ class LecturerApp(tb.Window):
         is_droidcam = (target_camera == "DroidCam (Phone)")
         
         if is_droidcam:
-            # Probe the connection briefly
-            temp_cap, source, _ = initialize_camera(prefer_droidcam=True)
-            
-            # If the utility returned "Laptop Webcam" or failed, it means DroidCam is missing
-            if source != "DroidCam (Phone)":
-                if temp_cap: temp_cap.release()
+            # Probed at launch; a phone that was missing then is probed again now
+            if self.cameras.wait(target_camera) is None:
                 messagebox.showerror("Connection Error", 
                     "DroidCam is selected but NOT detected!\n\n"
                     "1. Make sure the DroidCam app is open on your phone.\n"
                     "2. Make sure the DroidCam Client on PC is started.\n"
                     "3. If it fails, switch the dropdown to 'Laptop Webcam'.")
                 return # <--- STOP HERE. Do not create session.
-            
-            # It works! Release probe so we can use it later.
-            temp_cap.release()
 
         # 3. CREATE SESSION (Database)
         lec_id = self.lecturer.get('id') or self.lecturer.get('lecturer_id')
@@ -326,7 +364,10 @@ class LecturerApp(tb.Window):
             messagebox.showerror("Error", f"Failed to fetch eligible students: {e}")
             return
 
-        # 5. START RECOGNITION ENGINE
+        # 5. START RECOGNITION ENGINE (reuses the warmed engine; waits if warm-up is still running)
+        if not self.engine_ready.is_set():
+            self.session_state_label.config(text="Waiting for recognition engine...", bootstyle="warning")
+            self.update_idletasks()
         try:
             rec_faces.start_session(session_id=self.session_id, student_ids=student_ids)
         except Exception as e:
@@ -350,10 +391,11 @@ class LecturerApp(tb.Window):
 
         # 7. OPEN CAMERA (For Real)
         try:
-            # We already probed it, so this should succeed unless connection dropped instantly
-            self.cap, source_name, warning = initialize_camera(prefer_droidcam=is_droidcam)
+            # Reuses the handle opened at launch (or by the last session).
+            # Frames are decoded on the grabber's own thread; the preview loop only picks up the newest.
+            self.cap = self.cameras.acquire(target_camera)
             
-            if not self.cap or not self.cap.isOpened():
+            if not self.cap:
                 messagebox.showerror("Camera Error", "Could not open any camera.")
                 self.cap = None
                 self.preview_running = False
@@ -364,37 +406,20 @@ class LecturerApp(tb.Window):
             self.cap = None
             return
         
+        self.preview = PreviewRenderer(self.cap, rec_faces.process_frame, refresh_hz=PREVIEW_FPS).start()
         self.preview_running = True
         self.after(30, self.update_preview_loop)
 
     # ---------------- Preview Loop ----------------
     def update_preview_loop(self):
-        if not self.preview_running:
-            return
-
-        ret = False
-        frame = None
-        try:
-            if not self.cap:
-                self.after(200, self.update_preview_loop)
-                return
-            ret, frame = self.cap.read()
-        except Exception:
-            ret = False
-
-        if not ret or frame is None:
-            self.after(100, self.update_preview_loop)
+        """Runs at PREVIEW_FPS on the Tk thread: paste the newest rendered frame, log new names."""
+        if not self.preview_running or not self.preview:
             return
 
-        # Process frame
-        try:
-            processed_frame, names = rec_faces.process_frame(frame)
-        except Exception:
-            # --- ANTI-TWITCH FIX ---
-            # If recognition fails, manually flip the raw frame so it matches
-            # the mirrored orientation of success frames.
-            processed_frame = cv2.flip(frame, 1)
-            names = []
+        # Tell the render thread the size to scale to (Tk may only be queried from this thread)
+        l_height = self.preview_label.winfo_height()
+        self.preview.target_height = l_height if l_height > 100 else None
+        image, names = self.preview.take()
 
         # Log recognized names
         for name in names:
@@ -406,45 +431,51 @@ class LecturerApp(tb.Window):
                 self.log_box.config(state="disabled")
 
         # Update Stats
-        count = len(self.logged_names)
-        self.face_count_label.config(text=f"Faces detected: {count}")
-        
-        if self.current_class_total_students > 0:
-            perc = int((count / self.current_class_total_students) * 100)
-            self.attendance_meter.configure(amountused=perc)
+        if names:
+            count = len(self.logged_names)
+            self.face_count_label.config(text=f"Faces detected: {count}")
 
-        # Display Image
-        try:
-            l_height = self.preview_label.winfo_height()
-            if l_height > 100:
-                h, w, _ = processed_frame.shape
-                scale = l_height / h
-                new_w = int(w * scale)
-                processed_frame = cv2.resize(processed_frame, (new_w, l_height))
-            
-            cv2image = cv2.cvtColor(processed_frame, cv2.COLOR_BGR2RGB)
-            pil_img = Image.fromarray(cv2image)
-            imgtk = ImageTk.PhotoImage(image=pil_img)
-            self.preview_label.imgtk = imgtk
-            self.preview_label.configure(image=imgtk, text="")
-        except Exception:
-            pass
+            if self.current_class_total_students > 0:
+                perc = int((count / self.current_class_total_students) * 100)
+                self.attendance_meter.configure(amountused=perc)
 
-        self.after(20, self.update_preview_loop)
+        # Display Image: update the same PhotoImage in place unless the size changed
+        if image is not None:
+            try:
+                if self.preview_photo is None or (self.preview_photo.width(), self.preview_photo.height()) != image.size:
+                    self.preview_photo = ImageTk.PhotoImage(image=image)
+                    self.preview_label.configure(image=self.preview_photo, text="")
+                else:
+                    self.preview_photo.paste(image)
+            except Exception:
+                pass
 
-    # ---------------- End Session ----------------
-    def end_session(self):
-        if not messagebox.askyesno("Confirm", "Are you sure you want to end this session?"):
-            return
+        self.after(int(1000 / PREVIEW_FPS), self.update_preview_loop)
 
+    def stop_preview(self):
+        """Stops the preview thread (waiting for a process_frame in progress) and pauses the camera."""
         self.preview_running = False
+        if self.preview:
+            try:
+                self.preview.stop()
+            except Exception:
+                pass
+            self.preview = None
+        self.preview_photo = None
         if self.cap:
             try:
-                self.cap.release()
+                self.cap.stop()  # device stays open for the next session
             except Exception:
                 pass
             self.cap = None
 
+    # ---------------- End Session ----------------
+    def end_session(self):
+        if not messagebox.askyesno("Confirm", "Are you sure you want to end this session?"):
+            return
+
+        self.stop_preview()
+
         self.preview_label.configure(image='', text="Camera Inactive")
 
         try:
@@ -665,13 +696,7 @@ class LecturerApp(tb.Window):
         if not messagebox.askyesno("Confirm", "Are you sure you want to logout?"):
             return
         try:
-            self.preview_running = False
-            if self.cap:
-                try:
-                    self.cap.release()
-                except Exception:
-                    pass
-                self.cap = None
+            self.stop_preview()
         except Exception:
             pass
 
@@ -700,5 +725,9 @@ if __name__ == "__main__":
     finally:
         try:
             rec_faces.cleanup()
+        except Exception:
+            pass
+        try:
+            app.cameras.close()
         except Exception:
             pass
\ No newline at end of file
@@ -0,0 +1,110 @@
+# overlay.py
+# Cached overlay compositor for rec_faces: text is rasterised once per label,
+# and the overlay scene can be refreshed at a lower rate than the video.
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+class LabelCache:
+    """
+    Text sprites keyed by (text, color, scale, thickness), least recently used
+    evicted beyond `max_labels`. A sprite is a solid-colour patch plus the glyph
+    mask cv2.putText would have drawn, so blitting it gives the same pixels.
+    """
+
+    def __init__(self, max_labels=512):
+        self.max_labels = max_labels
+        self._sprites = OrderedDict()
+        self.rendered = 0  # sprites rasterised (cache misses)
+
+    def get(self, text, color, scale, thickness):
+        """(sprite, mask, (ox, oy)): (ox, oy) is the text origin inside the sprite."""
+        key = (text, tuple(color), scale, thickness)
+        entry = self._sprites.get(key)
+        if entry is not None:
+            self._sprites.move_to_end(key)
+            return entry
+        (w, h), baseline = cv2.getTextSize(text, FONT, scale, thickness)
+        pad = thickness + 1
+        origin = (pad, pad + h)
+        mask = np.zeros((h + baseline + 2 * pad, w + 2 * pad), dtype=np.uint8)
+        cv2.putText(mask, text, origin, FONT, scale, 255, thickness)
+        sprite = np.empty(mask.shape + (3,), dtype=np.uint8)
+        sprite[:] = color
+        entry = (sprite, mask, origin)
+        self._sprites[key] = entry
+        self.rendered += 1
+        if len(self._sprites) > self.max_labels:
+            self._sprites.popitem(last=False)
+        return entry
+
+    def blit(self, frame, text, org, color, scale, thickness):
+        """Draws text with its baseline-left corner at org, like cv2.putText."""
+        sprite, mask, (ox, oy) = self.get(text, color, scale, thickness)
+        x0, y0 = org[0] - ox, org[1] - oy
+        h, w = mask.shape
+        # Clip to the frame
+        fx0, fy0 = max(0, x0), max(0, y0)
+        fx1, fy1 = min(frame.shape[1], x0 + w), min(frame.shape[0], y0 + h)
+        if fx1 <= fx0 or fy1 <= fy0:
+            return
+        if fx1 - fx0 != w or fy1 - fy0 != h:
+            sx, sy = fx0 - x0, fy0 - y0
+            sprite, mask = sprite[sy:sy + fy1 - fy0, sx:sx + fx1 - fx0], mask[sy:sy + fy1 - fy0, sx:sx + fx1 - fx0]
+        # Masked copy into the frame view, in place (about 10x cheaper than putText)
+        cv2.copyTo(sprite, mask, frame[fy0:fy1, fx0:fx1])
+
+
+class OverlayRenderer:
+    """
+    Records the overlay as a list of draw operations (a scene) and replays it
+    on every frame. Rebuild the scene only when due() says so (at most `fps`
+    times a second; fps=None rebuilds every frame):
+
+        if overlay.due():
+            overlay.begin()
+            overlay.rect(...); overlay.text(...)
+            overlay.commit()
+        overlay.draw(frame)
+
+    Text goes through a LabelCache, so a label is rasterised once and then
+    copied as pixels; boxes and lines are cheap and drawn directly.
+    """
+
+    def __init__(self, fps=15.0, max_labels=512):
+        self.interval = 1.0 / fps if fps else 0.0
+        self.labels = LabelCache(max_labels)
+        self._scene = []
+        self._building = None
+        self._next_rebuild = 0.0
+
+    def due(self, now=None):
+        now = time.monotonic() if now is None else now
+        return now >= self._next_rebuild
+
+    def begin(self, now=None):
+        now = time.monotonic() if now is None else now
+        self._next_rebuild = max(self._next_rebuild + self.interval, now)
+        self._building = []
+
+    def rect(self, pt1, pt2, color, thickness=1):
+        self._building.append((cv2.rectangle, pt1, pt2, color, thickness))
+
+    def line(self, pt1, pt2, color, thickness=1):
+        self._building.append((cv2.line, pt1, pt2, color, thickness))
+
+    def text(self, text, org, color, scale, thickness=1):
+        self._building.append((self.labels.blit, text, org, color, scale, thickness))
+
+    def commit(self):
+        self._scene, self._building = self._building, None
+
+    def draw(self, frame):
+        for op, *args in self._scene:
+            op(frame, *args)
+        return frame
@@ -0,0 +1,223 @@
+# perf_stats.py
+# Constant-memory statistics for the recognition hot path and session reports.
+import math
+import time
+import threading
+from contextlib import contextmanager
+
+
+class LatencyHistogram:
+    """
+    Fixed log-spaced buckets (`per_decade` per factor of 10, from `min_seconds`
+    to `max_seconds`), so memory does not grow with the number of samples.
+    Percentiles are read from the buckets: accurate to within one bucket
+    (about 12% with the default 20 per decade). Thread-safe.
+    """
+
+    def __init__(self, min_seconds=1e-5, max_seconds=100.0, per_decade=20):
+        self.min_seconds = min_seconds
+        self.per_decade = per_decade
+        self.n_buckets = int(math.ceil(math.log10(max_seconds / min_seconds) * per_decade)) + 1
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * (self.n_buckets + 1)  # last bucket: overflow
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+
+    def _bucket(self, seconds):
+        if seconds <= self.min_seconds:
+            return 0
+        return min(self.n_buckets, int(math.log10(seconds / self.min_seconds) * self.per_decade) + 1)
+
+    def _upper_edge(self, bucket):
+        return self.min_seconds * 10 ** (bucket / self.per_decade)
+
+    def record(self, seconds):
+        bucket = self._bucket(seconds)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, q):
+        """Approximate q-th percentile (0-100) in seconds, or None without samples."""
+        with self._lock:
+            if self.count == 0:
+                return None
+            target = max(1, math.ceil(self.count * q / 100.0))
+            seen = 0
+            for bucket, n in enumerate(self.counts):
+                seen += n
+                if seen >= target:
+                    return self.max if bucket == self.n_buckets else min(self._upper_edge(bucket), self.max)
+            return self.max
+
+    def summary(self):
+        """count, mean, p50/p95/p99 and max in milliseconds."""
+        if self.count == 0:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_ms": round(1000 * self.total / self.count, 3),
+            "p50_ms": round(1000 * self.percentile(50), 3),
+            "p95_ms": round(1000 * self.percentile(95), 3),
+            "p99_ms": round(1000 * self.percentile(99), 3),
+            "max_ms": round(1000 * self.max, 3),
+        }
+
+
+class StageTimings:
+    """
+    One LatencyHistogram per named pipeline stage.
+    record(stage, seconds) is safe to call from any thread, and can be passed
+    around as a plain callable.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+
+    def record(self, stage, seconds):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.stages.setdefault(stage, LatencyHistogram())
+        histogram.record(seconds)
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+
+    def summary(self):
+        """{stage: histogram summary} for every stage seen."""
+        return {stage: histogram.summary() for stage, histogram in list(self.stages.items())}
+
+
+class RunningStats:
+    """Streaming count, mean, variance (Welford), min and max in O(1) memory. Thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+            self.mean = 0.0
+            self._m2 = 0.0
+            self.min = None
+            self.max = None
+
+    def add(self, value):
+        with self._lock:
+            self.count += 1
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self._m2 += delta * (value - self.mean)
+            self.min = value if self.min is None else min(self.min, value)
+            self.max = value if self.max is None else max(self.max, value)
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def summary(self, digits=2):
+        if self.count == 0:
+            return {"count": 0}
+        return {"count": self.count, "mean": round(self.mean, digits), "std": round(self.std, digits),
+                "min": round(self.min, digits), "max": round(self.max, digits)}
+
+
+class WindowedRate:
+    """
+    Events per second over the last `window` seconds, counted in a ring of
+    `slots` fixed time slots (memory does not grow with the event rate).
+    """
+
+    def __init__(self, window=2.0, slots=20):
+        self.window = window
+        self.slot_seconds = window / slots
+        self._counts = [0] * slots
+        self._slot_ids = [-1] * slots
+        self._lock = threading.Lock()
+
+    def tick(self, n=1, now=None):
+        slot_id = int((time.monotonic() if now is None else now) / self.slot_seconds)
+        i = slot_id % len(self._counts)
+        with self._lock:
+            if self._slot_ids[i] != slot_id:
+                self._slot_ids[i] = slot_id
+                self._counts[i] = 0
+            self._counts[i] += n
+
+    def rate(self, now=None):
+        slot_id = int((time.monotonic() if now is None else now) / self.slot_seconds)
+        oldest = slot_id - len(self._counts) + 1
+        with self._lock:
+            total = sum(c for c, s in zip(self._counts, self._slot_ids) if oldest <= s <= slot_id)
+        return total / self.window
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * len(self._counts)
+            self._slot_ids = [-1] * len(self._slot_ids)
+
+
+class CPUSampler:
+    """
+    Samples system CPU % every `interval` seconds on a daemon thread, so the
+    frame loop never calls psutil. `last` is the latest sample, `stats` a
+    RunningStats over all samples since the last reset().
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.last = None
+        self.stats = RunningStats()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        import psutil
+        psutil.cpu_percent(interval=None)  # the first reading is meaningless; it only sets the baseline
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(psutil,), daemon=True)
+        self._thread.start()
+
+    def _run(self, psutil):
+        while not self._stop.wait(self.interval):
+            self.last = psutil.cpu_percent(interval=None)
+            self.stats.add(self.last)
+
+    def reset(self):
+        self.stats.reset()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1.0)
+            self._thread = None
@@ -0,0 +1,52 @@
+# preprocessing.py
+# UI-thread frame preprocessing for recognition: cached operators, reused buffers.
+#
+# Colour space: BGR (camera / OpenCV order) from capture to the recognition
+# workers. Each consumer converts at most once, and only if it needs another
+# order: the Tk preview converts to RGB for display, MTCNN converts to RGB;
+# YuNet, SSD, Haar (face_detectors.run_detector) and FaceNet
+# (FaceNetEmbedder color='bgr') take BGR as it is.
+import cv2
+import numpy as np
+
+
+class FramePreprocessor:
+    """
+    Mirror, sharpness check and CLAHE enhancement for rec_faces.process_frame.
+    The CLAHE operator is built once and intermediate images live in buffers
+    reused while the frame size stays the same. Not thread-safe: one instance
+    per UI loop.
+    """
+
+    def __init__(self, clip_limit=2.0, tile_grid=(8, 8)):
+        self.clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid)
+        self._buffers = {}
+
+    def _buffer(self, name, shape, dtype=np.uint8):
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = self._buffers[name] = np.empty(shape, dtype=dtype)
+        return buf
+
+    def mirror(self, frame):
+        """Horizontally flipped frame, in a reused buffer that is valid until the next call."""
+        return cv2.flip(frame, 1, dst=self._buffer('mirror', frame.shape))
+
+    def sharpness(self, bgr):
+        """Variance of the Laplacian of the grey image (blurry frames score low)."""
+        gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY, dst=self._buffer('gray', bgr.shape[:2]))
+        # Laplacian of uint8 is exact in float32; meanStdDev avoids a float64 copy for var()
+        laplacian = cv2.Laplacian(gray, cv2.CV_32F, dst=self._buffer('laplacian', gray.shape, np.float32))
+        _, std = cv2.meanStdDev(laplacian)
+        return float(std[0, 0]) ** 2
+
+    def enhance(self, bgr):
+        """
+        CLAHE on the lightness channel (LAB), returned as BGR. The result is a
+        new array owned by the caller, since it is handed to a recognition
+        worker that may still be reading it after the next frame arrives.
+        """
+        lab = cv2.cvtColor(bgr, cv2.COLOR_BGR2LAB, dst=self._buffer('lab', bgr.shape))
+        lightness = cv2.extractChannel(lab, 0, dst=self._buffer('lightness', bgr.shape[:2]))
+        cv2.insertChannel(self.clahe.apply(lightness, dst=self._buffer('clahe', bgr.shape[:2])), lab, 0)
+        return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
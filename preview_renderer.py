@@ -0,0 +1,105 @@
+# preview_renderer.py
+# Background preview stage for the lecturer window: recognition overlay,
+# scaling and BGR->RGB conversion run off the Tk thread.
+import time
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+class PreviewRenderer:
+    """
+    Reads frames from a FrameGrabber on its own thread and runs
+    `process(frame, captured_at) -> (frame, names)` (rec_faces.process_frame)
+    on every one. At most `refresh_hz` times a second the processed frame is
+    scaled to the requested height and converted to RGB in reused buffers,
+    and published as a PIL image.
+
+    The Tk side only calls take() from its own loop and pastes the image into
+    one persistent PhotoImage; names recognised in between come back with it.
+    A frame `process` fails on is shown mirrored, like a processed one.
+    """
+
+    def __init__(self, grabber, process, refresh_hz=30.0):
+        self.grabber = grabber
+        self.process = process
+        self.refresh_interval = 1.0 / refresh_hz
+        self.target_height = None  # set from the Tk thread (label height); None = frame size
+        self.frames_processed = 0
+        self.frames_rendered = 0
+        self._scaled = None
+        self._rgb = None
+        self._image = None  # newest rendered PIL image not yet taken
+        self._names = deque()
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        next_render = 0.0
+        while self._running:
+            ok, frame, captured_at = self.grabber.read(timeout=0.5)
+            if not ok:
+                if not self.grabber.running:
+                    time.sleep(0.1)  # camera lost: read() returns at once until it is reconnected
+                continue
+            try:
+                processed, names = self.process(frame, captured_at)
+            except Exception:
+                processed, names = cv2.flip(frame, 1), []
+            self.frames_processed += 1
+            now = time.monotonic()
+            image = None
+            if processed is not None and now >= next_render:
+                next_render = max(next_render + self.refresh_interval, now)
+                try:
+                    image = self._render(processed)
+                except Exception:
+                    image = None
+            with self._lock:
+                self._names.extend(names)
+                if image is not None:
+                    self._image = image
+
+    def _render(self, bgr):
+        h, w = bgr.shape[:2]
+        height = self.target_height
+        if height and height > 100 and height != h:
+            size = (max(1, int(w * height / h)), height)
+            if self._scaled is None or self._scaled.shape[:2] != (size[1], size[0]):
+                self._scaled = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            bgr = cv2.resize(bgr, size, dst=self._scaled, interpolation=cv2.INTER_AREA)
+        if self._rgb is None or self._rgb.shape != bgr.shape:
+            self._rgb = np.empty(bgr.shape, dtype=np.uint8)
+        cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst=self._rgb)
+        self.frames_rendered += 1
+        return Image.fromarray(self._rgb)  # copies, so the buffer is free again
+
+    def take(self):
+        """(newest rendered image or None, names recognised since the last call). Tk thread."""
+        with self._lock:
+            image, self._image = self._image, None
+            names = list(self._names)
+            self._names.clear()
+        return image, names
+
+    @property
+    def running(self):
+        return self._running
+
+    def stop(self):
+        """Stops the thread; returns once no process() call is running any more."""
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5.0)
+        self._thread = None
@@ -0,0 +1,112 @@
+# rate_controller.py
+# Adaptive frame submission rate for the recognition workers.
+import time
+
+
+class SubmissionController:
+    """
+    Decides which UI frames are sent to the FaceRecognizer. The rate adapts
+    every `adjust_every` seconds from what the pipeline reports back:
+
+    - pressure (recent capture-to-result latency above `target_latency`,
+      a frame still waiting for a busy worker, frames being overwritten
+      unprocessed, or CPU above `cpu_high`): the rate is cut by 30%. Once it
+      is at `min_fps`, detection resolution steps down through `scales`.
+    - headroom (latency under 60% of the target, nothing waiting or dropped,
+      CPU under `cpu_low`): resolution is restored first, then the rate
+      grows by 10% per step up to `max_fps`.
+
+    Anything in between leaves both alone. `scale` is a factor on the
+    configured detection scale (1.0 = as configured).
+    """
+
+    def __init__(self, min_fps=2.0, max_fps=30.0, target_latency=0.25, cpu_high=85.0, cpu_low=60.0,
+                 scales=(1.0, 0.75, 0.5), adjust_every=0.5, start_fps=None):
+        self.min_fps = min_fps
+        self.max_fps = max_fps
+        self.target_latency = target_latency
+        self.cpu_high = cpu_high
+        self.cpu_low = cpu_low
+        self.scales = tuple(scales) or (1.0,)
+        self.adjust_every = adjust_every
+        self.start_fps = start_fps or max_fps
+        self.reset()
+
+    def reset(self):
+        self.rate = self.start_fps
+        self.scale_index = 0
+        self.latency = None  # EMA of capture-to-result seconds
+        self.adjustments = 0
+        self._next_submit = 0.0
+        self._next_adjust = 0.0
+        self._submitted = 0
+        self._dropped_mark = None
+
+    @property
+    def scale(self):
+        return self.scales[self.scale_index]
+
+    def should_submit(self, now=None):
+        """True when the frame captured at `now` should go to the workers (counts it as submitted)."""
+        now = time.monotonic() if now is None else now
+        if now < self._next_submit:
+            return False
+        # Schedule from the ideal slot, not from now, so UI jitter does not lower the rate;
+        # after a long gap restart from now instead of bursting to catch up
+        interval = 1.0 / self.rate
+        self._next_submit = max(self._next_submit + interval, now + interval / 2)
+        self._submitted += 1
+        return True
+
+    def observe_latency(self, seconds):
+        """Feed the capture-to-result latency of each result read."""
+        self.latency = seconds if self.latency is None else 0.8 * self.latency + 0.2 * seconds
+
+    def update(self, backlog, workers, frames_dropped, cpu=None, now=None):
+        """
+        Re-evaluates the rate once per `adjust_every`. backlog: frames submitted
+        and not yet delivered; workers: pipeline width; frames_dropped: the
+        recognizer's running count; cpu: system CPU % or None.
+        Returns True when the detection scale changed.
+        """
+        now = time.monotonic() if now is None else now
+        if now < self._next_adjust:
+            return False
+        self._next_adjust = now + self.adjust_every
+        dropped = 0 if self._dropped_mark is None else frames_dropped - self._dropped_mark
+        self._dropped_mark = frames_dropped
+        submitted, self._submitted = self._submitted, 0
+
+        latency = self.latency
+        pressure = ((latency is not None and latency > self.target_latency) or backlog > workers
+                    or (submitted and dropped / submitted > 0.2) or (cpu is not None and cpu > self.cpu_high))
+        headroom = ((latency is None or latency < 0.6 * self.target_latency) and backlog <= workers
+                    and dropped == 0 and (cpu is None or cpu < self.cpu_low))
+
+        old_scale_index = self.scale_index
+        if pressure:
+            if self.rate > self.min_fps:
+                self.rate = max(self.min_fps, self.rate * 0.7)
+            elif self.scale_index < len(self.scales) - 1:
+                self.scale_index += 1
+            else:
+                return False
+        elif headroom:
+            if self.scale_index > 0:
+                self.scale_index -= 1
+            elif self.rate < self.max_fps:
+                self.rate = min(self.max_fps, self.rate * 1.1)
+            else:
+                return False
+        else:
+            return False
+        self.adjustments += 1
+        return self.scale_index != old_scale_index
+
+    def summary(self):
+        return {
+            "submit_fps": round(self.rate, 2),
+            "detection_scale": self.scale,
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "adjustments": self.adjustments,
+        }
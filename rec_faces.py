@@ -3,26 +3,42 @@ import time
 import datetime
 import threading
 import logging
-import psutil
 import cv2
 import math
 import sys
-import numpy as np
 import json
-from deepface import DeepFace 
 
 # --- Custom Project Modules ---
 from embedding_loader import EmbeddingLoader
 from user_data_manager import UserDataManager
 from face_recognizer import FaceRecognizer
-from camera_utils import initialize_camera
+from camera_utils import open_camera
+from rate_controller import SubmissionController
+from preprocessing import FramePreprocessor
+from overlay import OverlayRenderer
+from perf_stats import StageTimings, LatencyHistogram, RunningStats, WindowedRate, CPUSampler
 
 # ---------------- Config ----------------
-MODEL_NAME = 'Facenet'
-SIMILARITY_THRESHOLD = 0.75
-STABLE_FRAMES = 8 
-ROI_SIZE = 400
+# Model, matcher and detector settings (shared with batch_recognize.py) are in recognition_config.py
+from recognition_config import (MODEL_NAME, SIMILARITY_THRESHOLD, STABLE_FRAMES, MATCHER, MATCHER_OPTIONS,
+                                CAMPUS_MATCHER, CAMPUS_MATCHER_MIN_GALLERY, DETECTOR_BACKEND, DETECTOR_FALLBACK,
+                                DETECTOR_OPTIONS, DETECTION_SCALE, DETECTION_MIN_FACE, GALLERY_STORAGE)
+ROI_SIZE = 400  # None = whole frame (lecture hall); pair it with DETECTION_MIN_FACE
 BLUR_THRESHOLD = 100
+NUM_WORKERS = 1  # detection/embedding workers; raise on 8+ core machines (see benchmarks/bench_worker_pool.py)
+WORKER_MODE = 'thread'  # 'thread' or 'process'
+DETECT_EVERY = 3  # full detection every N frames, optical-flow tracking in between (1 = always detect)
+TRACK_MIN_CONFIDENCE = 0.5  # re-detect immediately when a tracked box loses more points than this
+IDENTITY_CACHE_FRAMES = 5  # once a track is confirmed for this many frames, stop embedding it every frame (0 = off)
+REEMBED_EVERY = 15  # ...and only re-check its identity every N frames
+# Adaptive submission: frames go to the workers at a rate set from result latency, worker backlog
+# and CPU load; under sustained pressure detection resolution also steps down (thread workers)
+ADAPTIVE_SUBMISSION = True
+SUBMIT_FPS_RANGE = (2.0, 30.0)
+TARGET_LATENCY_MS = 250
+ADAPTIVE_DETECTION_SCALES = (1.0, 0.75, 0.5)  # factors on DETECTION_SCALE / DETECTION_MIN_FACE
+OVERLAY_FPS = 15  # boxes/labels are re-laid-out this often and replayed in between (None = every frame)
+BANNER_REFRESH = 0.5  # seconds between CPU/FPS/LAT banner updates
 
 DATA_DIR = "face_embeddings"
 os.makedirs('data', exist_ok=True)
@@ -34,44 +50,147 @@ logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
 db_manager = UserDataManager()
 loader = EmbeddingLoader(db_manager=db_manager.db_manager)
 recognizer = None
+_engine_lock = threading.Lock()  # held while the engine is built, so start_session waits for a warm-up in progress
 
 # ---------------- Attendance State ----------------
 session_active = False
 marked_names = set()
 current_session_id = None
-_last_seen_faces = {}
-_SMOOTHING_SECONDS = 0.3 
+_SMOOTHING_SECONDS = 0.3  # keep drawing a track this long after its last recognition result
+preprocessor = FramePreprocessor(clip_limit=2.0, tile_grid=(8, 8))  # BGR in, BGR to the workers
+overlay = OverlayRenderer(fps=OVERLAY_FPS)  # label sprites are rasterised once, then copied
+submit_control = SubmissionController(min_fps=SUBMIT_FPS_RANGE[0], max_fps=SUBMIT_FPS_RANGE[1],
+                                      target_latency=TARGET_LATENCY_MS / 1000.0, scales=ADAPTIVE_DETECTION_SCALES)
 
 # --- STATISTICS TRACKER ---
-session_stats = {
-    "start_time": 0,
-    "total_frames": 0,
-    "total_detections": 0,
-    "total_knowns": 0,
-    "total_unknowns": 0,
-    "fps_history": [],
-    "cpu_history": []
-}
+# UI-thread stage latencies (preprocess, db_write, render); worker stages live in recognizer.timings
+frame_timings = StageTimings()
+cpu_sampler = CPUSampler(interval=1.0)  # sampled off the frame path; started with the first session
+
+def _new_session_stats(start_time=0):
+    # Streaming aggregates only: memory stays constant however long the session runs
+    return {
+        "start_time": start_time,
+        "total_frames": 0,
+        "total_detections": 0,
+        "total_knowns": 0,
+        "total_unknowns": 0,
+        "fps": RunningStats(),  # per-frame 1/dt
+        "frame_interval": LatencyHistogram(),  # dt percentiles (stutter shows up in p95/p99)
+        "frame_rate": WindowedRate(window=2.0),  # HUD FPS over the last 2 s
+    }
+
+session_stats = _new_session_stats()
 
 # ---------------- Core Logic ----------------
 
+def get_engine(all_embeddings=None, all_labels=None, matcher=MATCHER, matcher_options=None):
+    """
+    Returns the process-wide FaceRecognizer, building it (models, detectors,
+    worker pool) on first use. An engine that already exists (e.g. built by
+    warm_up while this call waited) gets the gallery via set_embeddings().
+    """
+    global recognizer
+    with _engine_lock:
+        if recognizer is None or not recognizer.running:
+            recognizer = _build_engine(all_embeddings, all_labels, matcher, matcher_options)
+        elif all_embeddings is not None:
+            recognizer.set_embeddings(all_embeddings, all_labels, matcher=matcher, matcher_options=matcher_options)
+        return recognizer
+
+def _build_engine(all_embeddings, all_labels, matcher, matcher_options):
+    print("[INFO] Starting recognition engine (loading models)...")
+    return FaceRecognizer(
+        MODEL_NAME, 
+        all_embeddings, 
+        all_labels, 
+        similarity_threshold=SIMILARITY_THRESHOLD, 
+        stable_frames=STABLE_FRAMES,
+        matcher=matcher,
+        matcher_options=matcher_options,
+        num_workers=NUM_WORKERS,
+        worker_mode=WORKER_MODE,
+        detect_every=DETECT_EVERY,
+        track_min_confidence=TRACK_MIN_CONFIDENCE,
+        identity_cache_frames=IDENTITY_CACHE_FRAMES,
+        reembed_every=REEMBED_EVERY,
+        detector=DETECTOR_BACKEND,
+        detector_options=dict(DETECTOR_OPTIONS, scale=DETECTION_SCALE, min_face=DETECTION_MIN_FACE),
+        detector_fallback=DETECTOR_FALLBACK
+    )
+
+def warm_up(status_callback=None):
+    """
+    Builds the engine and runs a dummy inference (detector + FaceNet) so the
+    first session starts without a model load. Meant for a background thread
+    at app launch; status_callback(text) receives progress messages.
+    """
+    global recognizer
+    report = status_callback or (lambda text: print(f"[INFO] {text}"))
+    try:
+        report("Loading and warming up recognition models...")
+        start = time.time()
+        # status_callback is never called under _engine_lock: a UI callback that waits for
+        # its main loop would deadlock against a session start waiting for the engine
+        with _engine_lock:
+            if recognizer is None or not recognizer.running:
+                engine = None
+                try:
+                    engine = _build_engine([], [], MATCHER, dict(MATCHER_OPTIONS.get(MATCHER, {}), storage=GALLERY_STORAGE))
+                    engine.warm_up((ROI_SIZE, ROI_SIZE) if ROI_SIZE else (1280, 720))
+                except Exception:
+                    if engine is not None:
+                        engine.stop()
+                    raise
+                # Published only once warm: warm_up runs worker 0's detector and batch
+                # buffers, so no session may submit frames to the engine before this
+                recognizer = engine
+        report(f"Recognition engine ready ({time.time() - start:.1f}s)")
+        return True
+    except Exception as e:
+        logging.error(f"Engine warm-up failed: {e}")
+        report(f"Engine warm-up failed: {e}")
+        return False
+
+def add_student(student_id):
+    """Adds a student enrolled after the session started, without reloading the gallery."""
+    if recognizer is None:
+        return 0
+    embeddings, labels = loader.load_embeddings(from_db=True, student_ids=[student_id])
+    added = 0
+    for label in dict.fromkeys(labels):
+        added += recognizer.add_identity(label, [e for e, l in zip(embeddings, labels) if l == label])
+    logging.info(f"Added {added} embeddings for student {student_id}.")
+    return added
+
+def remove_student(label):
+    """Removes a (deactivated) student from the live gallery."""
+    return recognizer.remove_identity(label) if recognizer is not None else 0
+
+def cleanup():
+    """Shuts the recognition engine down. Call once when the application exits."""
+    global recognizer
+    if recognizer is not None:
+        recognizer.stop()
+        recognizer = None
+    cpu_sampler.stop()
+
 def start_session(session_id=None, student_ids=None):
-    """Initializes the AI engine and resets stats."""
+    """Loads the session's gallery into the recognition engine and resets stats."""
     global session_active, marked_names, recognizer, current_session_id, session_stats
     session_active = True
     marked_names = set()
     current_session_id = session_id
     
     # Reset Stats
-    session_stats = {
-        "start_time": time.time(),
-        "total_frames": 0,
-        "total_detections": 0,
-        "total_knowns": 0,
-        "total_unknowns": 0,
-        "fps_history": [],
-        "cpu_history": []
-    }
+    frame_timings.reset()
+    submit_control.reset()
+    session_stats = _new_session_stats(time.time())
+    cpu_sampler.reset()
+    try:
+        cpu_sampler.start()
+    except Exception as e:
+        print(f"[WARN] CPU sampling unavailable: {e}")
     
     # 1. Load Student Data
     print(f"[INFO] Loading Student Database for Session {session_id}...")
@@ -87,37 +206,28 @@ def start_session(session_id=None, student_ids=None):
         print(f"[ERROR] Failed to load embeddings: {e}")
         all_embeddings, all_labels = [], []
 
-    # 2. PRE-LOAD MODEL
-    print("[INFO] Pre-loading FaceNet Model...")
-    try:
-        DeepFace.build_model(MODEL_NAME) 
-    except Exception as e:
-        print(f"[WARN] Model build warning: {e}")
-    
-    # 3. Initialize Worker
-    recognizer = FaceRecognizer(
-        MODEL_NAME, 
-        all_embeddings, 
-        all_labels, 
-        similarity_threshold=SIMILARITY_THRESHOLD, 
-        stable_frames=STABLE_FRAMES
-    )
+    # 2. Swap the gallery into the long-lived engine (built once per process)
+    matcher = MATCHER
+    if not student_ids and len(all_labels) >= CAMPUS_MATCHER_MIN_GALLERY:
+        matcher = CAMPUS_MATCHER
+    matcher_options = dict(MATCHER_OPTIONS.get(matcher, {}), storage=GALLERY_STORAGE)
+    recognizer = get_engine(all_embeddings, all_labels, matcher, matcher_options)
+    recognizer.set_detection_scale(submit_control.scale)
     logging.info(f"Session {session_id} started.")
 
 def end_session():
-    """Stops the AI engine and saves a detailed performance report."""
+    """Ends the session and saves a detailed performance report. The engine stays warm for the next one."""
     global session_active
     session_active = False
-    if recognizer:
-        recognizer.stop_threads = True
     
     # --- GENERATE REPORT ---
     try:
         duration = time.time() - session_stats["start_time"]
         
         # Calculate Averages
-        avg_fps = np.mean(session_stats["fps_history"]) if session_stats["fps_history"] else 0
-        avg_cpu = np.mean(session_stats["cpu_history"]) if session_stats["cpu_history"] else 0
+        fps_stats = session_stats["fps"]
+        avg_fps = fps_stats.mean
+        avg_cpu = cpu_sampler.stats.mean
         
         # Calculate Recognition Rate
         total = session_stats["total_detections"]
@@ -129,9 +239,17 @@ def end_session():
             "duration_seconds": round(duration, 2),
             "performance": {
                 "average_fps": round(avg_fps, 2),
+                "fps_std": round(fps_stats.std, 2),
+                "frame_interval": session_stats["frame_interval"].summary(),
                 "average_cpu_usage": round(avg_cpu, 2),
-                "total_frames_processed": session_stats["total_frames"]
+                "peak_cpu_usage": cpu_sampler.stats.max,
+                "total_frames_processed": session_stats["total_frames"],
+                "recognition_latency": recognizer.latency_stats() if recognizer else None,
+                "submission": submit_control.summary() if ADAPTIVE_SUBMISSION else None
             },
+            # p50/p95/p99 per stage: queue_wait, detect, crop, embed, match, smooth (workers)
+            # and preprocess, db_write, render (UI thread)
+            "stage_latency": dict(recognizer.timings.summary() if recognizer else {}, **frame_timings.summary()),
             "detection_stats": {
                 "total_faces_seen": session_stats["total_detections"],
                 "known_faces": session_stats["total_knowns"],
@@ -153,11 +271,17 @@ def end_session():
     except Exception as e:
         print(f"[WARN] Failed to save statistics report: {e}")
 
-def process_frame(frame):
+    # Idle the engine until the next session swaps in its gallery
+    if recognizer:
+        recognizer.reset()
+
+def process_frame(frame, captured_at=None):
     """
-    Processes a frame. GUARANTEED to return (frame, list) even on error.
+    Processes a BGR frame. GUARANTEED to return (frame, list) even on error.
+    captured_at: when the camera delivered the frame (FrameGrabber.read), default now.
+    The returned frame is a reused buffer, valid until the next call.
     """
-    global marked_names, _last_seen_faces, session_stats
+    global marked_names, session_stats
     newly_marked = []
     
     # --- FPS Tracking Init ---
@@ -170,59 +294,62 @@ def process_frame(frame):
 
     try:
         # --- PERFORMANCE TRACKING ---
+        frame_start = time.perf_counter()
+        preprocess_s = db_s = 0.0
         now = time.time()
+        captured_at = now if captured_at is None else captured_at
         dt = now - process_frame.last_time
         process_frame.last_time = now
         
         if dt > 0:
-            current_fps = 1.0 / dt
-            session_stats["fps_history"].append(current_fps)
-            session_stats["cpu_history"].append(psutil.cpu_percent())
+            session_stats["fps"].add(1.0 / dt)
+            session_stats["frame_interval"].record(dt)
             session_stats["total_frames"] += 1
+        session_stats["frame_rate"].tick()
 
-        # 1. Mirror Effect
-        frame = cv2.flip(frame, 1)
+        # 1. Mirror Effect (into a reused buffer; the camera frame is left untouched)
+        frame = preprocessor.mirror(frame)
         h, w, _ = frame.shape
 
         # 2. ROI Calculation
-        roi_w, roi_h = min(ROI_SIZE, w), min(ROI_SIZE, h)
+        roi_w, roi_h = (w, h) if ROI_SIZE is None else (min(ROI_SIZE, w), min(ROI_SIZE, h))
         start_x = (w - roi_w) // 2
         start_y = (h - roi_h) // 2
         end_x = start_x + roi_w
         end_y = start_y + roi_h
 
-        # 3. Scanning Animation
-        scan_speed = 4.0
-        scan_offset = int((math.sin(time.time() * scan_speed) + 1) / 2 * roi_h)
-        scan_y = start_y + scan_offset
-        
-        cv2.rectangle(frame, (start_x, start_y), (end_x, end_y), (255, 150, 0), 2)
-        cv2.line(frame, (start_x, scan_y), (end_x, scan_y), (255, 150, 0), 2)
-        cv2.putText(frame, "ATTENDANCE ACTIVE", (start_x + 10, start_y - 10), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 150, 0), 2)
-
-        # 4. Prepare Crop for AI
+        # 3. Prepare Crop for AI (before anything is drawn on the frame)
         roi_crop = frame[start_y:end_y, start_x:end_x]
         
+        preprocess_start = time.perf_counter()
         try:
-            gray_roi = cv2.cvtColor(roi_crop, cv2.COLOR_BGR2GRAY)
-            blur_score = cv2.Laplacian(gray_roi, cv2.CV_64F).var()
-            
-            if blur_score > BLUR_THRESHOLD:
-                lab = cv2.cvtColor(roi_crop, cv2.COLOR_BGR2LAB)
-                l, a, b = cv2.split(lab)
-                clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-                cl = clahe.apply(l)
-                roi_enhanced = cv2.cvtColor(cv2.merge((cl, a, b)), cv2.COLOR_LAB2BGR)
-                
-                roi_rgb = cv2.cvtColor(roi_enhanced, cv2.COLOR_BGR2RGB)
-                if recognizer:
-                    recognizer.submit_frame(roi_rgb)
-            else:
-                cv2.putText(frame, "HOLD STILL", (start_x + 10, end_y - 10), 
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+            # Blur check and enhancement only run for frames the controller lets through
+            if not ADAPTIVE_SUBMISSION or submit_control.should_submit():
+                blur_score = preprocessor.sharpness(roi_crop)
+                process_frame.blurry = blur_score <= BLUR_THRESHOLD
+
+                if not process_frame.blurry and recognizer and session_active:
+                    # Workers take BGR; the enhanced ROI is the only per-frame allocation
+                    recognizer.submit_frame(preprocessor.enhance(roi_crop), captured_at=captured_at)
         except Exception:
             pass
+        preprocess_s = time.perf_counter() - preprocess_start
+        frame_timings.record("preprocess", preprocess_s)
+
+        # 4. Scanning Animation
+        # The overlay scene is rebuilt at OVERLAY_FPS and replayed onto the frames in between
+        rebuild_overlay = overlay.due()
+        if rebuild_overlay:
+            overlay.begin()
+            scan_speed = 4.0
+            scan_offset = int((math.sin(time.time() * scan_speed) + 1) / 2 * roi_h)
+            scan_y = start_y + scan_offset
+            
+            overlay.rect((start_x, start_y), (end_x, end_y), (255, 150, 0), 2)
+            overlay.line((start_x, scan_y), (end_x, scan_y), (255, 150, 0), 2)
+            overlay.text("ATTENDANCE ACTIVE", (start_x + 10, start_y - 10), (255, 150, 0), 0.6, 2)
+            if getattr(process_frame, "blurry", False):
+                overlay.text("HOLD STILL", (start_x + 10, end_y - 10), (0, 0, 255), 0.7, 2)
 
         # 5. Get Results (SAFETY GUARD 2: Handle None Result)
         draw_snapshot = []
@@ -230,35 +357,36 @@ def process_frame(frame):
             res = recognizer.get_latest_result()
             if res is not None:
                 draw_snapshot = res
-
-        now_ts = time.time()
-        current_faces = {} 
+                if recognizer.last_result_info:
+                    submit_control.observe_latency(recognizer.last_result_info[2])
+            if ADAPTIVE_SUBMISSION and session_active:
+                try:
+                    if submit_control.update(recognizer.backlog(), recognizer.num_workers,
+                                             recognizer.frames_dropped, cpu_sampler.last):
+                        recognizer.set_detection_scale(submit_control.scale)
+                except Exception as e:
+                    logging.warning(f"Submission control failed: {e}")
 
         for detection in draw_snapshot:
             try:
-                box, identity, similarity, last_seen = detection
-                rx, ry, rw, rh = box
-                gx = rx + start_x
-                gy = ry + start_y
-                current_faces[identity] = ((gx, gy, rw, rh), identity, similarity, now_ts)
-                _last_seen_faces[identity] = current_faces[identity]
-                
+                identity = detection[1]
                 # --- STATS UPDATE ---
                 session_stats["total_detections"] += 1
                 if identity == "Unknown":
                     session_stats["total_unknowns"] += 1
                 else:
                     session_stats["total_knowns"] += 1
-                    
             except Exception:
                 continue
 
-        _last_seen_faces = {k: v for k, v in _last_seen_faces.items() if now_ts - v[3] <= _SMOOTHING_SECONDS}
+        # Live tracks (one box per known identity), in ROI coordinates
+        live_faces = recognizer.tracks.snapshot(max_age=_SMOOTHING_SECONDS) if recognizer else []
 
-        for detection in _last_seen_faces.values():
+        for detection in live_faces:
             try:
                 box, identity, similarity, last_seen = detection
-                x, y, bw, bh = box
+                rx, ry, bw, bh = box
+                x, y = rx + start_x, ry + start_y
                 
                 color = (0, 0, 255)
                 status_text = f"{similarity:.2f}"
@@ -269,11 +397,14 @@ def process_frame(frame):
                 elif identity != "Unknown":
                     color = (0, 255, 255)
                 
-                cv2.rectangle(frame, (x, y), (x + bw, y + bh), color, 2)
-                cv2.putText(frame, f"{identity}", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
-                cv2.putText(frame, status_text, (x, y + bh + 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+                if rebuild_overlay:
+                    x, y, bw, bh = int(x), int(y), int(bw), int(bh)
+                    overlay.rect((x, y), (x + bw, y + bh), color, 2)
+                    overlay.text(f"{identity}", (x, y - 10), color, 0.8, 2)
+                    overlay.text(status_text, (x, y + bh + 25), color, 0.6, 2)
 
                 if session_active and identity != "Unknown" and identity not in marked_names and similarity >= SIMILARITY_THRESHOLD:
+                    db_start = time.perf_counter()
                     try:
                         db_manager.add_attendance_record(current_session_id, identity, float(similarity))
                         marked_names.add(identity)
@@ -281,16 +412,32 @@ def process_frame(frame):
                         logging.info(f"Marked: {identity}")
                     except Exception:
                         pass
+                    db_elapsed = time.perf_counter() - db_start
+                    db_s += db_elapsed
+                    frame_timings.record("db_write", db_elapsed)
             except Exception:
                 continue
 
         try:
-            cpu = psutil.cpu_percent(interval=None)
-            fps_disp = f"FPS: {current_fps:.1f}" if 'current_fps' in locals() else "FPS: --"
-            cv2.putText(frame, f"CPU: {cpu}% | {fps_disp}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+            # Banner text changes every BANNER_REFRESH, so its sprite is re-rasterised only then
+            if now - getattr(process_frame, "banner_time", 0) >= BANNER_REFRESH:
+                cpu = cpu_sampler.last
+                cpu_disp = f"CPU: {cpu:.0f}%" if cpu is not None else "CPU: --"
+                fps_disp = f"FPS: {session_stats['frame_rate'].rate():.1f}"
+                latency = recognizer.latency_stats()['last_ms'] if recognizer else None
+                lat_disp = f"LAT: {latency:.0f} ms" if latency is not None else "LAT: --"
+                process_frame.banner = f"{cpu_disp} | {fps_disp} | {lat_disp}"
+                process_frame.banner_time = now
+            if rebuild_overlay:
+                overlay.text(process_frame.banner, (10, 30), (255, 255, 255), 0.6, 1)
         except Exception:
             pass
+        if rebuild_overlay:
+            overlay.commit()
+        overlay.draw(frame)
 
+        # Render = everything on the UI thread except preprocessing and DB writes
+        frame_timings.record("render", time.perf_counter() - frame_start - preprocess_s - db_s)
         return frame, newly_marked
 
     except Exception as e:
@@ -301,7 +448,7 @@ def process_frame(frame):
 # ---------------- Window Loop ----------------
 def start_gui_session(session_id, camera_index=0):
     start_session(session_id)
-    cap, _, _ = initialize_camera(prefer_droidcam=(camera_index==1))
+    cap, _, _ = open_camera(prefer_droidcam=(camera_index==1))
     
     if not cap: return
 
@@ -309,10 +456,12 @@ def start_gui_session(session_id, camera_index=0):
     cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
 
     while True:
-        ret, frame = cap.read()
-        if not ret: break
+        ret, frame, captured_at = cap.read(timeout=1.0)
+        if not ret:
+            if not cap.running: break
+            continue
         
-        processed_frame, new_names = process_frame(frame)
+        processed_frame, new_names = process_frame(frame, captured_at)
         
         if processed_frame is None: 
             continue
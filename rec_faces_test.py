@@ -2,14 +2,16 @@
 import sys
 import os
 from embedding_loader import EmbeddingLoader
+from embedding_engine import FaceNetEmbedder
+from face_detectors import create_detector
 from deepface import DeepFace
-from mtcnn import MTCNN
 import cv2
 import numpy as np
 
 # Usage: python rec_faces_test.py [admission_number]
 
 DATA_DIR = "face_embeddings"
+DETECTOR_BACKEND = 'mtcnn'  # 'mtcnn', 'yunet', 'ssd' or 'haar'
 embeddings_path = os.path.join(DATA_DIR, "embeddings.pkl")
 user_info_path = os.path.join(DATA_DIR, "user_info.csv")
 
@@ -35,9 +37,10 @@ if len(embeddings) == 0:
 
 print(f"Loaded {len(embeddings)} embeddings for testing.")
 
-# Load FaceNet model and MTCNN detector
+# Load FaceNet model and face detector
 facenet_model = DeepFace.build_model('Facenet')
-detector = MTCNN()
+embedder = FaceNetEmbedder(facenet_model, max_batch=1)
+detector = create_detector(DETECTOR_BACKEND, fallback='mtcnn')
 
 cap = cv2.VideoCapture(0)
 print("Press 'q' to quit.")
@@ -53,8 +56,7 @@ while True:
         x, y = max(0, x), max(0, y)
         face_img = rgb_frame[y:y+h, x:x+w]
         try:
-            face_bgr = cv2.cvtColor(face_img, cv2.COLOR_RGB2BGR)
-            embedding = DeepFace.represent(face_bgr, model_name='Facenet', enforce_detection=False)[0]["embedding"]
+            embedding = embedder.embed([face_img], color='rgb')[0]
             # Compare with all embeddings
             sims = [np.dot(embedding, e) / (np.linalg.norm(embedding) * np.linalg.norm(e)) for e in embeddings]
             best_idx = int(np.argmax(sims))
@@ -0,0 +1,22 @@
+# recognition_config.py
+# Recognition settings shared by live sessions (rec_faces.py) and offline
+# batch recognition (batch_recognize.py). Importing this has no side effects,
+# so worker processes can read it without touching the database.
+
+MODEL_NAME = 'Facenet'
+SIMILARITY_THRESHOLD = 0.75
+STABLE_FRAMES = 8 
+MATCHER = 'brute'  # 'brute' or 'prototype' (per-student centroids, faster for large classes)
+MATCHER_OPTIONS = {'prototype': {'per_pose': 5, 'shortlist': 8}, 'ivf': {'nprobe': 8}}
+# Campus-wide sessions (no student_ids) switch to the approximate IVF index above this many vectors.
+# Pick nprobe with benchmarks/ann_report.py --from-db
+CAMPUS_MATCHER = 'ivf'
+CAMPUS_MATCHER_MIN_GALLERY = 20000
+DETECTOR_BACKEND = 'yunet'  # 'mtcnn', 'yunet', 'ssd' or 'haar' (benchmarks/bench_detectors.py)
+DETECTOR_FALLBACK = 'mtcnn'  # used when the backend's model file is missing from models/
+DETECTOR_OPTIONS = {}
+# Multi-resolution detection: detect on a downscaled ROI, crop faces at full resolution.
+# DETECTION_MIN_FACE = smallest face (full-resolution px) to find; it picks the scale. Or fix DETECTION_SCALE.
+DETECTION_SCALE = None
+DETECTION_MIN_FACE = None
+GALLERY_STORAGE = 'float32'  # 'float16' or 'int8' for a compact gallery (see face_matcher.storage_accuracy)
@@ -0,0 +1,217 @@
+import time
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import camera_utils
+from camera_utils import FrameGrabber, CameraManager
+
+
+class CountingCapture:
+    """VideoCapture stand-in: frame i is filled with i % 256; fails after `frames` reads."""
+
+    def __init__(self, frames=1000, delay=0.001):
+        self.frames = frames
+        self.delay = delay
+        self.count = 0
+        self.released = False
+
+    def read(self, image=None):
+        time.sleep(self.delay)
+        if self.count >= self.frames:
+            return False, None
+        self.count += 1
+        if image is None or image.shape != (48, 64, 3):
+            image = np.empty((48, 64, 3), dtype=np.uint8)
+        image[...] = self.count % 256
+        return True, image
+
+    def isOpened(self):
+        return not self.released
+
+    def release(self):
+        self.released = True
+
+
+class TestFrameGrabber(unittest.TestCase):
+    def test_newest_frame_and_held_buffer_untouched(self):
+        grabber = FrameGrabber(CountingCapture(frames=400), max_failures=3).start()
+        last_value = -1
+        buffers = set()
+        while True:
+            ok, frame, captured_at = grabber.read(timeout=1.0)
+            if not ok:
+                if not grabber.running:
+                    break
+                continue
+            value = int(frame[0, 0, 0])
+            self.assertNotEqual(value, last_value)  # never the same frame twice
+            last_value = value
+            buffers.add(id(frame))
+            time.sleep(0.005)  # slower than the camera: frames get skipped
+            self.assertTrue((frame == value).all())  # not overwritten while held
+        grabber.release()
+        self.assertEqual(grabber.frames_read, 400)
+        self.assertGreater(grabber.frames_skipped, 0)
+        self.assertLessEqual(len(buffers), 4)
+        self.assertFalse(grabber.isOpened())
+
+    def test_non_blocking_read(self):
+        grabber = FrameGrabber(CountingCapture(delay=0.2))
+        start = time.time()
+        self.assertEqual(grabber.read(timeout=0), (False, None, None))
+        self.assertLess(time.time() - start, 0.1)
+        grabber.start()
+        ok, frame, captured_at = grabber.read(timeout=2.0)
+        self.assertTrue(ok)
+        self.assertLessEqual(captured_at, time.time())
+        grabber.release()
+
+    def test_restart_while_a_read_is_stuck_keeps_one_reader(self):
+        class StuckCapture(CountingCapture):
+            """First read blocks until `unblock` is set; counts concurrent readers."""
+            def __init__(self):
+                super().__init__(delay=0.001)
+                self.unblock = threading.Event()
+                self.readers = 0
+                self.max_readers = 0
+                self.guard = threading.Lock()
+
+            def read(self, image=None):
+                with self.guard:
+                    self.readers += 1
+                    self.max_readers = max(self.max_readers, self.readers)
+                try:
+                    self.unblock.wait(5.0)
+                    return super().read(image)
+                finally:
+                    with self.guard:
+                        self.readers -= 1
+
+        cap = StuckCapture()
+        grabber = FrameGrabber(cap).start()
+        time.sleep(0.05)
+        grabber.stop(timeout=0.05)  # gives up: the reader is stuck in cap.read()
+        grabber.start()
+        cap.unblock.set()
+        self.assertTrue(grabber.read(timeout=1.0)[0])
+        time.sleep(0.05)
+        grabber.release()
+        self.assertEqual(cap.max_readers, 1)
+        self.assertFalse(grabber.running)
+
+
+class FakeDevices:
+    """cv2.VideoCapture replacement: opening takes `open_delay`; devices in `broken` fail every read."""
+
+    def __init__(self, available, open_delay=0.3):
+        self.available = set(available)
+        self.broken = set()
+        self.open_delay = open_delay
+        self.opened = []
+
+    def __call__(self, candidate):
+        devices = self
+
+        class Capture:
+            def __init__(self):
+                time.sleep(devices.open_delay)
+                self.open = candidate in devices.available
+                if self.open:
+                    devices.opened.append(candidate)
+
+            def isOpened(self):
+                return self.open
+
+            def read(self, image=None):
+                time.sleep(0.005)
+                if not self.open or candidate in devices.broken:
+                    return False, None
+                return True, np.zeros((48, 64, 3), dtype=np.uint8)
+
+            def get(self, prop):
+                return 30.0
+
+            def getBackendName(self):
+                return "FAKE"
+
+            def release(self):
+                self.open = False
+        return Capture()
+
+
+class TestCameraManager(unittest.TestCase):
+    SOURCES = {"DroidCam (Phone)": [1, "http://phone/video"], "Laptop Webcam": [0]}
+
+    def test_parallel_probe_and_persistent_grabber(self):
+        devices = FakeDevices(available={"http://phone/video", 0})
+        with mock.patch.object(camera_utils.cv2, "VideoCapture", devices):
+            manager = CameraManager(self.SOURCES)
+            start = time.time()
+            manager.start_probing()
+            self.assertEqual(manager.wait("DroidCam (Phone)")["candidate"], "http://phone/video")
+            self.assertEqual(manager.wait("Laptop Webcam")["width"], 64)
+            self.assertLess(time.time() - start, 0.6)  # three 0.3 s opens, concurrently
+
+            grabber = manager.acquire("Laptop Webcam")
+            self.assertTrue(grabber.read(timeout=1.0)[0])
+            grabber.stop()  # end of session
+            opened = len(devices.opened)
+            self.assertIs(manager.acquire("Laptop Webcam"), grabber)
+            self.assertTrue(grabber.read(timeout=1.0)[0])
+            self.assertEqual(len(devices.opened), opened)  # not reopened
+            manager.close()
+
+    def test_missing_source_and_reconnect(self):
+        devices = FakeDevices(available={0}, open_delay=0.01)
+        with mock.patch.object(camera_utils.cv2, "VideoCapture", devices):
+            manager = CameraManager(self.SOURCES, reconnect_interval=0.05)
+            manager.start_probing()
+            self.assertIsNone(manager.wait("DroidCam (Phone)"))
+            self.assertIsNone(manager.acquire("DroidCam (Phone)"))
+
+            grabber = manager.acquire("Laptop Webcam")
+            grabber.max_failures = 3
+            devices.broken.add(0)
+            deadline = time.time() + 2.0
+            while not grabber.lost and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertTrue(grabber.lost)
+            devices.broken.clear()
+            deadline = time.time() + 2.0
+            ok = False
+            while not ok and time.time() < deadline:  # read() returns at once while the device is lost
+                ok, frame, _ = grabber.read(timeout=0.1)
+                time.sleep(0.01)
+            self.assertTrue(ok)
+            self.assertFalse(grabber.lost)
+            manager.close()
+
+    def test_reconnect_after_session_end_stays_paused(self):
+        devices = FakeDevices(available={0}, open_delay=0.01)
+        with mock.patch.object(camera_utils.cv2, "VideoCapture", devices):
+            manager = CameraManager({"Laptop Webcam": [0]}, reconnect_interval=0.05)
+            grabber = manager.acquire("Laptop Webcam")
+            grabber.max_failures = 3
+            devices.broken.add(0)
+            deadline = time.time() + 2.0
+            while not grabber.lost and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertTrue(grabber.lost)
+            grabber.stop()  # session ended while the device was lost
+            devices.broken.clear()
+            deadline = time.time() + 2.0
+            while grabber.lost and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertFalse(grabber.lost)  # reopened...
+            time.sleep(0.1)
+            self.assertFalse(grabber.running)  # ...but not decoding without a session
+            self.assertIs(manager.acquire("Laptop Webcam"), grabber)
+            self.assertTrue(grabber.read(timeout=1.0)[0])
+            manager.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+import numpy as np
+from embedding_engine import FaceNetEmbedder
+
+
+class RecordingModel:
+    """Stands in for the Keras model: records its input, returns the per-image mean."""
+    input_shape = (None, 160, 160, 3)
+    output_shape = (None, 128)
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, batch, training=False):
+        self.batches.append(np.array(batch))
+        return np.repeat(batch.mean(axis=(1, 2, 3))[:, None], 128, axis=1)
+
+
+class TestFaceNetEmbedder(unittest.TestCase):
+    def test_one_forward_pass_per_batch(self):
+        model = RecordingModel()
+        embedder = FaceNetEmbedder(model, max_batch=4)
+        crops = [np.full((80 + 10 * i, 60, 3), 255, dtype=np.uint8) for i in range(6)]
+        out = embedder.embed(crops)
+        self.assertEqual(out.shape, (6, 128))
+        self.assertEqual(out.dtype, np.float32)
+        self.assertEqual([b.shape[0] for b in model.batches], [4, 2])
+
+    def test_letterbox_and_bgr_scaling(self):
+        model = RecordingModel()
+        embedder = FaceNetEmbedder(model)
+        crop = np.zeros((100, 50, 3), dtype=np.uint8)
+        crop[..., 0] = 255  # red in RGB
+        embedder.embed([crop], color='rgb')
+        batch = model.batches[0][0]
+        self.assertEqual(batch.shape, (160, 160, 3))
+        # 100x50 -> 160x80 centred, zero padding either side
+        self.assertEqual(batch[:, :40].max(), 0.0)
+        self.assertEqual(batch[:, 120:].max(), 0.0)
+        # BGR order in [0, 1]: red lands in the last channel
+        np.testing.assert_allclose(batch[80, 80], [0.0, 0.0, 1.0])
+
+    def test_wrapped_model_and_empty_input(self):
+        wrapper = type('Client', (), {'model': RecordingModel()})()
+        embedder = FaceNetEmbedder(wrapper)
+        self.assertEqual(embedder.embed([]).shape, (0, 128))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import unittest
+import cv2
+import numpy as np
+from face_detectors import HaarDetector, ScaledDetector, create_detector, run_detector
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class FixedBoxDetector:
+    """Finds one face at a fixed fraction of whatever frame it is given."""
+    min_face_size = 20
+
+    def __init__(self):
+        self.shapes = []
+
+    def detect_faces(self, rgb_frame):
+        h, w = rgb_frame.shape[:2]
+        self.shapes.append((h, w))
+        return [{'box': [w // 4, h // 4, w // 2, h // 2], 'confidence': 0.9, 'keypoints': {'nose': (w // 2, h // 2)}}]
+
+
+class TestFaceDetectors(unittest.TestCase):
+    def test_haar_finds_face_in_mtcnn_format(self):
+        rgb = cv2.cvtColor(cv2.imread(os.path.join(TESTS_DIR, "bill.jpg")), cv2.COLOR_BGR2RGB)
+        faces = HaarDetector().detect_faces(rgb)
+        self.assertGreaterEqual(len(faces), 1)
+        face = faces[0]
+        self.assertEqual(len(face['box']), 4)
+        self.assertTrue(0.0 < face['confidence'] < 1.0)
+        self.assertEqual(face['keypoints'], {})
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            create_detector('nope')
+
+    def test_missing_model_raises_without_fallback(self):
+        with self.assertRaises(FileNotFoundError):
+            create_detector('yunet', model_path='/nonexistent/yunet.onnx')
+
+    def test_missing_model_uses_fallback(self):
+        with self.assertLogs(level='WARNING'):
+            detector = create_detector('ssd', fallback='haar', model_path='/nonexistent/ssd.caffemodel')
+        self.assertIsInstance(detector, HaarDetector)
+
+    def test_scaled_detector_maps_boxes_to_full_resolution(self):
+        inner = FixedBoxDetector()
+        faces = ScaledDetector(inner, scale=0.5).detect_faces(np.zeros((720, 1280, 3), dtype=np.uint8))
+        self.assertEqual(inner.shapes, [(360, 640)])
+        self.assertEqual(faces[0]['box'], [320, 180, 640, 360])
+        self.assertEqual(faces[0]['keypoints']['nose'], (640, 360))
+
+    def test_min_face_picks_scale(self):
+        self.assertAlmostEqual(ScaledDetector(FixedBoxDetector(), min_face=80).scale, 0.25)
+        # Never upscales
+        self.assertEqual(ScaledDetector(FixedBoxDetector(), min_face=10).scale, 1.0)
+        self.assertIsInstance(create_detector('haar', min_face=80), ScaledDetector)
+
+    def test_bgr_input_matches_rgb(self):
+        bgr = cv2.imread(os.path.join(TESTS_DIR, "bill.jpg"))
+        rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+        haar = HaarDetector()
+        self.assertEqual(run_detector(haar, bgr, 'bgr'), haar.detect_faces(rgb))
+        # Detectors without a color parameter get the frame converted to RGB
+        inner = FixedBoxDetector()
+        faces = run_detector(ScaledDetector(inner, scale=0.5), bgr, 'bgr')
+        self.assertEqual(len(faces), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
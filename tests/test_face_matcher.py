@@ -0,0 +1,209 @@
+import unittest
+import numpy as np
+from face_matcher import GalleryMatcher, PrototypeIndex, IVFIndex, build_matcher, normalize_rows, quantize_rows, storage_accuracy, top_k, HEADROOM_ROWS, UNKNOWN_LABEL
+
+
+class TestGalleryMatcher(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.embeddings = rng.normal(size=(50, 128))
+        self.labels = [f"S{i // 5}" for i in range(50)]
+        self.matcher = GalleryMatcher(self.embeddings, self.labels)
+
+    def test_gallery_is_contiguous_float32(self):
+        self.assertEqual(self.matcher.gallery.dtype, np.float32)
+        self.assertTrue(self.matcher.gallery.flags['C_CONTIGUOUS'])
+        np.testing.assert_allclose(np.linalg.norm(self.matcher.gallery, axis=1), 1.0, rtol=1e-5)
+
+    def test_search_matches_brute_force(self):
+        queries = self.embeddings[[3, 17, 42]] * 2.5
+        scores, idx = self.matcher.search(queries, k=4)
+        expected = normalize_rows(queries) @ normalize_rows(self.embeddings).T
+        for row in range(3):
+            np.testing.assert_array_equal(idx[row], np.argsort(-expected[row])[:4])
+        self.assertEqual(list(idx[:, 0]), [3, 17, 42])
+
+    def test_match_threshold(self):
+        rng = np.random.default_rng(1)
+        results = self.matcher.match([self.embeddings[7], rng.normal(size=128)], 0.9)
+        self.assertEqual(results[0][0], "S1")
+        self.assertAlmostEqual(results[0][1], 1.0, places=5)
+        self.assertEqual(results[1][0], UNKNOWN_LABEL)
+
+    def test_empty_gallery(self):
+        matcher = GalleryMatcher([], [])
+        self.assertEqual(matcher.match([np.ones(128)], 0.5), [(UNKNOWN_LABEL, 0.0)])
+        self.assertEqual(matcher.match([], 0.5), [])
+
+    def test_top_k_clamps_to_gallery_size(self):
+        scores, idx = top_k(np.array([[0.1, 0.9, 0.5]]), 10)
+        self.assertEqual(list(idx[0]), [1, 2, 0])
+
+
+class TestPrototypeIndex(unittest.TestCase):
+    def setUp(self):
+        # 40 students, 3 poses x 5 frames each, clustered around per-pose centres
+        rng = np.random.default_rng(2)
+        centres = rng.normal(size=(40, 3, 128))
+        self.embeddings = np.concatenate([
+            centres[s, p] + 0.1 * rng.normal(size=(5, 128)) for s in range(40) for p in range(3)
+        ])
+        self.labels = [f"S{s}" for s in range(40) for _ in range(15)]
+        self.index = PrototypeIndex(self.embeddings, self.labels, per_pose=5, shortlist=4)
+
+    def test_prototypes_per_pose(self):
+        self.assertEqual(self.index.prototypes.shape, (120, 128))
+        self.assertEqual(len(self.index.student_rows), 40)
+
+    def test_agrees_with_brute_force(self):
+        rng = np.random.default_rng(3)
+        queries = self.embeddings[::7] + 0.05 * rng.normal(size=(len(self.embeddings[::7]), 128))
+        exact = GalleryMatcher(self.embeddings, self.labels)
+        _, exact_idx = exact.search(queries, k=3)
+        scores, idx = self.index.search(queries, k=3)
+        np.testing.assert_array_equal(idx, exact_idx)
+        self.assertTrue(np.all(np.diff(scores, axis=1) <= 0))
+
+    def test_build_matcher(self):
+        self.assertIsInstance(build_matcher('prototype', self.embeddings, self.labels), PrototypeIndex)
+        with self.assertRaises(ValueError):
+            build_matcher('nope')
+
+
+class TestIVFIndex(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(4)
+        centres = rng.normal(size=(200, 128))
+        self.embeddings = np.repeat(centres, 15, axis=0) + 0.2 * rng.normal(size=(3000, 128))
+        self.labels = [f"S{i // 15}" for i in range(3000)]
+        self.queries = self.embeddings[::37] + 0.1 * rng.normal(size=(len(self.embeddings[::37]), 128))
+        _, self.exact_idx = GalleryMatcher(self.embeddings, self.labels).search(self.queries, k=1)
+
+    def test_lists_partition_gallery(self):
+        index = IVFIndex(self.embeddings, self.labels, nlist=32)
+        rows = np.sort(np.concatenate(index.lists))
+        np.testing.assert_array_equal(rows, np.arange(3000))
+
+    def test_full_probe_is_exact(self):
+        index = IVFIndex(self.embeddings, self.labels, nlist=32)
+        _, idx = index.search(self.queries, k=1, nprobe=32)
+        np.testing.assert_array_equal(idx, self.exact_idx)
+
+    def test_recall_with_few_probes(self):
+        index = IVFIndex(self.embeddings, self.labels, nlist=32, nprobe=4)
+        _, idx = index.search(self.queries, k=1)
+        self.assertGreaterEqual(np.mean(idx[:, 0] == self.exact_idx[:, 0]), 0.95)
+
+    def test_product_quantisation(self):
+        index = IVFIndex(self.embeddings, self.labels, nlist=16, nprobe=16, pq_m=16, rerank=32, iters=5)
+        self.assertEqual(index.codes.shape, (3000, 16))
+        self.assertEqual(index.codes.dtype, np.uint8)
+        results = index.match(self.queries, 0.5)
+        expected = [self.labels[i] for i in self.exact_idx[:, 0]]
+        self.assertGreaterEqual(np.mean([r[0] == e for r, e in zip(results, expected)]), 0.95)
+
+
+class TestCompactStorage(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        self.embeddings = rng.normal(size=(5000, 128))
+        self.labels = [f"S{i // 15}" for i in range(5000)]
+        self.queries = self.embeddings[::50] + 0.3 * rng.normal(size=(100, 128))
+
+    def test_int8_roundtrip(self):
+        gallery = normalize_rows(self.embeddings)
+        codes, scales = quantize_rows(gallery, 'int8')
+        self.assertEqual(codes.dtype, np.int8)
+        np.testing.assert_allclose(codes * scales[:, None], gallery, atol=scales.max())
+
+    def test_memory_saving(self):
+        baseline = GalleryMatcher(self.embeddings, self.labels)
+        self.assertEqual(GalleryMatcher(self.embeddings, self.labels, storage='float16').nbytes * 2, baseline.nbytes)
+        self.assertGreater(baseline.nbytes / GalleryMatcher(self.embeddings, self.labels, storage='int8').nbytes, 3.8)
+
+    def test_accuracy_against_float32(self):
+        for storage, tolerance in (('float16', 1e-3), ('int8', 2e-2)):
+            report = storage_accuracy(self.embeddings, self.queries, storage, k=5)
+            self.assertLess(report['max_score_error'], tolerance)
+            self.assertGreaterEqual(report['topk_agreement'], 0.98)
+
+    def test_indexes_accept_storage(self):
+        exact = GalleryMatcher(self.embeddings, self.labels).match(self.queries, 0.0)
+        for kind in ('brute', 'prototype', 'ivf'):
+            matcher = build_matcher(kind, self.embeddings, self.labels, storage='int8')
+            self.assertEqual(matcher.gallery.dtype, np.int8)
+            if kind != 'ivf':
+                self.assertEqual([m[0] for m in matcher.match(self.queries, 0.0)], [e[0] for e in exact])
+
+    def test_unknown_storage(self):
+        with self.assertRaises(ValueError):
+            GalleryMatcher(self.embeddings, self.labels, storage='int4')
+
+
+class TestIncrementalGallery(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(6)
+        centres = rng.normal(size=(30, 128))
+        self.embeddings = np.concatenate([centres[s] + 0.1 * rng.normal(size=(5, 128)) for s in range(30)])
+        self.labels = [f"S{s}" for s in range(30) for _ in range(5)]
+        self.late = centres[0] * -1 + 0.1 * rng.normal(size=(5, 128))  # far from everyone enrolled
+
+    def matchers(self):
+        yield GalleryMatcher(self.embeddings, self.labels)
+        yield GalleryMatcher(self.embeddings, self.labels, storage='int8')
+        yield PrototypeIndex(self.embeddings, self.labels, per_pose=5, shortlist=4)
+        yield IVFIndex(self.embeddings, self.labels, nlist=6, nprobe=6)
+        yield IVFIndex(self.embeddings, self.labels, nlist=6, nprobe=6, pq_m=16, rerank=20)
+
+    def test_add_identity(self):
+        for matcher in self.matchers():
+            rows = matcher.add_identity("LATE", self.late)
+            self.assertEqual(list(rows), list(range(150, 155)))
+            self.assertEqual(len(matcher), 155)
+            self.assertEqual(matcher.match([self.late[2]], 0.9)[0][0], "LATE", type(matcher).__name__)
+            self.assertEqual(matcher.match([self.embeddings[12]], 0.9)[0][0], "S2")
+
+    def test_add_does_not_copy_existing_rows(self):
+        matcher = GalleryMatcher(self.embeddings, self.labels)
+        matcher.add_identity("A", self.late[:1])
+        before = matcher.gallery
+        matcher.add_identity("B", self.late[1:2])
+        self.assertTrue(np.shares_memory(before, matcher.gallery))
+
+    def test_first_add_after_set_gallery_uses_headroom(self):
+        for storage in ('float32', 'int8'):
+            matcher = GalleryMatcher(self.embeddings, self.labels, storage=storage)
+            stored, scales = matcher.gallery, matcher.scales
+            matcher.add_identity("LATE", self.late)
+            self.assertTrue(np.shares_memory(stored, matcher.gallery), storage)
+            if scales is not None:
+                self.assertTrue(np.shares_memory(scales, matcher.scales))
+            # Headroom is bounded, not a doubled buffer
+            self.assertLessEqual(matcher._rows._buf.shape[0], 150 + max(HEADROOM_ROWS, 150 // 16))
+
+    def test_remove_identity(self):
+        for matcher in self.matchers():
+            self.assertEqual(matcher.remove_identity("S2"), 5)
+            label, _ = matcher.match([self.embeddings[12]], 0.9)[0]
+            self.assertEqual(label, UNKNOWN_LABEL, type(matcher).__name__)
+            self.assertEqual(matcher.match([self.embeddings[20]], 0.9)[0][0], "S4")
+            self.assertEqual(matcher.remove_identity("S2"), 0)
+
+    def test_compact_after_many_removals(self):
+        for matcher in self.matchers():
+            for s in range(20):
+                matcher.remove_identity(f"S{s}")
+            self.assertLess(len(matcher), 150, type(matcher).__name__)  # compacted on the way
+            self.assertEqual(matcher.n_active, 50)
+            self.assertEqual(matcher.match([self.embeddings[140]], 0.9)[0][0], "S28")
+            self.assertEqual(matcher.match([self.embeddings[10]], 0.9)[0][0], UNKNOWN_LABEL)
+
+    def test_add_to_empty_ivf(self):
+        index = IVFIndex([], [], nprobe=4)
+        index.add_identity("A", self.embeddings[:5])
+        index.add_identity("B", self.embeddings[5:10])
+        self.assertEqual(index.match([self.embeddings[7]], 0.9)[0][0], "B")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+import time
+import unittest
+import multiprocessing
+from unittest import mock
+
+import numpy as np
+
+import face_recognizer
+from face_recognizer import FaceRecognizer, Mailbox
+
+
+class FakeModel:
+    """Stands in for the Keras FaceNet model."""
+    input_shape = (None, 160, 160, 3)
+    output_shape = (None, 128)
+
+    def __call__(self, batch, training=False):
+        return np.ones((len(batch), 128), dtype=np.float32)
+
+
+class SlowDetector:
+    """One face per frame; every third frame (by pixel value) takes much longer, so workers finish out of order."""
+    accepts_color = True
+    min_face_size = 20
+
+    def detect_faces(self, frame, color='rgb'):
+        time.sleep(0.03 if int(frame[0, 0, 0]) % 3 == 0 else 0.002)
+        return [{'box': [4, 4, 32, 32], 'confidence': 0.99, 'keypoints': {}}]
+
+
+class RecordingMailbox(Mailbox):
+    """Mailbox that also keeps the sequence number of everything delivered."""
+
+    def __init__(self):
+        super().__init__()
+        self.delivered = []
+
+    def put(self, item):
+        self.delivered.append(item[0])
+        super().put(item)
+
+
+class RecognizerTestCase(unittest.TestCase):
+    def setUp(self):
+        for patcher in (mock.patch.object(face_recognizer.DeepFace, 'build_model', return_value=FakeModel()),
+                        mock.patch.object(face_recognizer, 'create_detector', side_effect=lambda **config: SlowDetector())):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def make(self, **options):
+        recognizer = FaceRecognizer('Facenet', [np.ones(128)], ['S1'], **options)
+        self.addCleanup(recognizer.stop)
+        recognizer.results = RecordingMailbox()
+        return recognizer
+
+    @staticmethod
+    def feed(recognizer, frames, interval=0.004):
+        for i in range(frames):
+            recognizer.submit_frame(np.full((64, 64, 3), i % 256, dtype=np.uint8))
+            recognizer.get_latest_result()
+            time.sleep(interval)
+
+    @staticmethod
+    def drain(recognizer, timeout=5.0):
+        deadline = time.time() + timeout
+        while recognizer.backlog() and time.time() < deadline:
+            time.sleep(0.01)
+
+
+class TestWorkerPool(RecognizerTestCase):
+    def assert_delivered_in_order(self, recognizer):
+        delivered = recognizer.results.delivered
+        self.assertGreater(len(delivered), 10)
+        self.assertEqual(delivered, sorted(set(delivered)))
+
+    def test_thread_pool_delivers_in_frame_order(self):
+        recognizer = self.make(num_workers=3, worker_mode='thread')
+        self.feed(recognizer, 120)
+        self.drain(recognizer)
+        self.assert_delivered_in_order(recognizer)
+        self.assertEqual(recognizer.backlog(), 0)
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == 'fork', "worker processes must inherit the stubs")
+    def test_process_pool_delivers_in_frame_order(self):
+        recognizer = self.make(num_workers=2, worker_mode='process')
+        self.feed(recognizer, 150)
+        self.drain(recognizer)
+        self.assert_delivered_in_order(recognizer)
+
+    def test_unknown_worker_mode(self):
+        with self.assertRaises(ValueError):
+            FaceRecognizer('Facenet', worker_mode='fiber')
+
+
+class TestMailbox(unittest.TestCase):
+    def test_latest_wins(self):
+        box = Mailbox()
+        self.assertIsNone(box.take())
+        self.assertFalse(box.wait(timeout=0.01))
+        box.put(1)
+        box.put(2)
+        self.assertEqual(len(box), 1)
+        self.assertEqual(box.overwritten, 1)
+        self.assertTrue(box.wait(timeout=0.01))
+        self.assertEqual(box.take(), 2)
+        self.assertIsNone(box.take())
+        self.assertFalse(box.wait(timeout=0.01))
+        box.put(3)
+        self.assertEqual(box.overwritten, 1)  # the slot was empty
+
+
+class TestOrdering(RecognizerTestCase):
+    def test_latest_result_sequence_increases(self):
+        recognizer = self.make(num_workers=3)
+        seen = []
+        for i in range(120):
+            recognizer.submit_frame(np.full((64, 64, 3), i % 256, dtype=np.uint8))
+            if recognizer.get_latest_result() is not None:
+                seen.append(recognizer.last_result_info[0])
+            time.sleep(0.004)
+        self.assertGreater(len(seen), 5)
+        self.assertEqual(seen, sorted(set(seen)))
+
+    def test_waits_for_frames_in_flight(self):
+        recognizer = self.make(num_workers=2)
+        with recognizer._order_lock:
+            recognizer._in_flight.update({0, 1})
+        recognizer._deliver(1, time.time(), [], [])
+        self.assertEqual(recognizer.results.delivered, [])  # frame 0 is still in a worker
+        recognizer._deliver(0, time.time(), [], [])
+        self.assertEqual(recognizer.results.delivered, [0, 1])
+        recognizer._deliver(0, time.time(), [], [])  # late duplicate: already overtaken
+        self.assertEqual(recognizer.results.delivered, [0, 1])
+
+    def test_frame_lost_by_a_worker_is_skipped(self):
+        recognizer = self.make(num_workers=2)
+        later = range(1, recognizer._max_pending + 2)
+        with recognizer._order_lock:
+            recognizer._in_flight.update({0, *later})
+        for seq in later[:-1]:
+            recognizer._deliver(seq, time.time(), [], [])
+        self.assertEqual(recognizer.results.delivered, [])
+        recognizer._deliver(later[-1], time.time(), [], [])  # one too many waiting: give up on frame 0
+        self.assertEqual(recognizer.results.delivered, list(later))
+        self.assertEqual(recognizer.backlog(), 0)
+
+    def assert_nothing_stale_after(self, recognizer, swap):
+        self.feed(recognizer, 40)
+        swap()
+        boundary = recognizer._submit_seq
+        mark = len(recognizer.results.delivered)
+        self.assertIsNone(recognizer.get_latest_result())
+        time.sleep(0.2)  # frames submitted before the swap finish in the workers meanwhile
+        self.feed(recognizer, 20)
+        self.drain(recognizer)
+        after = recognizer.results.delivered[mark:]
+        self.assertTrue(after)
+        self.assertGreaterEqual(min(after), boundary)
+
+    def test_no_result_from_before_reset(self):
+        recognizer = self.make(num_workers=3)
+        self.assert_nothing_stale_after(recognizer, recognizer.reset)
+
+    def test_no_result_from_before_set_embeddings(self):
+        recognizer = self.make(num_workers=3)
+        self.assert_nothing_stale_after(recognizer, lambda: recognizer.set_embeddings([np.ones(128)], ['S2']))
+
+
+if __name__ == '__main__':
+    unittest.main()
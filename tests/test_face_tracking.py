@@ -0,0 +1,57 @@
+import unittest
+import numpy as np
+import cv2
+from face_tracking import TrackingDetector
+
+
+class MovingPatchDetector:
+    """Reports the known position of a textured patch, counting calls."""
+    def __init__(self):
+        self.box = [40, 50, 60, 60]
+        self.calls = 0
+
+    def detect_faces(self, rgb_frame):
+        self.calls += 1
+        return [{'box': list(self.box), 'confidence': 0.99, 'keypoints': {'nose': (70, 80)}}]
+
+
+def render(box, texture):
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    x, y, w, h = box
+    frame[y:y+h, x:x+w] = texture
+    return frame
+
+
+class TestTrackingDetector(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.texture = cv2.GaussianBlur(rng.integers(0, 255, (60, 60, 3), dtype=np.uint8), (3, 3), 0)
+        self.inner = MovingPatchDetector()
+
+    def test_detects_every_n_frames_and_follows_motion(self):
+        tracker = TrackingDetector(self.inner, detect_every=4)
+        for step in range(8):
+            self.inner.box = [40 + 3 * step, 50 + 2 * step, 60, 60]
+            faces = tracker.detect_faces(render(self.inner.box, self.texture))
+            self.assertEqual(len(faces), 1)
+            x, y, w, h = faces[0]['box']
+            self.assertLessEqual(abs(x - self.inner.box[0]), 2)
+            self.assertLessEqual(abs(y - self.inner.box[1]), 2)
+        self.assertEqual(self.inner.calls, 2)
+
+    def test_confidence_drop_forces_detection(self):
+        tracker = TrackingDetector(self.inner, detect_every=10)
+        tracker.detect_faces(render(self.inner.box, self.texture))
+        # Patch vanishes: optical flow loses its points
+        tracker.detect_faces(np.zeros((240, 320, 3), dtype=np.uint8))
+        self.assertEqual(self.inner.calls, 2)
+
+    def test_detect_every_one_always_detects(self):
+        tracker = TrackingDetector(self.inner, detect_every=1)
+        for _ in range(3):
+            tracker.detect_faces(render(self.inner.box, self.texture))
+        self.assertEqual(self.inner.calls, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
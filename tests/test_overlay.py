@@ -0,0 +1,74 @@
+import os
+import unittest
+import cv2
+import numpy as np
+from overlay import FONT, LabelCache, OverlayRenderer
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestLabelCache(unittest.TestCase):
+    def setUp(self):
+        self.frame = cv2.imread(os.path.join(TESTS_DIR, "obama.jpg"))
+
+    def test_blit_matches_puttext(self):
+        cache = LabelCache()
+        for text, org, color, scale, thickness in [("Barack Obama", (20, 60), (0, 255, 255), 0.8, 2),
+                                                   ("0.87", (40, 120), (0, 0, 255), 0.6, 2),
+                                                   ("CPU: 12% | FPS: 29.8", (10, 30), (255, 255, 255), 0.6, 1)]:
+            expected = self.frame.copy()
+            cv2.putText(expected, text, org, FONT, scale, color, thickness)
+            actual = self.frame.copy()
+            cache.blit(actual, text, org, color, scale, thickness)
+            np.testing.assert_array_equal(actual, expected)
+
+    def test_clipped_and_offscreen(self):
+        cache = LabelCache()
+        frame = self.frame.copy()
+        cache.blit(frame, "PRESENT", (frame.shape[1] - 30, 10), (0, 255, 0), 0.6, 2)
+        self.assertTrue((frame != self.frame).any())
+        untouched = self.frame.copy()
+        cache.blit(untouched, "PRESENT", (-500, -500), (0, 255, 0), 0.6, 2)
+        np.testing.assert_array_equal(untouched, self.frame)
+
+    def test_sprites_cached_and_bounded(self):
+        cache = LabelCache(max_labels=2)
+        frame = self.frame.copy()
+        for _ in range(5):
+            cache.blit(frame, "A", (10, 30), (0, 0, 255), 0.6, 2)
+        self.assertEqual(cache.rendered, 1)
+        cache.blit(frame, "A", (10, 30), (0, 255, 0), 0.6, 2)  # colour is part of the key
+        cache.blit(frame, "B", (10, 30), (0, 0, 255), 0.6, 2)
+        self.assertEqual(cache.rendered, 3)
+        self.assertEqual(len(cache._sprites), 2)
+        cache.blit(frame, "A", (10, 30), (0, 0, 255), 0.6, 2)  # evicted, rasterised again
+        self.assertEqual(cache.rendered, 4)
+
+
+class TestOverlayRenderer(unittest.TestCase):
+    def test_scene_replayed_between_rebuilds(self):
+        overlay = OverlayRenderer(fps=10)
+        frame = np.zeros((120, 160, 3), dtype=np.uint8)
+        self.assertTrue(overlay.due(now=0.0))
+        overlay.begin(now=0.0)
+        overlay.rect((10, 10), (60, 60), (0, 255, 0), 2)
+        overlay.text("X", (20, 40), (0, 0, 255), 0.6, 2)
+        overlay.commit()
+        first = overlay.draw(frame.copy())
+        self.assertTrue(first.any())
+        self.assertFalse(overlay.due(now=0.05))
+        np.testing.assert_array_equal(overlay.draw(frame.copy()), first)
+        self.assertTrue(overlay.due(now=0.1))
+        overlay.begin(now=0.1)
+        overlay.commit()
+        self.assertFalse(overlay.draw(frame.copy()).any())
+
+    def test_unthrottled(self):
+        overlay = OverlayRenderer(fps=None)
+        overlay.begin(now=1.0)
+        overlay.commit()
+        self.assertTrue(overlay.due(now=1.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
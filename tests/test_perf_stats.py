@@ -0,0 +1,77 @@
+import threading
+import unittest
+from perf_stats import LatencyHistogram, StageTimings, RunningStats, WindowedRate
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_percentiles_within_one_bucket(self):
+        hist = LatencyHistogram()
+        for ms in range(1, 1001):
+            hist.record(ms / 1000.0)
+        self.assertEqual(hist.count, 1000)
+        for q, exact in ((50, 0.5), (95, 0.95), (99, 0.99)):
+            self.assertLess(abs(hist.percentile(q) - exact) / exact, 0.13)
+        self.assertAlmostEqual(hist.summary()["mean_ms"], 500.5, places=1)
+        self.assertEqual(hist.summary()["max_ms"], 1000.0)
+
+    def test_memory_is_fixed(self):
+        hist = LatencyHistogram()
+        buckets = len(hist.counts)
+        for i in range(10000):
+            hist.record(i * 1e-4)
+        hist.record(1e6)  # overflow bucket
+        self.assertEqual(len(hist.counts), buckets)
+        self.assertEqual(hist.percentile(100), 1e6)
+
+    def test_empty(self):
+        self.assertIsNone(LatencyHistogram().percentile(50))
+        self.assertEqual(LatencyHistogram().summary(), {"count": 0})
+
+
+class TestStageTimings(unittest.TestCase):
+    def test_record_from_threads(self):
+        timings = StageTimings()
+
+        def work():
+            for _ in range(500):
+                timings.record("detect", 0.01)
+                with timings.time("match"):
+                    pass
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        summary = timings.summary()
+        self.assertEqual(summary["detect"]["count"], 2000)
+        self.assertEqual(summary["match"]["count"], 2000)
+        timings.reset()
+        self.assertEqual(timings.summary(), {})
+
+
+class TestRunningStats(unittest.TestCase):
+    def test_matches_batch_statistics(self):
+        values = [12.0, 30.5, 29.0, 31.2, 28.7, 5.0, 30.0]
+        stats = RunningStats()
+        for v in values:
+            stats.add(v)
+        mean = sum(values) / len(values)
+        variance = sum((v - mean) ** 2 for v in values) / (len(values) - 1)
+        self.assertAlmostEqual(stats.mean, mean)
+        self.assertAlmostEqual(stats.variance, variance)
+        self.assertEqual((stats.min, stats.max), (5.0, 31.2))
+        stats.reset()
+        self.assertEqual(stats.summary(), {"count": 0})
+
+
+class TestWindowedRate(unittest.TestCase):
+    def test_rate_over_window(self):
+        rate = WindowedRate(window=2.0, slots=20)
+        for i in range(60):  # 30 per second for 2 s
+            rate.tick(now=100.0 + i / 30.0)
+        self.assertAlmostEqual(rate.rate(now=102.0), 30.0, delta=2.0)
+        self.assertEqual(rate.rate(now=110.0), 0.0)  # stale slots are ignored
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import os
+import unittest
+import cv2
+import numpy as np
+from preprocessing import FramePreprocessor
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestFramePreprocessor(unittest.TestCase):
+    def setUp(self):
+        self.frame = cv2.imread(os.path.join(TESTS_DIR, "obama.jpg"))
+        self.roi = self.frame[10:-10, 20:-20]  # non-contiguous view, like the ROI crop
+
+    def test_matches_reference_pipeline(self):
+        pre = FramePreprocessor()
+        gray = cv2.cvtColor(self.roi, cv2.COLOR_BGR2GRAY)
+        self.assertAlmostEqual(pre.sharpness(self.roi), cv2.Laplacian(gray, cv2.CV_64F).var(), places=3)
+        l, a, b = cv2.split(cv2.cvtColor(self.roi, cv2.COLOR_BGR2LAB))
+        l = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(l)
+        reference = cv2.cvtColor(cv2.merge((l, a, b)), cv2.COLOR_LAB2BGR)
+        np.testing.assert_array_equal(pre.enhance(self.roi), reference)
+        np.testing.assert_array_equal(pre.mirror(self.frame), cv2.flip(self.frame, 1))
+
+    def test_buffers_reused_and_results_owned(self):
+        pre = FramePreprocessor()
+        first = pre.mirror(self.frame)
+        self.assertIs(pre.mirror(self.frame), first)
+        enhanced = pre.enhance(self.roi)
+        snapshot = enhanced.copy()
+        pre.enhance(self.roi[::-1])  # the next frame must not overwrite a submitted one
+        np.testing.assert_array_equal(enhanced, snapshot)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import time
+import unittest
+
+import numpy as np
+
+from preview_renderer import PreviewRenderer
+
+
+class ListGrabber:
+    """FrameGrabber stand-in: hands out `frames` BGR frames at `fps`, then nothing."""
+
+    def __init__(self, frames, fps=200.0):
+        self.frames = list(frames)
+        self.interval = 1.0 / fps
+        self.running = True
+
+    def read(self, timeout=1.0):
+        if not self.frames:
+            time.sleep(min(timeout, 0.05))
+            return False, None, None
+        time.sleep(self.interval)
+        return True, self.frames.pop(0), time.time()
+
+
+def bgr_frame(value=0):
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    frame[..., 0] = 255  # blue
+    frame[0, 0] = value
+    return frame
+
+
+def wait_until(condition, timeout=3.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class TestPreviewRenderer(unittest.TestCase):
+    def test_renders_scaled_rgb_at_refresh_rate(self):
+        grabber = ListGrabber([bgr_frame(i) for i in range(100)])
+
+        def process(frame, captured_at):
+            return frame, ["S1"] if frame[0, 0, 0] == 0 else []
+        renderer = PreviewRenderer(grabber, process, refresh_hz=20.0)
+        renderer.target_height = 480
+        renderer.start()
+        wait_until(lambda: renderer.frames_processed == 100)
+        renderer.stop()
+        self.assertEqual(renderer.frames_processed, 100)
+        self.assertLess(renderer.frames_rendered, 40)  # ~0.5 s of frames at 20 Hz
+        image, logged = renderer.take()
+        self.assertEqual(image.size, (640, 480))
+        self.assertEqual(image.getpixel((10, 10)), (0, 0, 255))  # blue, now in RGB order
+        self.assertEqual(logged, ["S1"])
+        self.assertEqual(renderer.take(), (None, []))
+
+    def test_failed_processing_shows_mirrored_frame(self):
+        frame = bgr_frame()
+        frame[:, :10] = (0, 255, 0)
+
+        def process(frame, captured_at):
+            raise RuntimeError("boom")
+        renderer = PreviewRenderer(ListGrabber([frame]), process).start()
+        wait_until(lambda: renderer.frames_rendered == 1)
+        renderer.stop()
+        image, _ = renderer.take()
+        self.assertEqual(image.getpixel((315, 5)), (0, 255, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+from rate_controller import SubmissionController
+
+
+class TestSubmissionController(unittest.TestCase):
+    def run_for(self, controller, seconds, latency, backlog=0, workers=1, cpu=None, fps=30.0, start=0.0):
+        """Simulates a UI loop at `fps` for `seconds`; returns the number of frames submitted."""
+        submitted = 0
+        t = start
+        while t < start + seconds:
+            if controller.should_submit(now=t):
+                submitted += 1
+                controller.observe_latency(latency)
+            controller.update(backlog, workers, 0, cpu, now=t)
+            t += 1.0 / fps
+        return submitted
+
+    def test_rate_is_limited(self):
+        controller = SubmissionController(min_fps=2, max_fps=10, adjust_every=1e9)
+        submitted = self.run_for(controller, 2.0, latency=0.05)
+        self.assertAlmostEqual(submitted, 20, delta=1)
+
+    def test_pressure_lowers_rate_then_resolution(self):
+        controller = SubmissionController(min_fps=2, max_fps=30, target_latency=0.25)
+        self.run_for(controller, 10.0, latency=0.6)
+        self.assertEqual(controller.rate, 2)
+        self.assertEqual(controller.scale, 0.5)
+
+    def test_headroom_restores_resolution_before_rate(self):
+        controller = SubmissionController(min_fps=2, max_fps=30, target_latency=0.25)
+        self.run_for(controller, 10.0, latency=0.6)
+        controller.latency = None
+        self.run_for(controller, 0.6, latency=0.05, start=10.0)
+        self.assertEqual(controller.scale, 0.75)
+        self.assertEqual(controller.rate, 2)
+        self.run_for(controller, 30.0, latency=0.05, start=11.0)
+        self.assertEqual(controller.scale, 1.0)
+        self.assertEqual(controller.rate, 30)
+
+    def test_backlog_and_cpu_count_as_pressure(self):
+        busy = SubmissionController(min_fps=2, max_fps=30)
+        self.run_for(busy, 1.0, latency=0.05, backlog=2, workers=1)
+        self.assertLess(busy.rate, 30)
+        hot = SubmissionController(min_fps=2, max_fps=30)
+        self.run_for(hot, 1.0, latency=0.05, cpu=95.0)
+        self.assertLess(hot.rate, 30)
+
+
+if __name__ == '__main__':
+    unittest.main()
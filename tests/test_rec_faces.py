@@ -0,0 +1,92 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import rec_faces
+
+
+class StubEngine:
+    """FaceRecognizer stand-in whose warm_up blocks until `release` is set."""
+
+    def __init__(self, model_name, all_embeddings, all_labels, matcher='brute', matcher_options=None, **options):
+        self.all_labels = list(all_labels)
+        self.matcher = matcher
+        self.running = True
+        self.warm_started = threading.Event()
+        self.release = threading.Event()
+        StubEngine.built.append(self)
+
+    def warm_up(self, size):
+        self.warm_started.set()
+        self.release.wait(5.0)
+
+    def set_embeddings(self, all_embeddings, all_labels, matcher=None, matcher_options=None):
+        self.all_labels = list(all_labels)
+        self.matcher = matcher or self.matcher
+
+    def set_detection_scale(self, factor):
+        pass
+
+    def stop(self):
+        self.running = False
+
+
+class TestEngineLifecycle(unittest.TestCase):
+    def setUp(self):
+        StubEngine.built = []
+        gallery = ([np.ones(128, dtype=np.float32)], ['S1'])
+        for patcher in (mock.patch.object(rec_faces, 'FaceRecognizer', StubEngine),
+                        mock.patch.object(rec_faces, 'recognizer', None),
+                        mock.patch.object(rec_faces, 'session_active', False),
+                        mock.patch.object(rec_faces.loader, 'load_embeddings', return_value=gallery),
+                        mock.patch.object(rec_faces.cpu_sampler, 'start')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_session_started_during_warm_up_gets_its_gallery(self):
+        warm = threading.Thread(target=rec_faces.warm_up, args=(lambda text: None,))
+        warm.start()
+        deadline = time.time() + 5.0
+        while not StubEngine.built and time.time() < deadline:
+            time.sleep(0.01)
+        engine = StubEngine.built[0]
+        self.assertTrue(engine.warm_started.wait(5.0))
+        session = threading.Thread(target=rec_faces.start_session, args=(1, ['S1']))
+        session.start()
+        time.sleep(0.1)
+        # Not published (so no frames are submitted) until warm-up is done
+        self.assertIsNone(rec_faces.recognizer)
+        engine.release.set()
+        warm.join(5.0)
+        session.join(5.0)
+        self.assertEqual(len(StubEngine.built), 1)
+        self.assertIs(rec_faces.recognizer, engine)
+        self.assertEqual(engine.all_labels, ['S1'])
+
+    def test_status_reported_outside_engine_lock(self):
+        locked = []
+        def report(text):
+            locked.append(rec_faces._engine_lock.locked())
+        with mock.patch.object(StubEngine, 'warm_up'):
+            self.assertTrue(rec_faces.warm_up(status_callback=report))
+        self.assertEqual(len(locked), 2)
+        self.assertFalse(any(locked))
+
+    def test_failed_warm_up_stops_engine(self):
+        with mock.patch.object(StubEngine, 'warm_up', side_effect=RuntimeError("no GPU")):
+            self.assertFalse(rec_faces.warm_up(status_callback=lambda text: None))
+        self.assertIsNone(rec_faces.recognizer)
+        self.assertFalse(StubEngine.built[0].running)
+
+    def test_session_reuses_warm_engine(self):
+        rec_faces.get_engine([], [])
+        rec_faces.start_session(2, ['S1'])
+        self.assertEqual(len(StubEngine.built), 1)
+        self.assertEqual(rec_faces.recognizer.all_labels, ['S1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
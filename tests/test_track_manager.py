@@ -0,0 +1,89 @@
+import unittest
+from track_manager import TrackManager, iou_matrix
+
+
+class TestTrackManager(unittest.TestCase):
+    def test_iou(self):
+        ious = iou_matrix([(0, 0, 10, 10)], [(0, 0, 10, 10), (5, 0, 10, 10), (50, 50, 5, 5)])
+        self.assertAlmostEqual(float(ious[0, 0]), 1.0)
+        self.assertAlmostEqual(float(ious[0, 1]), 50 / 150)
+        self.assertEqual(float(ious[0, 2]), 0.0)
+
+    def test_moving_face_keeps_track_id(self):
+        tm = TrackManager()
+        ids = set()
+        for step in range(20):
+            # Moves 8px per frame: overlaps by IoU, fragments a //10 box hash
+            tracks = tm.update([(100 + 8 * step, 100, 80, 80)], [("10060", 0.9)], now=step * 0.1)
+            ids.add(tracks[0].track_id)
+        self.assertEqual(ids, {1})
+        self.assertEqual(len(tm), 1)
+
+    def test_fast_mover_uses_centroid(self):
+        tm = TrackManager(max_centroid_shift=0.6)
+        first = tm.update([(100, 100, 80, 80)], [("A", 0.9)], now=0.0)[0]
+        second = tm.update([(145, 100, 80, 80)], [("A", 0.9)], now=0.1)[0]
+        self.assertIs(first, second)
+
+    def test_two_faces_stay_separate(self):
+        tm = TrackManager()
+        for step in range(5):
+            a, b = tm.update([(0, 0, 50, 50), (300, 0, 50, 50)], [("A", 0.9), ("B", 0.8)], now=step * 0.1)
+        self.assertNotEqual(a.track_id, b.track_id)
+        self.assertEqual((a.identity, b.identity), ("A", "B"))
+
+    def test_votes_are_bounded_and_smoothed(self):
+        tm = TrackManager(vote_size=5, unknown_debounce=3)
+        box = [(10, 10, 50, 50)]
+        for i in range(50):
+            track = tm.update(box, [("A", 0.8)], now=i * 0.01)[0]
+        self.assertEqual(len(track.votes), 5)
+        track = tm.update(box, [("Unknown", 0.4)], now=1.0)[0]
+        self.assertEqual(track.identity, "A")
+        for i in range(2):
+            track = tm.update(box, [("Unknown", 0.4)], now=1.1 + i)[0]
+        self.assertEqual(track.identity, "Unknown")
+
+    def test_eviction_and_snapshot(self):
+        tm = TrackManager(max_age=1.0)
+        tm.update([(0, 0, 50, 50)], [("A", 0.9)], now=0.0)
+        tm.update([(300, 0, 50, 50)], [("A", 0.7)], now=0.5)
+        self.assertEqual(len(tm.snapshot(max_age=1.0, now=0.6)), 1)
+        self.assertEqual(len(tm.snapshot(max_age=1.0, now=0.6, unique_identities=False)), 2)
+        self.assertEqual(tm.snapshot(max_age=0.3, now=0.6)[0][2], 0.7)
+        tm.update([], [], now=5.0)
+        self.assertEqual(len(tm), 0)
+
+    def test_identity_cache_skips_confirmed_tracks(self):
+        tm = TrackManager(confirm_frames=3, confirm_threshold=0.75, reembed_every=4)
+        box = [(10, 10, 50, 50)]
+        plans = []
+        for i in range(12):
+            plan = tm.plan_embeddings(box)
+            plans.append(plan[0])
+            tm.update(box, [("A", 0.9) if plan[0] else None], now=i * 0.1)
+        # 3 frames to confirm, then one embedding every 4 frames
+        self.assertEqual(plans, [True, True, True, False, False, False, True, False, False, False, True, False])
+        self.assertEqual(tm.tracks[1].identity, "A")
+
+    def test_identity_cache_needs_confident_votes(self):
+        tm = TrackManager(confirm_frames=2, confirm_threshold=0.75)
+        box = [(10, 10, 50, 50)]
+        for i in range(5):
+            tm.update(box, [("A", 0.6)], now=i * 0.1)
+        self.assertEqual(tm.plan_embeddings(box), [True])
+        # A box that only matches by centroid (broken track) is always embedded
+        tm.update(box, [("A", 0.9)], now=1.0)
+        tm.update(box, [("A", 0.9)], now=1.1)
+        self.assertEqual(tm.plan_embeddings(box), [False])
+        self.assertEqual(tm.plan_embeddings([(45, 10, 50, 50)]), [True])
+
+    def test_forget_identity_keeps_other_tracks(self):
+        tm = TrackManager()
+        tm.update([(0, 0, 50, 50), (300, 0, 50, 50)], [("A", 0.9), ("B", 0.8)], now=0.0)
+        tm.forget_identity("A")
+        self.assertEqual([t.identity for t in tm.tracks.values()], ["B"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,217 @@
+# track_manager.py
+# Face tracks for identity smoothing: stable ids, bounded votes, time-based eviction.
+import time
+import threading
+from collections import deque
+
+import numpy as np
+
+from face_matcher import UNKNOWN_LABEL
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """IoU between every (x, y, w, h) box in boxes_a and every box in boxes_b."""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    ax2, ay2 = a[:, 0] + a[:, 2], a[:, 1] + a[:, 3]
+    bx2, by2 = b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+    iw = np.clip(np.minimum(ax2[:, None], bx2[None]) - np.maximum(a[:, None, 0], b[None, :, 0]), 0, None)
+    ih = np.clip(np.minimum(ay2[:, None], by2[None]) - np.maximum(a[:, None, 1], b[None, :, 1]), 0, None)
+    inter = iw * ih
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+class Track:
+    """One face followed across frames."""
+
+    def __init__(self, track_id, box, vote_size, now):
+        self.track_id = track_id
+        self.box = tuple(box)
+        self.votes = deque(maxlen=vote_size)  # (identity, similarity) ring buffer
+        self.created = now
+        self.last_seen = now
+        self.hits = 0
+        self.identity = UNKNOWN_LABEL
+        self.similarity = 0.0
+        # Identity cache: consecutive confident votes for the smoothed identity,
+        # and frames since this track was last embedded
+        self.confirmed_streak = 0
+        self.since_embed = 0
+
+    def vote(self, identity, similarity, unknown_debounce, confirm_threshold=None):
+        """Adds an observation and recomputes the smoothed identity."""
+        self.votes.append((identity, similarity))
+        self.hits += 1
+        self.since_embed = 0
+        recent = list(self.votes)[-unknown_debounce:]
+        # Debounce 'Unknown': only switch if the last N votes are all 'Unknown'
+        if len(recent) == unknown_debounce and all(ident == UNKNOWN_LABEL for ident, _ in recent):
+            self.identity, self.similarity = UNKNOWN_LABEL, 0.0
+        else:
+            counts = {}
+            for ident, _ in self.votes:
+                counts[ident] = counts.get(ident, 0) + 1
+            self.identity = max(counts, key=counts.get)
+            # Use max similarity for that identity
+            self.similarity = max(sim for ident, sim in self.votes if ident == self.identity)
+        if (confirm_threshold is not None and identity != UNKNOWN_LABEL
+                and identity == self.identity and similarity >= confirm_threshold):
+            self.confirmed_streak += 1
+        else:
+            self.confirmed_streak = 0
+
+    def needs_embedding(self, confirm_frames, reembed_every):
+        """True unless the identity is confirmed and the re-embed schedule is not due."""
+        if confirm_frames <= 0 or self.confirmed_streak < confirm_frames:
+            return True
+        return self.since_embed + 1 >= reembed_every
+
+    def centroid(self):
+        x, y, w, h = self.box
+        return x + w / 2.0, y + h / 2.0
+
+
+class TrackManager:
+    """
+    Associates each frame's face boxes with existing tracks: greedy IoU first,
+    then centroid distance (relative to the track's box size) for fast movers.
+    Each track keeps at most `vote_size` votes. Tracks not seen for `max_age`
+    seconds are evicted, so memory is bounded by the faces recently in view.
+    Thread-safe: the worker updates, the UI thread reads snapshot().
+
+    Identity cache: once a track has voted for its identity with similarity
+    >= confirm_threshold for `confirm_frames` frames in a row, plan_embeddings()
+    lets the worker skip embedding it, except every `reembed_every` frames or
+    when the track is broken (no IoU match). confirm_frames=0 disables this.
+    """
+
+    def __init__(self, vote_size=15, unknown_debounce=5, iou_threshold=0.3, max_centroid_shift=0.5, max_age=2.0,
+                 confirm_frames=0, confirm_threshold=None, reembed_every=15):
+        self.confirm_frames = confirm_frames
+        self.confirm_threshold = confirm_threshold
+        self.reembed_every = max(1, int(reembed_every))
+        self.vote_size = vote_size
+        self.unknown_debounce = unknown_debounce
+        self.iou_threshold = iou_threshold
+        self.max_centroid_shift = max_centroid_shift
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.tracks = {}  # track_id -> Track
+            self._next_id = 1
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def forget_identity(self, identity):
+        """Drops the tracks currently voting for `identity` (e.g. after it left the gallery)."""
+        with self._lock:
+            for tid in [tid for tid, t in self.tracks.items() if t.identity == identity]:
+                del self.tracks[tid]
+
+    def _associate(self, boxes, tracks, iou_only=False):
+        """Returns {box index: Track} for matched boxes."""
+        if not boxes or not tracks:
+            return {}
+        assigned = {}
+        free_tracks = set(range(len(tracks)))
+        ious = iou_matrix(boxes, [t.box for t in tracks])
+        for flat in np.argsort(-ious, axis=None):
+            b, t = np.unravel_index(flat, ious.shape)
+            if ious[b, t] < self.iou_threshold:
+                break
+            if b in assigned or t not in free_tracks:
+                continue
+            assigned[b] = tracks[t]
+            free_tracks.discard(t)
+        if iou_only:
+            return assigned
+
+        # Centroid fallback for boxes that moved too far to overlap
+        pairs = []
+        for b, box in enumerate(boxes):
+            if b in assigned:
+                continue
+            cx, cy = box[0] + box[2] / 2.0, box[1] + box[3] / 2.0
+            for t in free_tracks:
+                tx, ty = tracks[t].centroid()
+                size = max(tracks[t].box[2], tracks[t].box[3], 1)
+                shift = np.hypot(cx - tx, cy - ty) / size
+                if shift <= self.max_centroid_shift:
+                    pairs.append((shift, b, t))
+        for _, b, t in sorted(pairs):
+            if b in assigned or t not in free_tracks:
+                continue
+            assigned[b] = tracks[t]
+            free_tracks.discard(t)
+        return assigned
+
+    def plan_embeddings(self, boxes):
+        """
+        Which boxes need a fresh embedding. Boxes that overlap a confirmed track
+        (by IoU) can reuse its cached identity until the re-embed schedule is due.
+        """
+        if self.confirm_frames <= 0:
+            return [True] * len(boxes)
+        with self._lock:
+            assigned = self._associate(boxes, list(self.tracks.values()), iou_only=True)
+            return [b not in assigned or assigned[b].needs_embedding(self.confirm_frames, self.reembed_every)
+                    for b in range(len(boxes))]
+
+    def update(self, boxes, observations, now=None):
+        """
+        boxes: list of (x, y, w, h); observations: matching list of (identity, similarity),
+        or None for a box that was not embedded (its track keeps the cached identity).
+        Returns the Track for each box, in order.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._evict(now)
+            assigned = self._associate(boxes, list(self.tracks.values()))
+            result = []
+            for b, (box, observation) in enumerate(zip(boxes, observations)):
+                track = assigned.get(b)
+                if track is None:
+                    track = Track(self._next_id, box, self.vote_size, now)
+                    self.tracks[track.track_id] = track
+                    self._next_id += 1
+                track.box = tuple(box)
+                track.last_seen = now
+                if observation is None:
+                    track.since_embed += 1
+                else:
+                    track.vote(observation[0], observation[1], self.unknown_debounce, self.confirm_threshold)
+                result.append(track)
+            return result
+
+    def _evict(self, now):
+        stale = [tid for tid, t in self.tracks.items() if now - t.last_seen > self.max_age]
+        for tid in stale:
+            del self.tracks[tid]
+
+    def snapshot(self, max_age=None, now=None, unique_identities=True):
+        """
+        Tracks seen within `max_age` seconds as (box, identity, similarity, last_seen)
+        tuples. With unique_identities, a known identity is only reported once
+        (its most recently seen track).
+        """
+        now = time.time() if now is None else now
+        max_age = self.max_age if max_age is None else max_age
+        with self._lock:
+            live = [(t.box, t.identity, t.similarity, t.last_seen)
+                    for t in self.tracks.values() if now - t.last_seen <= max_age]
+        live.sort(key=lambda d: d[3], reverse=True)
+        seen = set()
+        out = []
+        for detection in live:
+            identity = detection[1]
+            if unique_identities and identity != UNKNOWN_LABEL:
+                if identity in seen:
+                    continue
+                seen.add(identity)
+            out.append(detection)
+        return out